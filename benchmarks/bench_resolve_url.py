@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""Benchmark ``M3uDump.resolve_final_url`` against a local endless stream.
+
+Usage (from the repository root)::
+
+    PYTHONPATH=. python benchmarks/bench_resolve_url.py [resolutions]
+
+The local server refuses HEAD (405), so every resolution takes the GET
+fallback, and answers GET with an endless body. Compares the previous plain
+GET with the ``Range: bytes=0-0`` fallback, against a server that honours the
+range and one that ignores it, and counts the payload bytes the server got to
+send before the client hung up. When the range is ignored those bytes are
+only what fit in the (large) loopback socket buffers; the client reads none.
+"""
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.request import Request, urlopen
+
+from m3u_dump.m3u_dump import M3uDump
+
+CHUNK = b'x' * 65536
+
+
+class EndlessHandler(BaseHTTPRequestHandler):
+    sent = 0
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_error(405)
+
+    def do_GET(self):
+        if self.path == '/ranged' and self.headers.get('Range') == 'bytes=0-0':
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes 0-0/*')
+            self.send_header('Content-Length', '1')
+            self.end_headers()
+            self._write(b'x')
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'video/mp2t')
+        self.end_headers()
+        try:
+            while True:
+                self._write(CHUNK)
+        except OSError:
+            pass
+
+    def _write(self, data):
+        self.wfile.write(data)
+        with self.lock:
+            EndlessHandler.sent += len(data)
+
+
+def legacy_get(url, timeout=8):
+    with urlopen(Request(url, method='GET', headers={'User-Agent': 'm3u-dump/1.2'}), timeout=timeout) as resp:
+        return resp.geturl()
+
+
+def run(label, resolve, url, count):
+    EndlessHandler.sent = 0
+    start = time.perf_counter()
+    for _ in range(count):
+        resolve(url)
+    elapsed = time.perf_counter() - start
+    time.sleep(0.2)  # let the server notice the closed connections
+    print('{0:<34} {1:8.2f}ms/url {2:12,d} payload bytes/url'.format(
+        label, elapsed * 1000 / count, EndlessHandler.sent // count))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), EndlessHandler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    base = 'http://127.0.0.1:{}'.format(httpd.server_address[1])
+    try:
+        run('legacy GET (endless body)', legacy_get, base + '/live', count)
+        run('range GET (range ignored)', M3uDump.resolve_final_url, base + '/live', count)
+        run('range GET (range honoured)', M3uDump.resolve_final_url, base + '/ranged', count)
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
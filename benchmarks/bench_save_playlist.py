@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""Benchmark ``M3uDump.save_playlist`` on very large playlists.
+
+Usage (from the repository root)::
+
+    PYTHONPATH=. python benchmarks/bench_save_playlist.py [entries]
+
+Compares the previous line-by-line writer with the buffered atomic writer and
+measures the unchanged (skip) path. The atomic writer pays one ``fsync`` per
+playlist, so a first write is not expected to beat the legacy writer; repeated
+syncs of unchanged playlists skip the write entirely.
+"""
+import os
+import sys
+import tempfile
+import time
+
+from m3u_dump.m3u_dump import M3uDump
+
+
+def legacy_save_playlist(playlist_path, playlist_lines):
+    with open(playlist_path, 'w', encoding='utf-8') as f:
+        for line in playlist_lines:
+            if M3uDump.is_comment(line):
+                f.write(line + '\n')
+            elif M3uDump.is_url(line):
+                f.write(line + '\n')
+            else:
+                f.write(os.path.basename(line) + '\n')
+
+
+def make_playlist(entries):
+    lines = ['#EXTM3U']
+    for i in range(entries):
+        lines.append('#EXTINF:{0},artist {0} - title {0}'.format(i))
+        if i % 10 == 0:
+            lines.append('http://stream.example.com/live/{}.ts'.format(i))
+        else:
+            lines.append('/music/library/artist {0}/album {0}/track {0}.mp3'.format(i))
+    return lines
+
+
+def timed(label, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    print('{0:<28} {1:8.3f}s'.format(label, time.perf_counter() - start))
+    return result
+
+
+def main():
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    lines = make_playlist(entries)
+    print('entries: {} ({} lines)'.format(entries, len(lines)))
+    with tempfile.TemporaryDirectory() as d:
+        timed('legacy line-by-line', legacy_save_playlist, os.path.join(d, 'legacy.m3u'), lines)
+        timed('save_playlist (write)', M3uDump.save_playlist, 'new.m3u', lines, d, False)
+        status = timed('save_playlist (unchanged)', M3uDump.save_playlist, 'new.m3u', lines, d, False)
+        assert status == 'unchanged'
+
+
+if __name__ == '__main__':
+    main()
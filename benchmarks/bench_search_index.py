@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""Memory benchmark of the search path index.
+
+Usage (from the repository root)::
+
+    PYTHONPATH=. python benchmarks/bench_search_index.py [files]
+
+Builds the ``basename -> [roots]`` dict of ``M3uDump.get_search_path_files``
+and the ``CompactIndex`` from the same synthetic library walk (10 tracks plus
+a ``cover.jpg`` per album directory, no disk access) and reports the heap
+each one keeps alive (``tracemalloc``), the size of the saved index file, the
+heap of a memory-mapped index, and the lookup time.
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from m3u_dump.searchindex import CompactIndex
+
+
+def library_walk(files):
+    for album in range(files // 10):
+        root = '/music/library/artist {0}/album {1}'.format(album // 10, album)
+        names = ['{0:02d} track {1}.mp3'.format(n, album * 10 + n) for n in range(10)] + ['cover.jpg']
+        yield root, names, 0
+
+
+def dict_index(walk):
+    index = {}
+    for root, files, _mtime in walk:
+        for filename in files:
+            index.setdefault(filename, []).append(root)
+    return index
+
+
+def measure(label, build):
+    tracemalloc.start()
+    start = time.perf_counter()
+    index = build()
+    elapsed = time.perf_counter() - start
+    current, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print('{0:<26} {1:9.1f} MB  build {2:6.2f}s'.format(label, current / 2 ** 20, elapsed))
+    return index
+
+
+def lookups(index, files):
+    names = ['{0:02d} track {1}.mp3'.format(i % 10, i) for i in range(0, files, max(1, files // 100000))]
+    start = time.perf_counter()
+    for name in names:
+        index.get(name)
+    return (time.perf_counter() - start) / len(names) * 1e6
+
+
+def main():
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    print('files: {}'.format(files + files // 10))
+    legacy = measure('dict of root lists', lambda: dict_index(library_walk(files)))
+    print('{0:<26} {1:9.2f} us/lookup'.format('', lookups(legacy, files)))
+    del legacy
+
+    compact = measure('CompactIndex (in memory)', lambda: CompactIndex(CompactIndex.pack(library_walk(files))))
+    print('{0:<26} {1:9.2f} us/lookup'.format('', lookups(compact, files)))
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'index.bin')
+        compact.save(path)
+        del compact
+        print('{0:<26} {1:9.1f} MB'.format('index file', os.path.getsize(path) / 2 ** 20))
+        mapped = measure('CompactIndex (mmap)', lambda: CompactIndex.open(path))
+        print('{0:<26} {1:9.2f} us/lookup'.format('', lookups(mapped, files)))
+        mapped.close()
+
+
+if __name__ == '__main__':
+    main()
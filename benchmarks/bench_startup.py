@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""Import-time and startup benchmark with a budget.
+
+Usage (from the repository root)::
+
+    PYTHONPATH=. python benchmarks/bench_startup.py [runs]
+
+Reports the median cumulative ``python -X importtime`` cost of
+``m3u_dump.m3u_dump`` and ``m3u_dump.cli`` and the wall time of
+``m3u-dump --help``; exits non-zero when a budget is exceeded.
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Budgets in milliseconds; generous enough for CI machines.
+IMPORT_BUDGET_MS = {
+    'm3u_dump.m3u_dump': 40.0,
+    'm3u_dump.cli': 120.0,
+}
+STARTUP_BUDGET_MS = 400.0
+
+
+def import_time_ms(module):
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import {}'.format(module)],
+        capture_output=True, text=True, check=True, env=dict(os.environ),
+    )
+    for line in proc.stderr.splitlines():
+        parts = [p.strip() for p in line.split('|')]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1]) / 1000.0
+    raise RuntimeError('no importtime entry for {}'.format(module))
+
+
+def startup_ms():
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-m', 'm3u_dump.cli', '--help'], capture_output=True, check=True)
+    return (time.perf_counter() - start) * 1000.0
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    failed = False
+    for module, budget in IMPORT_BUDGET_MS.items():
+        value = statistics.median(import_time_ms(module) for _ in range(runs))
+        ok = value <= budget
+        failed |= not ok
+        print('import {0:<22} {1:7.1f}ms (budget {2:.0f}ms) {3}'.format(module, value, budget, 'ok' if ok else 'OVER'))
+
+    value = statistics.median(startup_ms() for _ in range(runs))
+    ok = value <= STARTUP_BUDGET_MS
+    failed |= not ok
+    print('startup m3u-dump --help      {0:7.1f}ms (budget {1:.0f}ms) {2}'.format(
+        value, STARTUP_BUDGET_MS, 'ok' if ok else 'OVER'))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,22 +1,83 @@
 # -*- coding: utf-8 -*-
+import signal
+import threading
 
 import click
 
-from m3u_dump.m3u_dump import M3uDump
+from m3u_dump.m3u_dump import InsufficientSpace, M3uDump
+from m3u_dump.plan import PlanMismatch
+from m3u_dump.watch import PlaylistWatcher
+
+SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+# the watcher dumps playlists one by one, without planning the whole job
+WATCH_CONFLICTS = (('plan_file', '--plan'), ('apply_plan', '--apply-plan'), ('max_bytes', '--max-bytes'),
+                   ('space_check', '--space-check'))
+
+
+def parse_size(ctx, param, value):
+    """Click callback accepting sizes such as ``512K``, ``10M`` or ``1.5G``."""
+    if value is None:
+        return None
+    text = str(value).strip().upper().rstrip('B')
+    unit = text[-1:] if text[-1:] in SIZE_UNITS else ''
+    number = text[:-1] if unit else text
+    try:
+        size = int(float(number) * SIZE_UNITS[unit])
+    except ValueError:
+        raise click.BadParameter('invalid size: {}'.format(value))
+    if size <= 0:
+        raise click.BadParameter('size must be positive: {}'.format(value))
+    return size
+
+
+def parse_rewrite(ctx, param, value):
+    """Click callback validating ``FROM=TO`` rewrite rules."""
+    from m3u_dump.rewrite import parse_rule
+
+    for spec in value:
+        try:
+            parse_rule(spec)
+        except ValueError as exc:
+            raise click.BadParameter(str(exc))
+    return value
+
+
+def parse_playlist_format(ctx, param, value):
+    """Click callback validating ``FORMAT[:ENCODING]`` playlist formats."""
+    from m3u_dump.formats import PlaylistFormat
+
+    for spec in value:
+        try:
+            PlaylistFormat.parse(spec)
+        except (LookupError, ValueError) as exc:
+            raise click.BadParameter(str(exc))
+    return value
 
 
 @click.command()
 @click.argument('load-m3u-path', type=click.Path(exists=True))
-@click.argument('dump-music-path')
+@click.argument('dump-music-path', nargs=-1, required=True)
 @click.option('--dry-run/--no-dry-run', default=False, help='Dry run')
 @click.option('--with-playlist/--no-with-playlist', default=True, help='Copy fixed playlist')
 @click.option('--fix-search-path', default=None, help='Fix search path')
+@click.option(
+    '--rewrite',
+    multiple=True,
+    callback=parse_rewrite,
+    help='Rewrite a path prefix before searching, e.g. "D:\\Music=/mnt/music" (repeatable; longest prefix wins)',
+)
 @click.option(
     '--playlist-pattern-list',
     multiple=True,
     default=('*.m3u', '*.m3u8'),
     help='Playlist filename pattern (repeat option to add multiple values)',
 )
+@click.option(
+    '--exclude-dir',
+    multiple=True,
+    default=(),
+    help='Directory name glob skipped while looking for playlists (repeat option to add multiple values)',
+)
 @click.option(
     '--collision-strategy',
     type=click.Choice(['first', 'shortest', 'path-score']),
@@ -31,6 +92,11 @@ from m3u_dump.m3u_dump import M3uDump
     default=None,
     help='Write detected origin servers/links from URL entries to CSV',
 )
+@click.option(
+    '--origin-summary-file',
+    default=None,
+    help='Write per-origin-server statistics (entries, redirects, latency, failures) to JSON, or CSV for .csv',
+)
 @click.option(
     '--resolve-url-final/--no-resolve-url-final',
     default=True,
@@ -50,17 +116,244 @@ from m3u_dump.m3u_dump import M3uDump
     show_default=True,
     help='How files are materialized in destination',
 )
+@click.option(
+    '--copy-order',
+    type=click.Choice(['locality', 'playlist']),
+    default='locality',
+    show_default=True,
+    help='Order copies by source device/directory (small files batched first) or keep playlist order',
+)
+@click.option(
+    '--bwlimit',
+    default=None,
+    callback=parse_size,
+    help='Limit copy throughput in bytes per second, summed over all destinations (suffixes K, M, G allowed)',
+)
+@click.option(
+    '--dedup-content',
+    type=click.Choice(['hardlink', 'reference']),
+    default=None,
+    help='Materialize byte-identical sources once, then hardlink them or point playlists at the first copy',
+)
+@click.option(
+    '--hash-cache',
+    default=None,
+    help='Persistent content hash cache file (default: ~/.cache/m3u-dump/hash-cache.json)',
+)
+@click.option(
+    '--layout',
+    type=click.Choice(['flat', 'mirror', 'artist-album', 'hashed']),
+    default='flat',
+    show_default=True,
+    help='Folders of the copies: one flat folder, the source tree below fix-search-path, '
+         'artist/album, or hash-sharded',
+)
+@click.option(
+    '--playlist-format',
+    multiple=True,
+    callback=parse_playlist_format,
+    help='Write the playlist as m3u, m3u8, pls or xspf, optionally with an encoding (e.g. m3u:latin-1); repeatable',
+)
+@click.option('--playlist-encoding', default=None, help='Text encoding of written m3u/pls playlists [default: utf-8]')
+@click.option(
+    '--playlist-paths',
+    type=click.Choice(['basename', 'relative', 'absolute']),
+    default=None,
+    help='How written playlists refer to the copied files [default: basename, relative with --layout]',
+)
+@click.option(
+    '--playlist-newline',
+    type=click.Choice(['native', 'lf', 'crlf']),
+    default='native',
+    show_default=True,
+    help='Line endings of written playlists',
+)
+@click.option(
+    '--compact-index/--no-compact-index',
+    default=False,
+    show_default=True,
+    help='Keep the search path index packed (directory table and array posting lists) to save memory',
+)
+@click.option(
+    '--search-index-file',
+    default=None,
+    help='Save the compact search index to this file and memory-map it on later runs '
+         '(rebuilt when the library changes)',
+)
+@click.option(
+    '--playlist-manifest',
+    default=None,
+    help='Manifest file remembering each dumped playlist; playlists unchanged since the last run are skipped',
+)
+@click.option(
+    '--pipeline/--no-pipeline',
+    default=False,
+    show_default=True,
+    help='Overlap URL resolution, search path scanning and copying (asyncio stages)',
+)
+@click.option(
+    '--url-workers',
+    type=click.IntRange(min=1),
+    default=8,
+    show_default=True,
+    help='Concurrent URL resolutions in pipeline mode',
+)
+@click.option(
+    '--watch/--no-watch',
+    default=False,
+    show_default=True,
+    help='Stay resident and re-dump only playlists affected by changes (Ctrl+C to stop)',
+)
+@click.option(
+    '--watch-interval',
+    type=click.FloatRange(min=0.1),
+    default=5.0,
+    show_default=True,
+    help='Seconds between change polls in watch mode',
+)
+@click.option(
+    '--probe-streams/--no-probe-streams',
+    default=False,
+    show_default=True,
+    help='Probe every URL entry (status, time to first byte, content type) before saving the playlist',
+)
+@click.option('--probe-workers', type=click.IntRange(min=1), default=8, show_default=True,
+              help='Concurrent stream probes')
+@click.option('--probe-rate', type=click.FloatRange(min=0, min_open=True), default=None,
+              help='At most this many probes per second to the same host')
+@click.option('--probe-timeout', type=click.FloatRange(min=0, min_open=True), default=5.0, show_default=True,
+              help='Seconds before a probed stream counts as dead')
+@click.option(
+    '--dead-streams',
+    type=click.Choice(['keep', 'last', 'drop']),
+    default='keep',
+    show_default=True,
+    help='What to do with streams found dead by --probe-streams',
+)
+@click.option('--slow-streams-ms', type=click.FloatRange(min=0), default=None,
+              help='Move streams slower than this (time to first byte) after the fast ones')
+@click.option('--url-timeout', type=click.FloatRange(min=0, min_open=True), default=8.0, show_default=True,
+              help='Longest wait for a URL resolution; fast hosts get a shorter, adaptive timeout')
+@click.option('--url-breaker-threshold', type=click.IntRange(min=0), default=3, show_default=True,
+              help='Stop contacting a host after this many consecutive failures (0 disables the breaker)')
+@click.option('--url-breaker-reset', type=click.FloatRange(min=0), default=30.0, show_default=True,
+              help='Seconds before a stopped host gets a trial request')
+@click.option('--url-host-concurrency', type=click.IntRange(min=1), default=4, show_default=True,
+              help='Concurrent URL resolutions per host')
+@click.option('--url-host-rate', type=click.FloatRange(min=0, min_open=True), default=None,
+              help='At most this many URL resolutions per second to the same host')
+@click.option(
+    '--max-bytes',
+    default=None,
+    callback=parse_size,
+    help='Copy at most this many bytes per destination, highest priority files first (suffixes K, M, G allowed)',
+)
+@click.option(
+    '--space-check',
+    type=click.Choice(['off', 'fail', 'trim']),
+    default='off',
+    show_default=True,
+    help='Check free space before copying: abort when it does not fit, or leave out the lowest priority files',
+)
+@click.option(
+    '--priority',
+    type=click.Choice(['playlist', 'rating']),
+    default='playlist',
+    show_default=True,
+    help='Which files win under --max-bytes/--space-check trim: playlist order, or #EXTINF rating then order',
+)
+@click.option(
+    '--plan',
+    'plan_file',
+    default=None,
+    help='Compute every operation, bytes to copy and free space, write the plan as JSON and exit without copying',
+)
+@click.option(
+    '--apply-plan',
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help='Execute a plan written by --plan (same playlists and destinations)',
+)
 def main(**kwargs):
-    """Console script for m3u_dump."""
+    """Console script for m3u_dump.
+
+    Several DUMP_MUSIC_PATH destinations may be given: every source file is
+    read once and written to all of them.
+    """
+
+    if kwargs.get('watch'):
+        for key, option in WATCH_CONFLICTS:
+            if kwargs.get(key) and kwargs[key] != 'off':
+                raise click.UsageError('{} cannot be combined with --watch'.format(option))
 
     click.echo(click.style('=' * 53, fg='green'))
     click.echo(click.style('   Welcome m3u-dump!!', fg='green'))
     click.echo(click.style('=' * 53, fg='green'))
 
-    M3uDump(kwargs).start()
+    dumper = M3uDump(kwargs)
+    previous_handler = _install_sigint_handler(dumper)
+    try:
+        if kwargs.get('watch'):
+            click.echo('watching for changes every {}s (Ctrl+C to stop)...'.format(kwargs['watch_interval']))
+            PlaylistWatcher(dumper, interval=kwargs['watch_interval']).run()
+        else:
+            dumper.start()
+    except PlanMismatch as exc:
+        raise click.UsageError(str(exc))
+    except InsufficientSpace as exc:
+        raise click.ClickException(str(exc))
+    finally:
+        if previous_handler is not None:
+            signal.signal(signal.SIGINT, previous_handler)
 
     click.echo()
-    click.echo(click.style('copy was completed(successful!).'))
+    if dumper.report['cancelled'] and not kwargs.get('watch'):
+        click.echo(click.style('copy was cancelled (partial report written).', fg='yellow'))
+        raise SystemExit(130)
+    if dumper.report['mode'] == 'plan':
+        click.echo(click.style('plan written to {}, nothing copied.'.format(kwargs['plan_file'])))
+    elif dumper.report['mode'] == 'dry_run':
+        click.echo(click.style('dry run finished, nothing copied.'))
+    else:
+        click.echo(click.style('copy was completed(successful!).'))
+
+
+def _install_sigint_handler(dumper):
+    """First Ctrl+C cancels gracefully (current copy finishes, partial report is
+    written); a second one interrupts immediately."""
+    if threading.current_thread() is not threading.main_thread():
+        return None
+
+    def handler(signum, frame):
+        if dumper.cancelled:
+            raise KeyboardInterrupt
+        click.echo(click.style('\ncancelling... (press Ctrl+C again to abort)', fg='yellow'), err=True)
+        dumper.cancel()
+
+    return signal.signal(signal.SIGINT, handler)
+
+
+@click.command()
+@click.option('--host', default='127.0.0.1', show_default=True, help='Address to bind')
+@click.option('--port', type=int, default=8765, show_default=True, help='Port to bind')
+@click.option('--workers', type=click.IntRange(min=1), default=1, show_default=True, help='Jobs run in parallel')
+@click.option('--queue-size', type=click.IntRange(min=1), default=16, show_default=True,
+              help='Queued jobs accepted before answering 503')
+def serve(host, port, workers, queue_size):
+    """Serve dump jobs over HTTP on a warm engine (POST /jobs)."""
+    from m3u_dump.server import JobServer, make_server
+
+    job_server = JobServer(workers=workers, queue_size=queue_size)
+    httpd = make_server(host, port, job_server)
+    job_server.start()
+    click.echo('m3u-dump job server listening on http://{}:{}/jobs'.format(*httpd.server_address[:2]))
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        job_server.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+import threading
+import time
+
+from m3u_dump.m3u_dump import M3uDump
+from m3u_dump.watch import DirectoryState
+
+log = logging.getLogger(__name__)
+
+
+class StatCache:
+    """``os.stat`` results (including misses) kept for ``ttl`` seconds."""
+
+    def __init__(self, ttl=10.0, clock=time.monotonic):
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = {}
+
+    def stat(self, path):
+        now = self._clock()
+        entry = self._entries.get(path)
+        if entry is None or now - entry[0] > self.ttl:
+            try:
+                result = os.stat(path)
+            except OSError as exc:
+                result = exc
+            entry = (now, result)
+            self._entries[path] = entry
+        if isinstance(entry[1], OSError):
+            raise entry[1]
+        return entry[1]
+
+    def clear(self):
+        self._entries.clear()
+
+
+class DumpEngine:
+    """Long-lived engine running many dump jobs with warm caches.
+
+    Search path indexes, URL resolutions, ``os.stat`` results and content
+    hashes survive across jobs; every job gets its own ``M3uDump`` and
+    therefore a fresh report. Search indexes are refreshed before each job by
+    polling directory mtimes, so they stay correct without a rescan.
+    """
+
+    def __init__(self, defaults=None, stat_ttl=10.0):
+        self.defaults = dict(defaults or {})
+        self.stat_cache = StatCache(stat_ttl)
+        self.url_cache = {}
+        self._host_guards = {}
+        self._search_states = {}
+        self._hash_caches = {}
+        self._lock = threading.Lock()
+        M3uDump.setup_logging()
+
+    def search_index(self, search_path):
+        with self._lock:
+            state = self._search_states.get(search_path)
+            if state is None:
+                log.info('scanning search_path({0})...'.format(search_path))
+                state = DirectoryState(search_path)
+                state.scan()
+                self._search_states[search_path] = state
+            else:
+                state.poll()
+            return state.index
+
+    def host_guard(self, args):
+        """Per-host guard shared by the jobs with the same ``url_*`` options.
+
+        Breaker state and observed latencies outlive a job; a job asking for
+        other limits (timeout, breaker, concurrency or rate) gets its own guard.
+        """
+        from m3u_dump.hosts import HostGuard
+
+        options = HostGuard.options(args)
+        key = tuple(sorted(options.items()))
+        with self._lock:
+            guard = self._host_guards.get(key)
+            if guard is None:
+                guard = self._host_guards[key] = HostGuard(**options)
+            return guard
+
+    def hash_cache(self, cache_path):
+        from m3u_dump.hashcache import HashCache
+
+        with self._lock:
+            cache = self._hash_caches.get(cache_path)
+            if cache is None:
+                cache = self._hash_caches[cache_path] = HashCache(cache_path)
+            return cache
+
+    def create_job(self, args, cancel_event=None):
+        job_args = dict(self.defaults)
+        job_args.update(args)
+        return M3uDump(job_args, engine=self, cancel_event=cancel_event)
+
+    def run(self, args, cancel_event=None):
+        """Run one dump job and return its report (partial when ``cancel_event`` is set)."""
+        job = self.create_job(args, cancel_event)
+        job.start()
+        return job.report
+
+    def invalidate(self):
+        with self._lock:
+            self.stat_cache.clear()
+            self.url_cache.clear()
+            self._search_states.clear()
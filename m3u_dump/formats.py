@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+import re
+
+log = logging.getLogger(__name__)
+
+EXTENSIONS = {'m3u': '.m3u', 'm3u8': '.m3u8', 'pls': '.pls', 'xspf': '.xspf'}
+PATH_STYLES = ('basename', 'relative', 'absolute')
+NEWLINES = {'native': os.linesep, 'lf': '\n', 'crlf': '\r\n'}
+EXTINF_RE = re.compile(r'#EXTINF:\s*(-?\d+(?:\.\d+)?)[^,]*,(.*)$')
+
+
+def parse_entries(playlist_lines, is_comment, is_url):
+    """Group playlist lines into ``(comments, location, is_url)`` entries.
+
+    ``comments`` are the ``#EXTM3U``/``#EXTINF`` lines before the location;
+    trailing comments come last with ``location=None``.
+    """
+    entries = []
+    comments = []
+    for line in playlist_lines:
+        if is_comment(line):
+            comments.append(line)
+        else:
+            entries.append((comments, line, is_url(line)))
+            comments = []
+    if comments:
+        entries.append((comments, None, False))
+    return entries
+
+
+def extinf(comments):
+    """``(duration_seconds, title)`` of the last ``#EXTINF`` of an entry."""
+    for line in reversed(comments):
+        match = EXTINF_RE.match(line.strip())
+        if match:
+            return float(match.group(1)), match.group(2).strip()
+    return None, ''
+
+
+class PlaylistFormat:
+    """How a playlist is written: format, text encoding, entry path style and line ending.
+
+    ``name=None`` keeps the source playlist's file name and writes M3U, like
+    the plain ``save_playlist``. ``m3u8`` and ``xspf`` are always UTF-8.
+    """
+
+    def __init__(self, name=None, encoding=None, paths='basename', newline='native'):
+        if name is not None and name not in EXTENSIONS:
+            raise ValueError('unknown playlist format: {}'.format(name))
+        if paths not in PATH_STYLES:
+            raise ValueError('unknown path style: {}'.format(paths))
+        if name in ('m3u8', 'xspf'):
+            encoding = 'utf-8'
+        encoding = encoding or 'utf-8'
+        ''.encode(encoding)  # LookupError for an unknown codec
+        self.name = name
+        self.encoding = encoding
+        self.paths = paths
+        self.newline = NEWLINES[newline]
+
+    @classmethod
+    def parse(cls, spec, encoding=None, **kwargs):
+        """``'m3u'``, ``'m3u:latin-1'``, ``'pls'``... (``encoding`` unless the spec names one)."""
+        name, _sep, spec_encoding = spec.partition(':')
+        return cls(name.lower(), spec_encoding or encoding, **kwargs)
+
+    @classmethod
+    def from_args(cls, args):
+        """Formats asked for by ``args``; ``None`` for the plain UTF-8 M3U output.
+
+        Paths default to ``relative`` when files are laid out in folders.
+        """
+        specs = args.get('playlist_format') or ()
+        default_paths = 'basename' if args.get('layout') in (None, 'flat') else 'relative'
+        options = {
+            'encoding': args.get('playlist_encoding'),
+            'paths': args.get('playlist_paths') or default_paths,
+            'newline': args.get('playlist_newline') or 'native',
+        }
+        if not specs and options == {'encoding': None, 'paths': 'basename', 'newline': 'native'}:
+            return None
+        if not specs:
+            return [cls(**options)]
+        return [cls.parse(spec, **options) for spec in specs]
+
+    def filename(self, playlist_name):
+        if self.name is None:
+            return playlist_name
+        return os.path.splitext(playlist_name)[0] + EXTENSIONS[self.name]
+
+    def location(self, line, is_url, target, dump_music_path):
+        """Path written for an entry; ``target`` is its path inside the destination."""
+        if is_url:
+            return line
+        if self.paths == 'basename':
+            return os.path.basename(target)
+        if self.paths == 'relative':
+            return target.replace(os.sep, '/')
+        return os.path.abspath(os.path.join(dump_music_path, target))
+
+    def writer(self):
+        return WRITERS[self.name or 'm3u'](self)
+
+    def encode(self, text, playlist_path):
+        try:
+            return text.encode(self.encoding)
+        except UnicodeEncodeError as exc:
+            log.warning('playlist({0}): characters not representable in {1} replaced ({2})'.format(
+                playlist_path, self.encoding, exc.object[exc.start:exc.end]))
+            return text.encode(self.encoding, errors='replace')
+
+
+class M3uWriter:
+    def __init__(self, fmt):
+        self.fmt = fmt
+        self.chunks = []
+
+    def add(self, comments, location, duration, title):
+        newline = self.fmt.newline
+        for line in comments:
+            self.chunks.append(line + newline)
+        if location is not None:
+            self.chunks.append(location + newline)
+
+    def text(self):
+        return ''.join(self.chunks)
+
+
+class PlsWriter(M3uWriter):
+    def __init__(self, fmt):
+        super().__init__(fmt)
+        self.chunks.append('[playlist]' + fmt.newline)
+        self.count = 0
+
+    def add(self, comments, location, duration, title):
+        if location is None:
+            return
+        self.count += 1
+        newline = self.fmt.newline
+        self.chunks.append('File{0}={1}{2}'.format(self.count, location, newline))
+        if title:
+            self.chunks.append('Title{0}={1}{2}'.format(self.count, title, newline))
+        if duration is not None:
+            self.chunks.append('Length{0}={1}{2}'.format(self.count, int(duration), newline))
+
+    def text(self):
+        newline = self.fmt.newline
+        return super().text() + 'NumberOfEntries={0}{1}Version=2{1}'.format(self.count, newline)
+
+
+class XspfWriter(M3uWriter):
+    def __init__(self, fmt):
+        super().__init__(fmt)
+        newline = fmt.newline
+        self.chunks.append('<?xml version="1.0" encoding="UTF-8"?>' + newline)
+        self.chunks.append('<playlist version="1" xmlns="http://xspf.org/ns/0/">' + newline)
+        self.chunks.append('  <trackList>' + newline)
+
+    @staticmethod
+    def uri(location):
+        from urllib.parse import quote
+
+        if location[:8].lower().startswith(('http://', 'https://')):
+            return location
+        if os.path.isabs(location):
+            import pathlib
+
+            return pathlib.Path(location).as_uri()
+        return quote(location.replace(os.sep, '/'))
+
+    def add(self, comments, location, duration, title):
+        from xml.sax.saxutils import escape
+
+        if location is None:
+            return
+        parts = ['    <track><location>{}</location>'.format(escape(self.uri(location)))]
+        if title:
+            parts.append('<title>{}</title>'.format(escape(title)))
+        if duration is not None and duration >= 0:
+            parts.append('<duration>{}</duration>'.format(int(duration * 1000)))
+        parts.append('</track>' + self.fmt.newline)
+        self.chunks.append(''.join(parts))
+
+    def text(self):
+        newline = self.fmt.newline
+        return super().text() + '  </trackList>' + newline + '</playlist>' + newline
+
+
+WRITERS = {'m3u': M3uWriter, 'm3u8': M3uWriter, 'pls': PlsWriter, 'xspf': XspfWriter}
+
+
+def render_formats(entries, formats, target, dump_music_path):
+    """Render every format from one pass over ``entries``; returns ``[(format, text)]``.
+
+    ``target(line)`` is the path of a local entry inside ``dump_music_path``.
+    """
+    writers = [fmt.writer() for fmt in formats]
+    needs_info = any(fmt.name in ('pls', 'xspf') for fmt in formats)
+    for comments, line, is_url in entries:
+        duration, title = extinf(comments) if needs_info else (None, '')
+        entry_target = target(line) if line is not None and not is_url else None
+        for fmt, writer in zip(formats, writers):
+            location = None if line is None else fmt.location(line, is_url, entry_target, dump_music_path)
+            writer.add(comments, location, duration, title)
+    return [(fmt, writer.text()) for fmt, writer in zip(formats, writers)]
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 import json
+import logging
 import os
+import queue
 import threading
 import tkinter as tk
 import webbrowser
@@ -9,7 +11,45 @@ from tkinter import ttk
 
 from m3u_dump import __version__
 from m3u_dump.m3u_dump import M3uDump
-from m3u_dump.updater import check_for_update
+from m3u_dump.updater import check_for_update_async
+
+LOG_POLL_MS = 100
+LOG_BATCH_MAX = 1000
+LOG_MAX_LINES = 5000
+
+
+class LogBridge:
+    """Collects ``m3u_dump`` log records from worker threads through a QueueHandler.
+
+    The Tk main loop drains the queue on a timer (``drain``), so worker threads
+    never touch widgets and the UI is updated once per batch.
+    """
+
+    def __init__(self, logger_name='m3u_dump', level=logging.INFO):
+        from logging.handlers import QueueHandler
+
+        self.logger = logging.getLogger(logger_name)
+        self.queue = queue.Queue()
+        self.handler = QueueHandler(self.queue)
+        self.handler.setLevel(level)
+        self.handler.setFormatter(logging.Formatter('%(asctime)s [%(levelname)s] %(message)s', '%H:%M:%S'))
+
+    def attach(self):
+        if self.handler not in self.logger.handlers:
+            self.logger.addHandler(self.handler)
+
+    def detach(self):
+        self.logger.removeHandler(self.handler)
+
+    def drain(self, max_records=LOG_BATCH_MAX):
+        lines = []
+        while len(lines) < max_records:
+            try:
+                record = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            lines.append(record.getMessage())
+        return lines
 
 
 class App(tk.Tk):
@@ -33,6 +73,15 @@ class App(tk.Tk):
 
         self._build_ui()
 
+        M3uDump.setup_logging()
+        self.log_bridge = LogBridge()
+        self.log_bridge.attach()
+        self.after(LOG_POLL_MS, self._poll_log)
+
+        self.cancel_event = None
+        self.worker_thread = None
+        self.protocol('WM_DELETE_WINDOW', self._on_close)
+
     def _build_ui(self):
         root = ttk.Frame(self, padding=14)
         root.pack(fill='both', expand=True)
@@ -71,9 +120,12 @@ class App(tk.Tk):
         bar.pack(fill='x', pady=(6, 8))
         self.btn_run = ttk.Button(bar, text='Executar', command=self.run_job)
         self.btn_run.pack(side='left')
+        self.btn_cancel = ttk.Button(bar, text='Cancelar', command=self.cancel_job, state='disabled')
+        self.btn_cancel.pack(side='left', padx=(8, 0))
         ttk.Button(bar, text='Salvar preset', command=self.save_preset).pack(side='left', padx=8)
         ttk.Button(bar, text='Carregar preset', command=self.load_preset).pack(side='left')
-        ttk.Button(bar, text='Verificar atualização', command=self.check_updates).pack(side='left', padx=8)
+        self.btn_update = ttk.Button(bar, text='Verificar atualização', command=self.check_updates)
+        self.btn_update.pack(side='left', padx=8)
 
         self.progress = ttk.Progressbar(root, mode='indeterminate')
         self.progress.pack(fill='x', pady=(0, 8))
@@ -114,9 +166,20 @@ class App(tk.Tk):
             self.var_report_csv.set(path)
 
     def append_log(self, text):
-        self.log.insert('end', text + '\n')
+        self._write_log_lines([text])
+
+    def _write_log_lines(self, lines):
+        self.log.insert('end', '\n'.join(lines) + '\n')
+        line_count = int(self.log.index('end-1c').split('.')[0])
+        if line_count > LOG_MAX_LINES:
+            self.log.delete('1.0', '{}.0'.format(line_count - LOG_MAX_LINES + 1))
         self.log.see('end')
-        self.update_idletasks()
+
+    def _poll_log(self):
+        lines = self.log_bridge.drain()
+        if lines:
+            self._write_log_lines(lines)
+        self.after(LOG_POLL_MS, self._poll_log)
 
     def _validate(self):
         if not self.var_source.get().strip():
@@ -148,32 +211,58 @@ class App(tk.Tk):
             return
 
         self.btn_run.configure(state='disabled')
+        self.btn_cancel.configure(state='normal')
         self.progress.start(12)
         self.append_log('Iniciando execução...')
 
+        args = self._build_args()
+        cancel_event = self.cancel_event = threading.Event()
+
         def worker():
             try:
-                args = self._build_args()
                 os.makedirs(args['dump_music_path'], exist_ok=True)
-                runner = M3uDump(args)
+                runner = M3uDump(args, cancel_event=cancel_event)
                 runner.start()
-                self.after(0, lambda: self.append_log('Finalizado com sucesso.'))
+                if runner.report['cancelled']:
+                    self.after(0, lambda: self.append_log('Cancelado (relatório parcial gravado).'))
+                else:
+                    self.after(0, lambda: self.append_log('Finalizado com sucesso.'))
             except Exception as ex:
                 self.after(0, lambda: self.append_log(f'ERRO: {ex}'))
                 self.after(0, lambda: messagebox.showerror('Erro', str(ex)))
             finally:
                 self.after(0, self._finish_run)
 
-        threading.Thread(target=worker, daemon=True).start()
+        self.worker_thread = threading.Thread(target=worker, daemon=True)
+        self.worker_thread.start()
+
+    def cancel_job(self):
+        if self.cancel_event is not None and not self.cancel_event.is_set():
+            self.cancel_event.set()
+            self.btn_cancel.configure(state='disabled')
+            self.append_log('Cancelando... a cópia em andamento será concluída.')
 
     def _finish_run(self):
         self.progress.stop()
         self.btn_run.configure(state='normal')
+        self.btn_cancel.configure(state='disabled')
+        self.worker_thread = None
+
+    def _on_close(self):
+        if self.worker_thread is not None and self.worker_thread.is_alive():
+            self.cancel_job()
+            self.after(200, self._on_close)
+            return
+        self.log_bridge.detach()
+        self.destroy()
 
     def check_updates(self):
+        self.btn_update.configure(state='disabled')
         self.append_log('Verificando atualização...')
-        result = check_for_update(__version__)
+        check_for_update_async(__version__, lambda result: self.after(0, lambda: self._show_update(result)))
 
+    def _show_update(self, result):
+        self.btn_update.configure(state='normal')
         if not result.get('ok'):
             self.append_log(f"Falha ao verificar atualização: {result.get('error', 'erro desconhecido')}")
             messagebox.showwarning('Atualização', 'Não foi possível verificar atualização agora.')
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import logging
+import os
+import threading
+
+log = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def default_cache_path():
+    return os.path.join(os.path.expanduser('~'), '.cache', 'm3u-dump', 'hash-cache.json')
+
+
+def hash_file(path, chunk_size=HASH_CHUNK_SIZE):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class HashCache:
+    """Persistent ``(path, size, mtime) -> hash`` cache stored as JSON.
+
+    Safe to share between threads (the engine shares one across jobs).
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as exc:
+            log.warning('ignoring unreadable hash cache({}): {}'.format(self.path, exc))
+            return
+        if data.get('version') == CACHE_VERSION:
+            self.entries = data.get('entries', {})
+
+    def save(self):
+        if not self.path:
+            return
+        # saves run one at a time, so an older snapshot never replaces a newer one
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                entries = dict(self.entries)
+                self._dirty = False
+            directory, filename = os.path.split(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            tmp_path = os.path.join(directory, '.{0}.{1}.{2}.tmp'.format(filename, os.getpid(), threading.get_ident()))
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({'version': CACHE_VERSION, 'entries': entries}, f, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                with self._lock:
+                    self._dirty = True
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+                raise
+
+    def lookup(self, path, st=None):
+        """Return ``(digest, hit)``; the file is hashed (outside the lock) on a miss."""
+        path = os.path.abspath(path)
+        if st is None:
+            st = os.stat(path)
+        with self._lock:
+            entry = self.entries.get(path)
+            if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+                self.hits += 1
+                return entry[2], True
+
+        digest = hash_file(path)
+        with self._lock:
+            self.entries[path] = [st.st_size, st.st_mtime_ns, digest]
+            self.misses += 1
+            self._dirty = True
+        return digest, False
+
+    def get(self, path, st=None):
+        return self.lookup(path, st)[0]
+
+
+class ContentIndex:
+    """Finds byte-identical sources, hashing only files whose size collides."""
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.hashed = 0
+        self.cache_hits = 0
+        self._by_size = {}
+
+    def digest(self, op):
+        """Hash of ``op``'s source, counted in this index (the cache may be shared)."""
+        digest, hit = self.cache.lookup(op['src'], op['stat'])
+        if hit:
+            self.cache_hits += 1
+        else:
+            self.hashed += 1
+        return digest
+
+    def match(self, op):
+        """Return the first registered operation with the same content as ``op``.
+
+        ``op`` is registered (and returned) when no earlier operation matches.
+        """
+        size = op['stat'].st_size
+        candidates = self._by_size.get(size)
+        if candidates is None:
+            self._by_size[size] = [{'op': op, 'digest': None}]
+            return op
+
+        for candidate in candidates:
+            if candidate['op']['src'] == op['src']:
+                return candidate['op']
+
+        digest = self.digest(op)
+        for candidate in candidates:
+            if candidate['digest'] is None:
+                candidate['digest'] = self.digest(candidate['op'])
+            if candidate['digest'] == digest:
+                return candidate['op']
+
+        candidates.append({'op': op, 'digest': digest})
+        return op
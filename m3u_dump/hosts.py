@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+from m3u_dump.scheduler import BandwidthLimiter
+
+
+def url_host(url):
+    """``scheme://netloc`` of ``url`` (the unit every per-host limit applies to)."""
+    from urllib.parse import urlparse
+
+    parsed = urlparse(url)
+    return '{0}://{1}'.format(parsed.scheme, parsed.netloc.lower()) if parsed.netloc else ''
+
+
+class HostRateLimiter:
+    """Token bucket per host, ``rate`` requests per second with bursts of ``burst``."""
+
+    def __init__(self, rate, burst=1, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._sleep = sleep
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, host):
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = (
+                    BandwidthLimiter(self.rate, self.burst, self._clock, self._sleep), threading.Lock())
+        limiter, lock = bucket
+        with lock:
+            limiter.consume(1)
+
+
+class HostUnavailable(Exception):
+    """Raised without contacting a host while its circuit breaker is open."""
+
+
+class _HostState:
+    def __init__(self, max_per_host):
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial = False
+        self.srtt = None
+        self.rttvar = 0.0
+        self.requests = 0
+        self.failures_total = 0
+        self.short_circuited = 0
+        self.opened = 0
+        self.semaphore = threading.BoundedSemaphore(max_per_host)
+
+
+class HostGuard:
+    """Per-host circuit breaker, adaptive timeout, concurrency and rate limits.
+
+    After ``failure_threshold`` consecutive failures (0 disables the breaker)
+    a host's breaker opens and calls fail fast with ``HostUnavailable`` for
+    ``reset_after`` seconds; then a single trial call is let through and its
+    outcome closes or re-opens the breaker. Timeouts follow the host's
+    observed latency (``srtt + 4 * rttvar``, as TCP does) between
+    ``min_timeout`` and ``timeout``. At most ``max_per_host`` calls run at once
+    per host, started at no more than ``rate`` per second.
+    """
+
+    def __init__(self, failure_threshold=3, reset_after=30.0, max_per_host=4, rate=None, timeout=8.0,
+                 min_timeout=1.0, clock=time.monotonic, sleep=time.sleep):
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.max_per_host = max(1, max_per_host)
+        self.timeout = timeout
+        self.min_timeout = min(min_timeout, timeout)
+        self.rate_limiter = HostRateLimiter(rate, clock=clock, sleep=sleep) if rate else None
+        self._clock = clock
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def options(args):
+        """Constructor arguments taken from job ``args`` (``url_*`` options)."""
+        return {
+            'failure_threshold': args.get('url_breaker_threshold', 3),
+            'reset_after': args.get('url_breaker_reset', 30.0),
+            'max_per_host': args.get('url_host_concurrency', 4),
+            'rate': args.get('url_host_rate'),
+            'timeout': args.get('url_timeout', 8.0),
+        }
+
+    @classmethod
+    def from_args(cls, args):
+        return cls(**cls.options(args))
+
+    def _state(self, host):
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None:
+                state = self._hosts[host] = _HostState(self.max_per_host)
+            return state
+
+    def timeout_for(self, host):
+        state = self._state(host)
+        if state.srtt is None:
+            return self.timeout
+        return min(self.timeout, max(self.min_timeout, state.srtt + 4 * state.rttvar))
+
+    def _event(self, events, host, state, event):
+        if events is not None:
+            events.append({'host': host, 'event': event, 'failures': state.failures})
+
+    def _admit(self, host, state, events):
+        with self._lock:
+            if state.state == 'closed':
+                return
+            if state.trial or self._clock() - state.opened_at < self.reset_after:
+                state.short_circuited += 1
+                raise HostUnavailable(host)
+            state.state = 'half_open'
+            state.trial = True
+            self._event(events, host, state, 'half_open')
+
+    def _record(self, host, state, elapsed, failed, events):
+        with self._lock:
+            state.trial = False
+            if not failed:
+                state.failures = 0
+                if state.srtt is None:
+                    state.srtt, state.rttvar = elapsed, elapsed / 2
+                else:
+                    state.rttvar = 0.75 * state.rttvar + 0.25 * abs(state.srtt - elapsed)
+                    state.srtt = 0.875 * state.srtt + 0.125 * elapsed
+                if state.state != 'closed':
+                    state.state = 'closed'
+                    self._event(events, host, state, 'close')
+                return
+            state.failures += 1
+            state.failures_total += 1
+            if state.state == 'half_open' or (
+                    state.state == 'closed' and self.failure_threshold and state.failures >= self.failure_threshold):
+                state.state = 'open'
+                state.opened_at = self._clock()
+                state.opened += 1
+                self._event(events, host, state, 'open')
+
+    def call(self, url, fn, events=None):
+        """Return ``fn(url, timeout)`` under the limits of ``url``'s host.
+
+        Breaker transitions (``open``, ``half_open``, ``close``) are appended
+        to ``events`` when given.
+        """
+        host = url_host(url)
+        state = self._state(host)
+        self._admit(host, state, events)
+        timeout = self.timeout_for(host)
+        with state.semaphore:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(host)
+            start = self._clock()
+            with self._lock:
+                state.requests += 1
+            try:
+                result = fn(url, timeout)
+            except BaseException:
+                self._record(host, state, self._clock() - start, True, events)
+                raise
+        self._record(host, state, self._clock() - start, False, events)
+        return result
+
+    def snapshot(self, hosts=None):
+        """Per-host state, counters and current timeout (for reports)."""
+        with self._lock:
+            items = [(host, state) for host, state in self._hosts.items() if hosts is None or host in hosts]
+        return {
+            host: {
+                'state': state.state,
+                'requests': state.requests,
+                'failures': state.failures_total,
+                'short_circuited': state.short_circuited,
+                'opened': state.opened,
+                'timeout': round(self.timeout_for(host), 3),
+            }
+            for host, state in sorted(items)
+        }
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+
+LAYOUTS = ('flat', 'mirror', 'artist-album', 'hashed')
+UNSAFE_CHARS_RE = re.compile(r'[<>:"/\\|?*\x00-\x1f]')
+SHARD_WIDTH = 2
+
+
+def safe_component(name, default='_'):
+    """``name`` usable as a single directory name on FAT/exFAT cards and NTFS."""
+    name = UNSAFE_CHARS_RE.sub('_', name).strip().rstrip('.')
+    return name or default
+
+
+def split_artist(title):
+    """Artist of an ``#EXTINF`` title written as ``Artist - Title`` ('' otherwise)."""
+    artist, sep, _rest = title.partition(' - ')
+    return artist.strip() if sep else ''
+
+
+class DirectoryLayout:
+    """Where copies go inside a destination.
+
+    ``flat`` keeps every file in the destination root (the historical
+    behaviour); ``mirror`` keeps the source tree below the longest matching
+    root in ``roots`` (the whole path, without its drive, for files outside
+    them); ``artist-album`` uses the ``Artist - Title`` of the ``#EXTINF``
+    line, or the grandparent directory, and the parent directory as album;
+    ``hashed`` spreads files over ``16 ** SHARD_WIDTH`` folders by a hash of
+    their source path.
+    """
+
+    def __init__(self, name='flat', roots=()):
+        if name not in LAYOUTS:
+            raise ValueError('unknown layout: {}'.format(name))
+        self.name = name
+        self.roots = sorted((os.path.abspath(root) for root in roots if root), key=len, reverse=True)
+
+    @classmethod
+    def from_args(cls, args):
+        """The layout asked for by ``args``; ``None`` for the flat one."""
+        name = args.get('layout') or 'flat'
+        if name == 'flat':
+            return None
+        return cls(name, [args.get('fix_search_path')])
+
+    def target(self, src, comments=()):
+        """Path of ``src``'s copy relative to the destination root."""
+        basename = os.path.basename(src)
+        if self.name == 'flat':
+            return basename
+        if self.name == 'hashed':
+            import hashlib
+
+            digest = hashlib.sha1(os.fsencode(os.path.normcase(os.path.abspath(src)))).hexdigest()
+            return os.path.join(digest[:SHARD_WIDTH], basename)
+
+        parts = os.path.abspath(src).split(os.sep)[:-1]
+        if self.name == 'artist-album':
+            from m3u_dump.formats import extinf
+
+            artist = split_artist(extinf(comments)[1]) or (parts[-2] if len(parts) > 2 else '')
+            album = parts[-1] if len(parts) > 1 else ''
+            return os.path.join(safe_component(artist, 'Unknown Artist'), safe_component(album, 'Unknown Album'),
+                                basename)
+
+        directory = os.path.dirname(os.path.abspath(src))
+        for root in self.roots:
+            if directory == root or directory.startswith(root.rstrip(os.sep) + os.sep):
+                parts = os.path.relpath(directory, root).split(os.sep)
+                break
+        else:
+            parts = os.path.splitdrive(directory)[1].split(os.sep)
+        return os.path.join(*[safe_component(part) for part in parts if part and part != '.'] + [basename])
+
+    def plan(self, playlist_lines, is_comment, is_url):
+        """``{src: target}`` for the local entries of a playlist, in one pass."""
+        from m3u_dump.formats import parse_entries
+
+        return {line: self.target(line, comments)
+                for comments, line, url in parse_entries(playlist_lines, is_comment, is_url)
+                if line is not None and not url}
+
+
+def leaf_directories(paths):
+    """Distinct parent directories of ``paths``, without those another one is inside.
+
+    ``os.makedirs`` on each result creates every directory the files need,
+    one call per leaf instead of one check per file.
+    """
+    directories = {os.path.dirname(path) for path in paths}
+    ancestors = set()
+    for directory in directories:
+        parent = os.path.dirname(directory)
+        while parent not in ancestors and parent != directory:
+            ancestors.add(parent)
+            directory, parent = parent, os.path.dirname(parent)
+    return sorted(directories - ancestors)
@@ -1,47 +1,265 @@
 # -*- coding: utf-8 -*-
-import csv
+# Heavy modules (csv, json, pprint, shutil, tempfile, urllib, asyncio,
+# logging.config, hashlib) are imported where they are used: most scripted
+# invocations never reach those code paths and startup dominates them.
 import fnmatch
-import json
 import logging
-import logging.config
 import os
-import pprint
-import shutil
-from urllib.parse import urlparse
-from urllib.request import Request, urlopen
+import re
+import threading
+import time
+
+from m3u_dump.scheduler import BandwidthLimiter, copy_fanout, copy_throttled, schedule_operations
 
-pp = pprint.PrettyPrinter(indent=4)
 log = logging.getLogger(__name__)
+_logging_configured = False
+
+COMMENT_PREFIXES = ('#EXTINF', '#EXTM3U')
+URL_PREFIXES = ('http://', 'https://')
+PLAYLIST_PATTERNS = ('*.m3u', '*.m3u8')
+# missing entries kept to suggest --rewrite rules
+REWRITE_SAMPLE_SIZE = 200
+# execute_copy actions -> per-destination report counters
+DESTINATION_COUNTERS = {
+    'copied': 'copied',
+    'hardlink': 'linked',
+    'symlink': 'linked',
+    'skip_existing': 'copy_skipped_existing',
+    'dedup_hardlink': 'content_deduplicated',
+    'dedup_reference': 'content_deduplicated',
+    'dryrun': 'dryrun',
+    'skip_budget': 'copy_skipped_budget',
+}
+
+
+class DumpCancelled(Exception):
+    """Raised at a cancellation checkpoint once ``M3uDump.cancel()`` was called."""
+
+
+class InsufficientSpace(Exception):
+    """Raised before copying anything when the planned copies do not fit in a destination."""
+
+
+class DirectoryPrefixCache:
+    """Remembers which directories exist, deciding each from its parent first.
+
+    Once a directory is known to be missing, every path below it is missing
+    without a system call, so entries pointing into an old library layout
+    fail fast.
+    """
+
+    def __init__(self, isdir=os.path.isdir):
+        self._isdir = isdir
+        self._dirs = {}
+
+    def isdir(self, path):
+        known = self._dirs.get(path)
+        if known is None:
+            parent = os.path.dirname(path)
+            known = (parent == path or self.isdir(parent)) and self._isdir(path)
+            self._dirs[path] = known
+        return known
+
+    def clear(self):
+        self._dirs.clear()
+
+
+class legacy_static:
+    """Method whose class-level access returns a legacy static function.
+
+    ``M3uDump.fix_playlist(files, lines)`` keeps the historic static behaviour
+    (no report, default options) while ``dumper.fix_playlist(files, lines)`` is
+    a regular method bound to the job's args and report.
+    """
+
+    def __init__(self, legacy):
+        self.legacy = legacy
+        self.method = None
+
+    def __call__(self, method):
+        self.method = method
+        self.__doc__ = method.__doc__
+        return self
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self.legacy
+        return self.method.__get__(obj, objtype)
+
+
+def _legacy_fix_playlist(search_path_files, playlist_lines):
+    return M3uDump.fix_lines(search_path_files, playlist_lines)
+
+
+def _legacy_copy_music(playlist_lines, dump_music_path, dry_run):
+    options = {'dry_run': dry_run, 'skip_existing': False, 'link_mode': 'copy'}
+    replacements = {}
+    for op in M3uDump.plan_copies(playlist_lines, dump_music_path):
+        M3uDump.execute_copy(op, options, None, replacements)
+    return replacements
 
 
 class M3uDump:
-    def __init__(self, args):
+    def __init__(self, args, engine=None, cancel_event=None):
         self.args = args
+        self.engine = engine
+        self.cancel_event = cancel_event or threading.Event()
         self.setup_logging()
-        self.report = {
+        self.destinations = self.destination_specs(
+            args.get('dump_music_path'), args.get('link_mode', 'copy'), args.get('skip_existing', True))
+        self.report = self.new_report()
+        self.content_index = None
+        self._fanout_executor = None
+        self._stream_prober = None
+        self.origin_stats = None
+        self.playlist_manifest = None
+        self._host_guard = None
+        self._url_hosts = set()
+        self._report_lock = threading.Lock()
+        self.search_index = None
+        self.dir_cache = DirectoryPrefixCache()
+        self.layout = None
+        self._entry_targets = {}
+        self._made_dirs = set()
+        if args.get('layout') not in (None, 'flat'):
+            from m3u_dump.layout import DirectoryLayout
+
+            self.layout = DirectoryLayout.from_args(args)
+        self.output_formats = None
+        format_keys = ('playlist_format', 'playlist_encoding', 'playlist_paths', 'playlist_newline')
+        if self.layout is not None or any(args.get(key) for key in format_keys):
+            from m3u_dump.formats import PlaylistFormat
+
+            self.output_formats = PlaylistFormat.from_args(args)
+        self.rewrite_rules = None
+        self.rewrite_samples = []
+        if args.get('rewrite'):
+            from m3u_dump.rewrite import RewriteRules
+
+            self.rewrite_rules = RewriteRules.from_specs(args['rewrite'])
+        if log.isEnabledFor(logging.INFO):
+            import pprint
+            log.info('\n' + pprint.pformat(self.args, indent=4))
+
+    def reset_run(self):
+        """Start a fresh report, dropping the per-run state that feeds it.
+
+        For dumpers reused across runs (the watcher); warm caches such as
+        the search index and the host guard are kept.
+        """
+        self.report = self.new_report()
+        self.origin_stats = None
+        self._url_hosts = set()
+        self.rewrite_samples = []
+        self._entry_targets = {}
+        self._made_dirs = set()
+        self.dir_cache.clear()
+        if self.content_index is not None:
+            self.content_index.hashed = self.content_index.cache_hits = 0
+
+    def new_report(self):
+        return {
+            'cancelled': False,
+            'mode': 'copy',
             'playlists_processed': 0,
+            'playlists_unchanged': 0,
+            'playlists_cached': 0,
             'copied': 0,
             'linked': 0,
             'copy_skipped_missing': 0,
             'copy_skipped_existing': 0,
+            'copy_skipped_budget': 0,
             'fixed_paths': 0,
+            'rewritten_paths': 0,
             'unresolved_paths': 0,
+            'directories_created': 0,
             'collisions_resolved': 0,
             'url_entries_detected': 0,
             'url_origin_saved': 0,
+            'url_resolve_failures': 0,
+            'url_short_circuited': 0,
+            'streams_probed': 0,
+            'streams_alive': 0,
+            'streams_dead': 0,
+            'streams_slow': 0,
+            'streams_dropped': 0,
             'collision_strategy': self.args.get('collision_strategy', 'path-score'),
             'link_mode': self.args.get('link_mode', 'copy'),
+            'copy_order': self.args.get('copy_order', 'locality'),
+            'dedup_content': self.args.get('dedup_content'),
+            'content_deduplicated': 0,
+            'content_hashed': 0,
+            'content_hash_cache_hits': 0,
+            'destinations': {spec['path']: self.new_destination_report() for spec in self.destinations},
             'details': [],
             'origin_links': [],
+            'stream_probes': [],
+            'breaker_events': [],
+            'url_hosts': {},
+            'origin_servers': [],
+            'rewrite_suggestions': [],
         }
-        log.info('\n' + pp.pformat(self.args))
+
+    @staticmethod
+    def new_destination_report():
+        return {
+            'copied': 0,
+            'linked': 0,
+            'copy_skipped_existing': 0,
+            'copy_skipped_budget': 0,
+            'content_deduplicated': 0,
+            'dryrun': 0,
+            'bytes_copied': 0,
+            'playlists_written': 0,
+            'playlists_unchanged': 0,
+        }
+
+    @staticmethod
+    def destination_specs(dump_music_path, link_mode='copy', skip_existing=True):
+        """Normalize ``dump_music_path`` into a list of destination dicts.
+
+        ``dump_music_path`` is a path or a list of paths and/or
+        ``{'path', 'link_mode', 'skip_existing'}`` dicts; missing keys take the
+        job-wide values.
+        """
+        if not dump_music_path:
+            return []
+        if isinstance(dump_music_path, (str, os.PathLike)):
+            dump_music_path = [dump_music_path]
+        specs = []
+        for item in dump_music_path:
+            spec = dict(item) if isinstance(item, dict) else {'path': item}
+            spec['path'] = os.fspath(spec['path'])
+            spec.setdefault('link_mode', link_mode)
+            spec.setdefault('skip_existing', skip_existing)
+            specs.append(spec)
+        return specs
+
+    def cancel(self):
+        """Request a graceful stop; the run ends at the next checkpoint."""
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise DumpCancelled()
 
     @staticmethod
     def setup_logging():
+        """Configure logging once per process; later calls are no-ops."""
+        global _logging_configured
+        if _logging_configured:
+            return
+        _logging_configured = True
+
         module_path = os.path.abspath(os.path.dirname(__file__))
         cfg_path = os.path.join(module_path, 'logging.conf')
 
         if os.path.exists(cfg_path):
+            import logging.config
             logging.config.fileConfig(cfg_path)
             return
 
@@ -68,11 +286,11 @@ class M3uDump:
 
     @staticmethod
     def is_comment(line):
-        return line.lstrip().startswith('#EXTINF') or line.lstrip().startswith('#EXTM3U')
+        return line.lstrip().startswith(COMMENT_PREFIXES)
 
     @staticmethod
     def is_url(line):
-        return line.lower().startswith('http://') or line.lower().startswith('https://')
+        return line[:8].lower().startswith(URL_PREFIXES)
 
     @staticmethod
     def _path_score(original_line, candidate_root):
@@ -101,17 +319,79 @@ class M3uDump:
 
     @staticmethod
     def resolve_final_url(url, timeout=8):
+        """URL ``url`` ends up at after redirects; ``url`` itself when it cannot be resolved.
+
+        Never raises (see ``_resolve_final_url_strict`` for the details).
+        """
+        from m3u_dump.origins import ResolvedUrl
+
         try:
-            req = Request(url, method='HEAD', headers={'User-Agent': 'm3u-dump/1.2'})
-            with urlopen(req, timeout=timeout) as resp:
-                return resp.geturl()
-        except Exception:
-            try:
-                req = Request(url, method='GET', headers={'User-Agent': 'm3u-dump/1.2'})
-                with urlopen(req, timeout=timeout) as resp:
-                    return resp.geturl()
-            except Exception:
-                return url
+            return M3uDump._resolve_final_url_strict(url, timeout)
+        except Exception as exc:
+            return ResolvedUrl(url, error=str(exc) or exc.__class__.__name__)
+
+    @staticmethod
+    def _resolve_final_url_strict(url, timeout=8):
+        """Like ``resolve_final_url``, but raises when the host is unreachable or failing.
+
+        HEAD first, then GET if HEAD is refused. The GET fallback asks for
+        ``Range: bytes=0-0`` and closes the connection right after the
+        headers, so live streams and large files transfer no payload even when
+        the server ignores the range. A 4xx answer still resolves since the
+        host is up. Unreachable hosts (timeouts, refused connections, DNS
+        failures) and 5xx answers raise, so per-host circuit breakers can
+        count them; GET is not retried on a host HEAD could not reach. The
+        result is a ``ResolvedUrl`` carrying the number of redirects followed.
+        """
+        import socket
+        from urllib.error import HTTPError, URLError
+        from urllib.request import Request, build_opener
+
+        from m3u_dump.origins import RedirectCounter, ResolvedUrl
+
+        counter = RedirectCounter()
+        opener = build_opener(counter)
+        headers = {'User-Agent': 'm3u-dump/1.2'}
+        try:
+            with opener.open(Request(url, method='HEAD', headers=headers), timeout=timeout) as resp:
+                return ResolvedUrl(resp.geturl(), counter.hops)
+        except HTTPError as exc:
+            exc.close()
+        except Exception as exc:
+            reason = exc.reason if isinstance(exc, URLError) else exc
+            if isinstance(reason, (TimeoutError, ConnectionRefusedError, socket.gaierror)):
+                raise
+        counter.hops = 0
+        try:
+            req = Request(url, method='GET', headers=dict(headers, Range='bytes=0-0'))
+            with opener.open(req, timeout=timeout) as resp:
+                return ResolvedUrl(resp.geturl(), counter.hops)
+        except HTTPError as exc:
+            exc.close()
+            if exc.code >= 500:
+                raise
+            return ResolvedUrl(exc.geturl(), counter.hops)
+
+    @staticmethod
+    def origin_item(original_url, final_url):
+        from urllib.parse import urlparse
+
+        parsed = urlparse(final_url)
+        origin_server = f"{parsed.scheme}://{parsed.netloc}" if parsed.scheme and parsed.netloc else ''
+        return {
+            'original_url': original_url,
+            'final_url': final_url,
+            'origin_server': origin_server,
+        }
+
+    def record_origin(self, item):
+        if self.origin_stats is None:
+            from m3u_dump.origins import OriginStats
+
+            self.origin_stats = OriginStats()
+        self.origin_stats.add(item)
+        self.report['origin_links'].append(item)
+        self.report['url_origin_saved'] += 1
 
     def capture_url_origins(self, playlist_lines):
         resolve_final = self.args.get('resolve_url_final', True)
@@ -119,37 +399,161 @@ class M3uDump:
             if self.is_comment(line) or not self.is_url(line):
                 continue
 
+            self.check_cancelled()
             self.report['url_entries_detected'] += 1
-            final_url = self.resolve_final_url(line) if resolve_final else line
-            parsed = urlparse(final_url)
-            origin_server = f"{parsed.scheme}://{parsed.netloc}" if parsed.scheme and parsed.netloc else ''
-
-            item = {
-                'original_url': line,
-                'final_url': final_url,
-                'origin_server': origin_server,
-            }
-            self.report['origin_links'].append(item)
-            self.report['url_origin_saved'] += 1
-
-    def fix_playlist(self_or_search_path_files, search_path_files_or_playlist_lines, playlist_lines=None):
-        """Backward compatible:
-        - legacy static usage: M3uDump.fix_playlist(search_path_files, playlist_lines)
-        - instance usage: self.fix_playlist(search_path_files, playlist_lines)
+            final_url = self.resolve_url(line) if resolve_final else line
+            self.record_origin(self.origin_item(line, final_url))
+
+    def probe_streams(self, playlist_lines):
+        """Probe the URL entries (status, time to first byte, content type).
+
+        Dead entries are kept, moved last or dropped (``dead_streams``) and
+        entries slower than ``slow_streams_ms`` are moved after the fast ones.
+        Returns the new playlist lines.
         """
-        if playlist_lines is None:
-            # legacy static call style
-            self = None
-            search_path_files = self_or_search_path_files
-            playlist_lines = search_path_files_or_playlist_lines
-            strategy = 'path-score'
-            report = None
-        else:
-            self = self_or_search_path_files
-            search_path_files = search_path_files_or_playlist_lines
-            strategy = self.args.get('collision_strategy', 'path-score')
-            report = self.report
+        from m3u_dump.probe import StreamProber, reorder_streams, stream_rank
+
+        urls = [line for line in playlist_lines if not self.is_comment(line) and self.is_url(line)]
+        if not urls:
+            return playlist_lines
+        if self._stream_prober is None:
+            self._stream_prober = StreamProber(
+                self.args.get('probe_workers', 8), self.args.get('probe_rate'), self.args.get('probe_timeout', 5.0))
+        results = self._stream_prober.probe(urls, self.cancel_event)
+        self.check_cancelled()
+
+        slow_ms = self.args.get('slow_streams_ms')
+        dead = self.args.get('dead_streams', 'keep')
+        for result in results.values():
+            self.report['streams_probed'] += 1
+            self.report['stream_probes'].append(result)
+            if not result['alive']:
+                self.report['streams_dead'] += 1
+                log.warning('dead stream {0}: {1}'.format(result['url'], result['error'] or result['status']))
+                continue
+            self.report['streams_alive'] += 1
+            if stream_rank(result, slow_ms) == 1:
+                self.report['streams_slow'] += 1
+
+        new_lines = reorder_streams(playlist_lines, results, dead, slow_ms)
+        if dead == 'drop':
+            kept = set(new_lines)
+            self.report['streams_dropped'] += sum(1 for url in urls if url not in kept)
+        return new_lines
+
+    def get_host_guard(self):
+        if self.engine is not None:
+            return self.engine.host_guard(self.args)
+        if self._host_guard is None:
+            from m3u_dump.hosts import HostGuard
+
+            self._host_guard = HostGuard.from_args(self.args)
+        return self._host_guard
+
+    def resolve_url(self, url):
+        """Final URL of ``url``, or ``url`` itself when it cannot be resolved.
+
+        Requests go through the per-host guard: a host whose circuit breaker
+        is open is skipped without waiting for a timeout. The result is a
+        ``ResolvedUrl`` with redirect count, latency and error for the origin
+        server statistics.
+        """
+        from m3u_dump.hosts import HostUnavailable, url_host
+        from m3u_dump.origins import ResolvedUrl
+
+        if self.engine is not None:
+            final_url = self.engine.url_cache.get(url)
+            if final_url is not None:
+                return ResolvedUrl(final_url, getattr(final_url, 'redirects', None))
+        guard = self.get_host_guard()
+        with self._report_lock:
+            self._url_hosts.add(url_host(url))
+        start = time.monotonic()
+        try:
+            final_url = guard.call(url, M3uDump._resolve_final_url_strict, self.report['breaker_events'])
+        except HostUnavailable as exc:
+            with self._report_lock:
+                self.report['url_short_circuited'] += 1
+            log.debug('skipping {0}: circuit open for {1}'.format(url, exc))
+            return ResolvedUrl(url, error='circuit open')
+        except Exception as exc:
+            with self._report_lock:
+                self.report['url_resolve_failures'] += 1
+            log.warning('could not resolve {0}: {1}'.format(url, exc))
+            return ResolvedUrl(url, error=str(exc) or exc.__class__.__name__)
+        if self.engine is not None:
+            self.engine.url_cache[url] = final_url
+        latency_ms = round((time.monotonic() - start) * 1000, 1)
+        return ResolvedUrl(final_url, getattr(final_url, 'redirects', None), latency_ms)
+
+    def stat(self, path):
+        if self.engine is not None:
+            return self.engine.stat_cache.stat(path)
+        return os.stat(path)
+
+    def exists(self, path):
+        try:
+            self.stat(path)
+        except OSError:
+            return False
+        return True
 
+    def path_exists(self, path):
+        """``exists`` behind the directory prefix cache: no ``stat`` for a file in a missing directory."""
+        if not self.dir_cache.isdir(os.path.dirname(os.path.abspath(path))):
+            return False
+        return self.exists(path)
+
+    def read_playlist(self, playlist_path):
+        """Parse a playlist and resolve its relative entries against the playlist's directory.
+
+        A relative entry becomes absolute when the file exists next to the
+        playlist; otherwise it is kept as is (and is looked up from the current
+        directory and in the search index as before). Missing entries are then
+        tried against the ``rewrite`` prefix rules, before any index lookup.
+        """
+        playlist_dir = os.path.dirname(os.path.abspath(playlist_path))
+        rules = self.rewrite_rules
+        lines = []
+        for line in M3uDump.parse_playlist(playlist_path):
+            if not self.is_comment(line) and not self.is_url(line):
+                if not os.path.isabs(line):
+                    candidate = os.path.normpath(os.path.join(playlist_dir, line))
+                    if self.path_exists(candidate):
+                        line = candidate
+                if rules and not self.path_exists(line):
+                    rewritten = rules.rewrite(line)
+                    if rewritten is not None and self.path_exists(rewritten):
+                        line = rewritten
+                        with self._report_lock:
+                            self.report['rewritten_paths'] += 1
+            lines.append(line)
+        return lines
+
+    @legacy_static(_legacy_fix_playlist)
+    def fix_playlist(self, search_path_files, playlist_lines):
+        """Replace missing local entries with the best candidate of the search index.
+
+        ``M3uDump.fix_playlist(search_path_files, playlist_lines)`` (class access)
+        is the legacy static variant: path-score strategy and no report.
+        """
+        return M3uDump.fix_lines(
+            search_path_files,
+            playlist_lines,
+            strategy=self.args.get('collision_strategy', 'path-score'),
+            report=self.report,
+            exists=self.path_exists,
+            missing=self.rewrite_samples,
+        )
+
+    @staticmethod
+    def fix_lines(search_path_files, playlist_lines, strategy='path-score', report=None, exists=os.path.exists,
+                  missing=None):
+        """Fix missing local entries from the search index.
+
+        Up to ``REWRITE_SAMPLE_SIZE`` missing entries are appended to
+        ``missing`` when given (to suggest rewrite rules).
+        """
         new_playlist_lines = []
 
         for line in playlist_lines:
@@ -161,10 +565,12 @@ class M3uDump:
                 new_playlist_lines.append(line)
                 continue
 
-            if os.path.exists(line):
+            if exists(line):
                 new_playlist_lines.append(line)
                 continue
 
+            if missing is not None and len(missing) < REWRITE_SAMPLE_SIZE:
+                missing.append(line)
             basename = os.path.basename(line)
             roots = search_path_files.get(basename, [])
 
@@ -193,9 +599,48 @@ class M3uDump:
         return new_playlist_lines
 
     @staticmethod
-    def _materialize(src, dst, mode='copy', report=None):
+    def _copyfile(src, dst, limiter=None):
+        """Copy ``src`` to ``dst``; an interrupted copy never leaves a partial ``dst``."""
+        try:
+            if limiter is None:
+                import shutil
+                shutil.copyfile(src, dst)
+            else:
+                copy_throttled(src, dst, limiter)
+        except BaseException:
+            try:
+                os.unlink(dst)
+            except OSError:
+                pass
+            raise
+
+    @staticmethod
+    def link_replace(src, dst):
+        """Hard link ``src`` to ``dst``, replacing whatever ``dst`` is.
+
+        Returns False, without touching anything, when ``dst`` already is
+        ``src``'s inode; otherwise the link is made under a temp name and
+        ``os.replace``d into place.
+        """
+        try:
+            if os.path.samefile(src, dst):
+                return False
+        except OSError:
+            pass
+        directory, filename = os.path.split(os.path.abspath(dst))
+        tmp_path = os.path.join(directory, '.{0}.{1}.{2}.tmp'.format(filename, os.getpid(), threading.get_ident()))
+        os.link(src, tmp_path)
+        try:
+            os.replace(tmp_path, dst)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return True
+
+    @staticmethod
+    def _materialize(src, dst, mode='copy', report=None, limiter=None):
         if mode == 'copy':
-            shutil.copyfile(src, dst)
+            M3uDump._copyfile(src, dst, limiter)
             if report is not None:
                 report['copied'] += 1
             return 'copied'
@@ -212,116 +657,593 @@ class M3uDump:
                 report['linked'] += 1
             return 'symlink'
 
-        shutil.copyfile(src, dst)
+        M3uDump._copyfile(src, dst, limiter)
         if report is not None:
             report['copied'] += 1
         return 'copied'
 
-    def copy_music(self_or_playlist_lines, playlist_lines_or_dump_music_path, dump_music_path_or_dry_run, dry_run=None):
-        """Backward compatible:
-        - legacy static usage: M3uDump.copy_music(playlist_lines, dump_music_path, dry_run)
-        - instance usage: self.copy_music(playlist_lines, dump_music_path, dry_run)
-        """
-        if dry_run is None:
-            # legacy static call style
-            playlist_lines = self_or_playlist_lines
-            dump_music_path = playlist_lines_or_dump_music_path
-            dry_run = dump_music_path_or_dry_run
-            skip_existing = False
-            link_mode = 'copy'
-            report = None
-        else:
-            self = self_or_playlist_lines
-            playlist_lines = playlist_lines_or_dump_music_path
-            dump_music_path = dump_music_path_or_dry_run
-            skip_existing = self.args.get('skip_existing', True)
-            link_mode = self.args.get('link_mode', 'copy')
-            report = self.report
+    @staticmethod
+    def plan_copies(playlist_lines, dump_music_path, report=None, copy_order='playlist', stat=os.stat,
+                    target=os.path.basename):
+        """Stat every local entry once and return the copy operations.
 
+        ``target(line)`` is the entry's path inside ``dump_music_path`` (kept
+        as the operation's ``name``).
+        """
+        operations = []
         for line in playlist_lines:
             if M3uDump.is_comment(line) or M3uDump.is_url(line):
                 continue
-            if not os.path.exists(line):
+            try:
+                st = stat(line)
+            except OSError:
                 log.warning('skip copy, because music file({}) was not found.'.format(line))
                 if report is not None:
                     report['copy_skipped_missing'] += 1
                 continue
+            name = target(line)
+            operations.append({
+                'src': line,
+                'name': name,
+                'dst': os.path.join(dump_music_path, name),
+                'stat': st,
+            })
 
-            dst = os.path.join(dump_music_path, os.path.basename(line))
+        if copy_order == 'locality':
+            operations = schedule_operations(operations)
+        return operations
 
-            if skip_existing and os.path.exists(dst):
-                log.info('skip existing {0}'.format(dst))
-                if report is not None:
-                    report['copy_skipped_existing'] += 1
-                    report['details'].append({'type': 'skip_existing', 'src': line, 'dst': dst})
-                continue
+    @staticmethod
+    def execute_copy(op, options, report=None, replacements=None):
+        """Materialize a single planned operation.
+
+        ``options`` holds ``dry_run``, ``skip_existing``, ``link_mode``,
+        ``dedup_content``, ``content_index`` and ``limiter``.
+        """
+        content_index = options.get('content_index')
+        canonical = content_index.match(op) if content_index is not None else op
+        return M3uDump._apply_copy(op, canonical, options, report, replacements)
 
+    @staticmethod
+    def decide_copy(op, canonical, options):
+        """Return what ``_apply_copy`` would do with ``op``, without side effects.
+
+        One of ``dedup_reference``, ``dedup_hardlink``, ``skip_existing`` or
+        ``materialize``.
+        """
+        dst = op['dst']
+        if canonical['src'] != op['src']:
+            if options.get('dedup_content') == 'reference':
+                return 'dedup_reference'
+            if dst != canonical['dst'] and not (options['skip_existing'] and os.path.exists(dst)):
+                return 'dedup_hardlink'
+        if options['skip_existing'] and os.path.exists(dst):
+            return 'skip_existing'
+        return 'materialize'
+
+    @staticmethod
+    def _apply_copy(op, canonical, options, report=None, replacements=None, deferred=None):
+        """Decide and run the action for ``op`` once its content match is known.
+
+        With a ``deferred`` list, plain copies are not run but appended to it
+        (``'deferred'`` is returned) so the caller can batch them.
+        """
+        line, dst = op['src'], op['dst']
+        dry_run = options['dry_run']
+        decision = M3uDump.decide_copy(op, canonical, options)
+
+        if canonical['src'] != line and report is not None:
+            report['content_deduplicated'] += 1
+        if decision == 'dedup_reference':
+            if replacements is not None:
+                replacements[line] = canonical['src']
+            log.info('dedup {0} is identical to {1}'.format(line, canonical['src']))
+            if report is not None:
+                report['details'].append({'type': 'dedup_reference', 'src': line, 'dst': canonical['dst']})
+            return 'dedup_reference'
+        if decision == 'dedup_hardlink':
             if not dry_run:
-                action = M3uDump._materialize(line, dst, mode=link_mode, report=report)
-                log.info('{0} {1} -> {2}'.format(action, line, dst))
-                if report is not None:
-                    report['details'].append({'type': action, 'src': line, 'dst': dst})
+                if M3uDump.link_replace(canonical['dst'], dst):
+                    log.info('dedup hardlink {0} -> {1}'.format(canonical['dst'], dst))
+                else:
+                    log.info('dedup hardlink {0} -> {1} already in place'.format(canonical['dst'], dst))
             else:
-                log.info('(dryrun)copying {0} -> {1}'.format(line, dst))
-                if report is not None:
-                    report['details'].append({'type': 'dryrun', 'src': line, 'dst': dst})
+                log.info('(dryrun)dedup hardlink {0} -> {1}'.format(canonical['dst'], dst))
+            if report is not None:
+                report['details'].append({'type': 'dedup_hardlink', 'src': line, 'dst': dst})
+            return 'dedup_hardlink'
+
+        if decision == 'skip_existing':
+            log.info('skip existing {0}'.format(dst))
+            if report is not None:
+                report['copy_skipped_existing'] += 1
+                report['details'].append({'type': 'skip_existing', 'src': line, 'dst': dst})
+            return 'skip_existing'
+
+        if not dry_run:
+            if deferred is not None and options['link_mode'] == 'copy':
+                deferred.append(dst)
+                return 'deferred'
+            action = M3uDump._materialize(
+                line, dst, mode=options['link_mode'], report=report, limiter=options.get('limiter'))
+            log.info('{0} {1} -> {2}'.format(action, line, dst))
+        else:
+            action = 'dryrun'
+            log.info('(dryrun)copying {0} -> {1}'.format(line, dst))
+        if report is not None:
+            report['details'].append({'type': action, 'src': line, 'dst': dst})
+        return action
 
     @staticmethod
-    def save_playlist(playlist_name, playlist_lines, dump_music_path, dry_run):
-        playlist_path = os.path.join(dump_music_path, playlist_name)
+    def execute_fanout(op, destinations, options, report=None, replacements=None, executor=None):
+        """Materialize ``op`` into several destinations, reading the source once.
+
+        ``skip_existing``, ``link_mode`` and content dedup are decided per
+        destination (see ``destination_specs``); every destination that needs
+        a plain copy is fed from a single read of the source. Returns
+        ``[(destination_path, action), ...]``.
+        """
+        content_index = options.get('content_index')
+        canonical = content_index.match(op) if content_index is not None else op
+        name = op['name']
+        canonical_name = canonical['name']
+
+        results = []
+        deferred = []
+        deferred_paths = []
+        for spec in destinations:
+            spec_options = dict(options, link_mode=spec['link_mode'], skip_existing=spec['skip_existing'])
+            spec_op = dict(op, dst=os.path.join(spec['path'], name))
+            spec_canonical = dict(canonical, dst=os.path.join(spec['path'], canonical_name))
+            action = M3uDump._apply_copy(spec_op, spec_canonical, spec_options, report, replacements, deferred)
+            if action == 'deferred':
+                deferred_paths.append(spec['path'])
+            else:
+                results.append((spec['path'], action))
+
+        if len(deferred) == 1:
+            M3uDump._copyfile(op['src'], deferred[0], options.get('limiter'))
+        elif deferred:
+            copy_fanout(op['src'], deferred, options.get('limiter'), executor)
+        for path, dst in zip(deferred_paths, deferred):
+            log.info('copied {0} -> {1}'.format(op['src'], dst))
+            if report is not None:
+                report['copied'] += 1
+                report['details'].append({'type': 'copied', 'src': op['src'], 'dst': dst})
+            results.append((path, 'copied'))
+        return results
+
+    def copy_options(self, dry_run):
+        primary = self.destinations[0] if len(self.destinations) == 1 else {}
+        link_mode = primary.get('link_mode', self.args.get('link_mode', 'copy'))
+        bwlimit = self.args.get('bwlimit')
+        dedup_content = self.args.get('dedup_content')
+        copies = link_mode == 'copy' or any(spec['link_mode'] == 'copy' for spec in self.destinations)
+        return {
+            'dry_run': dry_run,
+            'skip_existing': primary.get('skip_existing', self.args.get('skip_existing', True)),
+            'link_mode': link_mode,
+            'dedup_content': dedup_content,
+            'content_index': self.get_content_index() if dedup_content else None,
+            'limiter': BandwidthLimiter(bwlimit) if bwlimit and copies else None,
+        }
+
+    def destination_report(self, path):
+        return self.report['destinations'].setdefault(path, self.new_destination_report())
+
+    def count_destination(self, path, action, size=0):
+        counters = self.destination_report(path)
+        counters[DESTINATION_COUNTERS[action]] += 1
+        if action == 'copied':
+            counters['bytes_copied'] += size
+
+    def get_fanout_executor(self, workers):
+        if self._fanout_executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+
+            self._fanout_executor = ThreadPoolExecutor(workers, thread_name_prefix='m3u-dump-fanout')
+        return self._fanout_executor
+
+    def copy_op(self, op, destinations, options, replacements):
+        """Run one planned operation (planned against the first destination) for every destination."""
+        if len(destinations) == 1:
+            action = M3uDump.execute_copy(op, options, self.report, replacements)
+            self.count_destination(destinations[0]['path'], action, op['stat'].st_size)
+            return
+        executor = self.get_fanout_executor(len(destinations))
+        for path, action in M3uDump.execute_fanout(op, destinations, options, self.report, replacements, executor):
+            self.count_destination(path, action, op['stat'].st_size)
+
+    def update_hash_report(self):
+        if self.content_index is not None:
+            self.report['content_hashed'] = self.content_index.hashed
+            self.report['content_hash_cache_hits'] = self.content_index.cache_hits
+
+    @legacy_static(_legacy_copy_music)
+    def copy_music(self, playlist_lines, dump_music_path, dry_run):
+        """Copy (or link) every local entry into ``dump_music_path``.
+
+        ``dump_music_path`` may list several destinations (see
+        ``destination_specs``); each source is then read once and written to
+        all of them. Returns a ``{src: canonical_src}`` map of entries that were deduplicated
+        by reference (``dedup_content='reference'``).
+        ``M3uDump.copy_music(playlist_lines, dump_music_path, dry_run)`` (class
+        access) is the legacy static variant: plain copies, no skip, no report.
+        """
+        destinations = self.destination_specs(
+            dump_music_path, self.args.get('link_mode', 'copy'), self.args.get('skip_existing', True))
+        options = self.copy_options(dry_run)
+        self.layout_playlist(playlist_lines)
+        operations = M3uDump.plan_copies(playlist_lines, destinations[0]['path'], self.report,
+                                         self.args.get('copy_order', 'locality'), self.stat, self.entry_target)
         if not dry_run:
-            with open(playlist_path, 'w', encoding='utf-8') as f:
-                log.info('writing playlist({})...'.format(playlist_path))
-                for line in playlist_lines:
-                    if M3uDump.is_comment(line):
-                        f.write(line + '\n')
-                    elif M3uDump.is_url(line):
-                        f.write(line + '\n')
-                    else:
-                        f.write(os.path.basename(line) + '\n')
+            self.make_directories(os.path.join(spec['path'], op['name']) for spec in destinations for op in operations)
+        replacements = {}
+        try:
+            for op in operations:
+                self.check_cancelled()
+                self.copy_op(op, destinations, options, replacements)
+        finally:
+            self.update_hash_report()
+        return replacements
+
+    def get_content_index(self):
+        if self.content_index is None:
+            from m3u_dump.hashcache import ContentIndex, HashCache, default_cache_path
+
+            cache_path = self.args.get('hash_cache') or default_cache_path()
+            if self.engine is not None:
+                cache = self.engine.hash_cache(cache_path)
+            else:
+                cache = HashCache(cache_path)
+            self.content_index = ContentIndex(cache)
+        return self.content_index
+
+    @staticmethod
+    def render_playlist(playlist_lines, newline=os.linesep):
+        """Return the playlist as written in ``dump_music_path`` (flat basenames)."""
+        basename = os.path.basename
+        rendered = []
+        append = rendered.append
+        for line in playlist_lines:
+            if line.lstrip().startswith(COMMENT_PREFIXES) or line[:8].lower().startswith(URL_PREFIXES):
+                append(line + newline)
+            else:
+                append(basename(line) + newline)
+        return rendered
+
+    @staticmethod
+    def write_atomic(path, data):
+        """Write ``data`` (bytes) through a temp file and ``os.replace`` it into place.
+
+        Returns False, without touching the file, when it already holds ``data``.
+        A new file gets the umask-based mode, a replaced one keeps its mode.
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            st = None
+        if st is not None and st.st_size == len(data):
+            with open(path, 'rb') as f:
+                if f.read() == data:
+                    return False
+
+        directory, filename = os.path.split(os.path.abspath(path))
+        tmp_path = os.path.join(directory, '.{0}.{1}.{2}.tmp'.format(filename, os.getpid(), threading.get_ident()))
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666)
+        try:
+            if st is not None:
+                os.chmod(tmp_path, st.st_mode & 0o7777)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        return True
+
+    @staticmethod
+    def save_playlist(playlist_name, playlist_lines, dump_music_path, dry_run, formats=None,
+                      target=os.path.basename):
+        """Returns ``'written'``, ``'unchanged'`` or ``'dryrun'``.
+
+        With ``formats`` (``PlaylistFormat`` list) every format is rendered
+        from a single pass over the entries, ``target(line)`` giving the path
+        of a local entry inside ``dump_music_path``; the status is
+        ``'unchanged'`` only when every file was.
+        """
+        if formats is None:
+            outputs = [(os.path.join(dump_music_path, playlist_name), None)]
+        else:
+            outputs = [(os.path.join(dump_music_path, fmt.filename(playlist_name)), fmt) for fmt in formats]
+        if dry_run:
+            for playlist_path, _fmt in outputs:
+                log.info('(dryrun)writing playlist({})...'.format(playlist_path))
+            return 'dryrun'
+
+        if formats is None:
+            rendered = [''.join(M3uDump.render_playlist(playlist_lines)).encode('utf-8')]
         else:
-            log.info('(dryrun)writing playlist({})...'.format(playlist_path))
+            from m3u_dump.formats import parse_entries, render_formats
+
+            entries = parse_entries(playlist_lines, M3uDump.is_comment, M3uDump.is_url)
+            rendered = [fmt.encode(text, path) for (path, _fmt), (fmt, text) in zip(
+                outputs, render_formats(entries, formats, target, dump_music_path))]
+        status = 'unchanged'
+        for (playlist_path, _fmt), data in zip(outputs, rendered):
+            if not M3uDump.write_atomic(playlist_path, data):
+                log.info('playlist({}) unchanged, skip writing'.format(playlist_path))
+                continue
+            log.info('writing playlist({})...'.format(playlist_path))
+            status = 'written'
+        return status
+
+    def entry_target(self, line):
+        """Path of a local entry's copy inside a destination."""
+        if self.layout is None:
+            return os.path.basename(line)
+        name = self._entry_targets.get(line)
+        if name is None:
+            name = self._entry_targets.setdefault(line, self.layout.target(line))
+        return name
+
+    def layout_playlist(self, playlist_lines):
+        """Place a playlist's entries with the layout (the ``#EXTINF`` lines are only seen here).
+
+        An entry keeps the place it was given first, so a file listed by
+        several playlists is copied once.
+        """
+        if self.layout is None:
+            return
+        for line, name in self.layout.plan(playlist_lines, self.is_comment, self.is_url).items():
+            self._entry_targets.setdefault(line, name)
+
+    def make_directories(self, paths):
+        """Create the parent directories of every path in ``paths`` in one batch.
+
+        Only the deepest directories are passed to ``os.makedirs`` and each
+        one once per run, so copies do not check their directory per file.
+        """
+        if self.layout is None:
+            return
+        from m3u_dump.layout import leaf_directories
+
+        for directory in leaf_directories(paths):
+            if directory in self._made_dirs:
+                continue
+            try:
+                os.makedirs(directory)
+                self.report['directories_created'] += 1
+            except FileExistsError:
+                pass
+            self._made_dirs.add(directory)
+
+    def playlist_filenames(self, playlist_name):
+        """Names of the playlist files written for ``playlist_name``."""
+        if self.output_formats is None:
+            return [playlist_name]
+        return list(dict.fromkeys(fmt.filename(playlist_name) for fmt in self.output_formats))
+
+    @staticmethod
+    def drop_entries(playlist_lines, entries):
+        """Remove ``entries`` (and the ``#EXTINF`` line right before each) from a playlist."""
+        kept = []
+        for line in playlist_lines:
+            if line in entries:
+                if kept and kept[-1].lstrip().startswith('#EXTINF'):
+                    kept.pop()
+                continue
+            kept.append(line)
+        return kept
+
+    def save_playlists(self, playlist_name, playlist_lines, dry_run, exclude=None):
+        """Save the playlist in every destination; returns the list of statuses.
+
+        ``exclude`` maps a destination path to entries left out of its copy.
+        """
+        statuses = []
+        for spec in self.destinations:
+            lines = playlist_lines
+            if exclude and exclude.get(spec['path']):
+                lines = M3uDump.drop_entries(playlist_lines, exclude[spec['path']])
+            status = M3uDump.save_playlist(
+                playlist_name, lines, spec['path'], dry_run, self.output_formats, self.entry_target)
+            if status in ('written', 'unchanged'):
+                self.destination_report(spec['path'])['playlists_' + status] += 1
+            statuses.append(status)
+        if statuses and all(status == 'unchanged' for status in statuses):
+            self.report['playlists_unchanged'] += 1
+        return statuses
+
+    def get_search_index(self):
+        """Search path index built once and shared by every playlist of the run."""
+        if self.search_index is None:
+            if self.engine is not None:
+                self.search_index = self.engine.search_index(self.args['fix_search_path'])
+            else:
+                self.search_index = self.load_search_index(self.args['fix_search_path'])
+        return self.search_index
+
+    def load_search_index(self, search_path):
+        """Scan ``search_path`` into a dict, or a ``CompactIndex`` with ``compact_index``.
+
+        With ``search_index_file`` the compact index is memory-mapped from that
+        file and rebuilt there only when a directory changed.
+        """
+        index_file = self.args.get('search_index_file')
+        if not index_file and not self.args.get('compact_index'):
+            return M3uDump.get_search_path_files(search_path)
+        from m3u_dump.searchindex import CompactIndex
+
+        if index_file:
+            return CompactIndex.load_or_build(search_path, index_file)
+        log.info('scanning search_path({0})...'.format(search_path))
+        return CompactIndex.scan(search_path)
+
+    def get_playlist_manifest(self):
+        """Manifest of unchanged playlists, ``None`` when not in use.
+
+        It is not used for dry runs, nor with ``probe_streams`` since stream
+        liveness changes without the playlist changing.
+        """
+        if self.playlist_manifest is None:
+            path = self.args.get('playlist_manifest')
+            if not path or self.args.get('dry_run') or self.args.get('probe_streams'):
+                return None
+            from m3u_dump.manifest import PlaylistManifest
+
+            self.playlist_manifest = PlaylistManifest(path)
+        return self.playlist_manifest
+
+    def replay_cached(self, playlist_path):
+        """Count a playlist unchanged since the last run from the manifest instead of dumping it.
+
+        Returns whether the playlist was skipped.
+        """
+        from m3u_dump.manifest import options_key
+
+        record = self.get_playlist_manifest().lookup(playlist_path, options_key(self.args, self.destinations))
+        if record is None:
+            return False
+        log.info('playlist({}) unchanged since the last run, skipped'.format(playlist_path))
+        self.report['url_entries_detected'] += len(record['origin_links'])
+        for item in record['origin_links']:
+            self.record_origin(item)
+        self.report['playlists_cached'] += 1
+        self.report['playlists_unchanged'] += 1
+        self.report['playlists_processed'] += 1
+        return True
+
+    def missing_entries(self):
+        """Entries left out so far because no file was found for them."""
+        return self.report['unresolved_paths'] + self.report['copy_skipped_missing']
+
+    def remember_playlist(self, playlist_path, playlist_lines, origin_links, complete=True):
+        """Record a dumped playlist (final lines) and the files it references and produced.
+
+        A playlist with entries left out (``complete=False``) is forgotten
+        instead: the missing files may show up later.
+        """
+        from m3u_dump.manifest import options_key
+
+        if not complete:
+            self.get_playlist_manifest().forget(playlist_path)
+            return
+
+        files = []
+        names = []
+        for line in playlist_lines:
+            if not self.is_comment(line) and not self.is_url(line):
+                files.append(line)
+                names.append(self.entry_target(line))
+        if self.args.get('with_playlist', True):
+            names.extend(self.playlist_filenames(os.path.basename(playlist_path)))
+        files.extend(os.path.join(spec['path'], name) for spec in self.destinations for name in names)
+        self.get_playlist_manifest().remember(
+            playlist_path, options_key(self.args, self.destinations), files, origin_links)
 
     def dump_playlist(self, playlist_path):
-        playlist_lines = list(M3uDump.parse_playlist(playlist_path))
+        self.check_cancelled()
+        first_origin = len(self.report['origin_links'])
+        missing = self.missing_entries()
+        playlist_lines = self.read_playlist(playlist_path)
         self.capture_url_origins(playlist_lines)
+        if self.args.get('probe_streams'):
+            playlist_lines = self.probe_streams(playlist_lines)
 
         if self.args.get('fix_search_path'):
-            search_path_files = M3uDump.get_search_path_files(self.args['fix_search_path'])
-            playlist_lines = self.fix_playlist(search_path_files, playlist_lines)
+            playlist_lines = self.fix_playlist(self.get_search_index(), playlist_lines)
+            self.check_cancelled()
 
-        self.copy_music(playlist_lines, self.args['dump_music_path'], self.args['dry_run'])
+        replacements = self.copy_music(playlist_lines, self.destinations, self.args['dry_run'])
+        if replacements:
+            playlist_lines = [replacements.get(line, line) for line in playlist_lines]
 
         if self.args.get('with_playlist', True):
-            M3uDump.save_playlist(
-                os.path.basename(playlist_path),
-                playlist_lines,
-                self.args['dump_music_path'],
-                self.args['dry_run'],
-            )
+            self.save_playlists(os.path.basename(playlist_path), playlist_lines, self.args['dry_run'])
 
         self.report['playlists_processed'] += 1
+        if self.get_playlist_manifest() is not None:
+            self.remember_playlist(playlist_path, playlist_lines, self.report['origin_links'][first_origin:],
+                                   self.missing_entries() == missing)
 
     @staticmethod
-    def load_from_playlist_path(load_m3u_path, pattern_list):
+    def compile_patterns(pattern_list):
+        """Compile glob patterns into a single ``name -> bool`` matcher.
+
+        Plain ``*.ext`` patterns become a set lookup on the extension, anything
+        else is folded into one regex. Case sensitivity follows
+        ``os.path.normcase``, like ``fnmatch.fnmatch``.
+        """
+        ignore_case = os.path.normcase('A') == 'a'
+        extensions = set()
+        globs = []
+        for pattern in pattern_list:
+            ext = pattern[2:]
+            if pattern.startswith('*.') and ext and not any(c in ext for c in '*?[.'):
+                extensions.add(ext.lower() if ignore_case else ext)
+            else:
+                globs.append(pattern)
+
+        regex = None
+        if globs:
+            regex = re.compile('|'.join(fnmatch.translate(p) for p in globs), re.IGNORECASE if ignore_case else 0)
+
+        def match(name):
+            dot = name.rfind('.')
+            if dot >= 0 and extensions:
+                ext = name[dot + 1:]
+                if (ext.lower() if ignore_case else ext) in extensions:
+                    return True
+            return regex is not None and regex.match(name) is not None
+
+        return match
+
+    @staticmethod
+    def load_from_playlist_path(load_m3u_path, pattern_list, exclude_dirs=()):
         log.info('loading playlist({})...'.format(load_m3u_path))
         log.info('allowed pattern is {}'.format(pattern_list))
+        match = M3uDump.compile_patterns(pattern_list)
+        exclude = M3uDump.compile_patterns(exclude_dirs) if exclude_dirs else None
         path_list = []
-        for root, _dirs, files in os.walk(load_m3u_path):
-            for filename in files:
-                if any(fnmatch.fnmatch(filename, pattern) for pattern in pattern_list):
-                    path_list.append(os.path.join(root, filename))
+        stack = [load_m3u_path]
+        while stack:
+            root = stack.pop()
+            try:
+                it = os.scandir(root)
+            except OSError:
+                continue
+            with it:
+                for entry in it:
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    if not is_dir:
+                        if match(entry.name):
+                            path_list.append(entry.path)
+                    elif not entry.is_symlink() and not (exclude and exclude(entry.name)):
+                        stack.append(entry.path)
         return sorted(path_list)
 
     def write_report(self):
         report_path = self.args.get('report_json')
         if report_path:
+            import json
+
             with open(report_path, 'w', encoding='utf-8') as f:
                 json.dump(self.report, f, ensure_ascii=False, indent=2)
             log.info('report written: {}'.format(report_path))
 
         csv_path = self.args.get('report_csv')
         if csv_path:
+            import csv
+
             with open(csv_path, 'w', encoding='utf-8', newline='') as f:
                 writer = csv.DictWriter(f, fieldnames=['type', 'src', 'dst', 'basename', 'strategy', 'selected'])
                 writer.writeheader()
@@ -338,6 +1260,8 @@ class M3uDump:
 
         origin_path = self.args.get('origin_links_file')
         if origin_path:
+            import csv
+
             with open(origin_path, 'w', encoding='utf-8', newline='') as f:
                 writer = csv.DictWriter(f, fieldnames=['original_url', 'final_url', 'origin_server'])
                 writer.writeheader()
@@ -345,16 +1269,121 @@ class M3uDump:
                     writer.writerow(row)
             log.info('origin links written: {}'.format(origin_path))
 
-    def start(self):
+        summary_path = self.args.get('origin_summary_file')
+        if summary_path:
+            from m3u_dump.origins import write_origin_summary
+
+            write_origin_summary(summary_path, self.report.get('origin_servers', []))
+            log.info('origin server summary written: {}'.format(summary_path))
+
+    def collect_playlists(self):
         load_m3u_path = self.args['load_m3u_path']
         if os.path.isfile(load_m3u_path):
-            paths = [load_m3u_path]
-        else:
-            paths = M3uDump.load_from_playlist_path(load_m3u_path, self.args['playlist_pattern_list'])
+            return [load_m3u_path]
+        patterns = self.args.get('playlist_pattern_list') or PLAYLIST_PATTERNS
+        return M3uDump.load_from_playlist_path(load_m3u_path, patterns, self.args.get('exclude_dir', ()))
 
+    def start(self):
+        """Dump every playlist. After ``cancel()`` the run stops at the next
+        checkpoint and a partial report (``cancelled: true``) is still written.
+
+        ``dry_run`` and ``plan_file`` only build the plan (``report['mode']``
+        says which ran); ``apply_plan`` runs a saved one and cannot be
+        combined with ``dry_run``. ``max_bytes`` and ``space_check`` plan the whole job
+        first, so the copies are checked against the budget and the free space
+        before anything is written.
+        """
+        apply_plan = self.args.get('apply_plan')
+        if apply_plan and self.args.get('dry_run'):
+            from m3u_dump.plan import PlanMismatch
+
+            raise PlanMismatch('a plan cannot be applied in a dry run')
+        paths = [] if apply_plan else self.collect_playlists()
         log.info('playlist is {}'.format(paths))
-        for path in paths:
-            self.dump_playlist(path)
+        try:
+            if apply_plan:
+                from m3u_dump.plan import DumpPlan
+
+                DumpPlan.load(apply_plan).apply(self)
+            elif self.args.get('dry_run') or self.args.get('plan_file'):
+                self.report['mode'] = 'plan' if self.args.get('plan_file') else 'dry_run'
+                self.build_plan(paths)
+            elif self.args.get('max_bytes') or self.args.get('space_check', 'off') != 'off':
+                plan = self.build_plan(paths, preview=False)
+                if not plan.fits and self.args.get('space_check') == 'fail':
+                    raise InsufficientSpace('not enough free space: {}'.format(', '.join(
+                        '{0} needs {1} bytes, {2} free'.format(dest['path'], dest['required_bytes'], dest['free_bytes'])
+                        for dest in plan.destinations if dest['fits'] is False)))
+                plan.apply(self, verify=False)
+            elif self.args.get('pipeline'):
+                from m3u_dump.pipeline import AsyncPipeline
+
+                paths = self.skip_cached(paths)
+
+                AsyncPipeline(self, url_workers=self.args.get('url_workers', 8)).run(paths)
+            else:
+                for path in self.skip_cached(paths):
+                    self.dump_playlist(path)
+        except DumpCancelled:
+            self.report['cancelled'] = True
+            log.warning('cancelled after {} playlist(s), writing partial report.'.format(
+                self.report['playlists_processed']))
+        except InsufficientSpace as exc:
+            log.error('{}; nothing was copied.'.format(exc))
+            self.finish_run()
+            raise
+
+        self.finish_run()
+        log.info('copy cancelled.' if self.report['cancelled'] else 'copy done.')
+
+    def skip_cached(self, playlist_paths):
+        """Playlists left to dump once those unchanged since the last run are counted."""
+        if self.get_playlist_manifest() is None:
+            return playlist_paths
+        return [path for path in playlist_paths if not self.replay_cached(path)]
+
+    def build_plan(self, playlist_paths, preview=True):
+        """Plan the job without writing anything; saved to ``plan_file`` when set.
+
+        ``max_bytes`` / ``space_check='trim'`` drop the lowest priority copies
+        (``priority``: ``playlist`` or ``rating``) that do not fit.
+        """
+        from m3u_dump.plan import DumpPlan
+
+        plan = DumpPlan.build(self, playlist_paths, preview)
+        max_bytes = self.args.get('max_bytes')
+        use_free_space = self.args.get('space_check') == 'trim'
+        if max_bytes or use_free_space:
+            skipped = plan.fit(max_bytes, self.args.get('priority', 'playlist'), use_free_space)
+            if skipped:
+                log.warning('{} copies left out to fit the byte budget'.format(skipped))
+        self.report['plan'] = plan.summary()
+        log.info('plan: {0} operation(s), {1} byte(s) to copy'.format(
+            self.report['plan']['operations'], self.report['plan']['total_bytes']))
+        if self.args.get('plan_file'):
+            plan.save(self.args['plan_file'])
+        return plan
+
+    def finish_run(self):
+        if self.rewrite_samples and self.search_index is not None:
+            from m3u_dump.rewrite import suggest_rules
 
+            self.report['rewrite_suggestions'] = suggest_rules(self.rewrite_samples, self.search_index)
+            for suggestion in self.report['rewrite_suggestions']:
+                log.warning('{0} of {1} sampled missing entries would be fixed by --rewrite "{2}"'.format(
+                    suggestion['matches'], len(self.rewrite_samples), suggestion['rule']))
+        if self.playlist_manifest is not None:
+            self.playlist_manifest.save()
+        if self.origin_stats is not None:
+            self.report['origin_servers'] = self.origin_stats.summary()
+        if self._url_hosts:
+            self.report['url_hosts'] = self.get_host_guard().snapshot(self._url_hosts)
+            opened = [host for host, state in self.report['url_hosts'].items() if state['opened']]
+            if opened:
+                log.warning('circuit breaker opened for {0} host(s): {1}'.format(len(opened), ', '.join(opened)))
+        if self._fanout_executor is not None:
+            self._fanout_executor.shutdown()
+            self._fanout_executor = None
+        if self.content_index is not None:
+            self.content_index.cache.save()
         self.write_report()
-        log.info('copy done.')
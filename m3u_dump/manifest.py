@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import os
+
+from m3u_dump.hashcache import hash_file
+
+log = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+# Arguments that change what a dump produces; a playlist dumped with other
+# values is processed again.
+OPTION_KEYS = ('fix_search_path', 'collision_strategy', 'link_mode', 'skip_existing', 'dedup_content',
+               'resolve_url_final', 'with_playlist', 'rewrite', 'playlist_format', 'playlist_encoding',
+               'playlist_paths', 'playlist_newline', 'layout')
+
+
+def file_state(path):
+    """``[size, mtime_ns]`` of ``path``, ``None`` when it does not exist."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def options_key(args, destinations):
+    return json.dumps({
+        'options': {key: args.get(key) for key in OPTION_KEYS},
+        'destinations': destinations,
+    }, sort_keys=True)
+
+
+class PlaylistManifest:
+    """Persistent record of each playlist's last dump, stored as JSON.
+
+    A record holds the playlist's size, mtime and content hash, the state of
+    every file it references and of every file written for it, and what the
+    report needs (URL entries and their resolved origins). ``lookup`` returns
+    it only while all of those are unchanged, so an unchanged playlist is
+    skipped without being parsed, resolved or searched.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self._dirty = False
+        if os.path.exists(path):
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as exc:
+            log.warning('ignoring unreadable playlist manifest({}): {}'.format(self.path, exc))
+            return
+        if data.get('version') == MANIFEST_VERSION:
+            self.entries = data.get('playlists', {})
+
+    def save(self):
+        if not self._dirty:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'playlists': self.entries}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+
+    def lookup(self, playlist_path, key):
+        """Stored record of ``playlist_path`` when nothing changed since, else ``None``."""
+        record = self.entries.get(os.path.abspath(playlist_path))
+        if record is None or record['options'] != key:
+            return None
+        state = file_state(playlist_path)
+        if state is None or state[0] != record['size']:
+            return None
+        if state[1] != record['mtime_ns']:
+            # touched: only a different content counts as a change
+            if hash_file(playlist_path) != record['hash']:
+                return None
+            record['mtime_ns'] = state[1]
+            self._dirty = True
+        for path, expected in record['files']:
+            if file_state(path) != expected:
+                return None
+        return record
+
+    def remember(self, playlist_path, key, files, origin_links):
+        """Record a finished dump; ``files`` are the referenced and written paths.
+
+        Nothing is recorded (and an older record is dropped) when one of them
+        is missing: it may show up later, and the playlist must then be dumped
+        again. Returns whether the playlist was recorded.
+        """
+        state = file_state(playlist_path)
+        files = [[path, file_state(path)] for path in files]
+        if state is None or any(expected is None for _path, expected in files):
+            self.forget(playlist_path)
+            return False
+        self.entries[os.path.abspath(playlist_path)] = {
+            'options': key,
+            'size': state[0],
+            'mtime_ns': state[1],
+            'hash': hash_file(playlist_path),
+            'files': files,
+            'origin_links': [dict(item) for item in origin_links],
+        }
+        self._dirty = True
+        return True
+
+    def forget(self, playlist_path):
+        if self.entries.pop(os.path.abspath(playlist_path), None) is not None:
+            self._dirty = True
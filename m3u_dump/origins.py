@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+from urllib.request import HTTPRedirectHandler
+
+
+class ResolvedUrl(str):
+    """Final URL carrying how it was resolved.
+
+    ``redirects`` is the number of redirects followed and ``latency_ms`` the
+    resolution time (``None`` when unknown, e.g. cached or not resolved);
+    ``error`` is set when resolution failed and the URL is the original one.
+    """
+
+    def __new__(cls, value, redirects=None, latency_ms=None, error=''):
+        self = super().__new__(cls, value)
+        self.redirects = redirects
+        self.latency_ms = latency_ms
+        self.error = error
+        return self
+
+
+class RedirectCounter(HTTPRedirectHandler):
+    """Redirect handler counting the redirects it follows.
+
+    HEAD requests stay HEAD across redirects (urllib would switch to GET).
+    """
+
+    def __init__(self):
+        self.hops = 0
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        new = super().redirect_request(req, fp, code, msg, headers, newurl)
+        if new is not None:
+            self.hops += 1
+            if req.get_method() == 'HEAD':
+                new.method = 'HEAD'
+        return new
+
+
+class OriginStats:
+    """Per-origin-server counters, updated one URL entry at a time."""
+
+    def __init__(self):
+        self.servers = {}
+        self.entries = 0
+
+    def add(self, item):
+        final_url = item['final_url']
+        stats = self.servers.get(item['origin_server'])
+        if stats is None:
+            stats = self.servers[item['origin_server']] = {
+                'entries': 0, 'failures': 0, 'redirected': 0, 'redirects': 0, 'max_redirects': 0,
+                'depth_known': 0, 'resolved': 0, 'latency_ms': 0.0, 'max_latency_ms': 0.0,
+            }
+        self.entries += 1
+        stats['entries'] += 1
+        if getattr(final_url, 'error', ''):
+            stats['failures'] += 1
+            return
+        redirects = getattr(final_url, 'redirects', None)
+        if redirects is not None:
+            stats['depth_known'] += 1
+            stats['redirects'] += redirects
+            stats['max_redirects'] = max(stats['max_redirects'], redirects)
+            if redirects:
+                stats['redirected'] += 1
+        latency_ms = getattr(final_url, 'latency_ms', None)
+        if latency_ms is not None:
+            stats['resolved'] += 1
+            stats['latency_ms'] += latency_ms
+            stats['max_latency_ms'] = max(stats['max_latency_ms'], latency_ms)
+
+    def summary(self):
+        """One row per origin server, busiest first."""
+        rows = []
+        for server, stats in self.servers.items():
+            rows.append({
+                'origin_server': server,
+                'entries': stats['entries'],
+                'share': round(stats['entries'] / self.entries, 4),
+                'failures': stats['failures'],
+                'failure_rate': round(stats['failures'] / stats['entries'], 4),
+                'redirected': stats['redirected'],
+                'avg_redirects': round(stats['redirects'] / stats['depth_known'], 2) if stats['depth_known'] else None,
+                'max_redirects': stats['max_redirects'],
+                'avg_latency_ms': round(stats['latency_ms'] / stats['resolved'], 1) if stats['resolved'] else None,
+                'max_latency_ms': round(stats['max_latency_ms'], 1) if stats['resolved'] else None,
+            })
+        rows.sort(key=lambda row: (-row['entries'], row['origin_server']))
+        return rows
+
+
+SUMMARY_FIELDS = ['origin_server', 'entries', 'share', 'failures', 'failure_rate', 'redirected', 'avg_redirects',
+                  'max_redirects', 'avg_latency_ms', 'max_latency_ms']
+
+
+def write_origin_summary(path, rows):
+    """Write the summary as CSV (``.csv``) or compact JSON (anything else)."""
+    if path.lower().endswith('.csv'):
+        import csv
+
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        import json
+
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, ensure_ascii=False, separators=(',', ':'))
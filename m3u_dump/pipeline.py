@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import os
+
+log = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class AsyncPipeline:
+    """Run playlist dumps as concurrent stages connected by bounded queues.
+
+    parse -> url resolution (``url_workers`` tasks)
+          -> search-path fix -> copy -> save
+
+    The search path index is built once, in a worker thread, while URLs of the
+    first playlists are already being resolved; copies of one playlist overlap
+    parsing and resolution of the next ones. Copies run in a single worker so
+    writes to the destination stay sequential.
+    """
+
+    def __init__(self, dumper, url_workers=8, queue_size=64):
+        self.dumper = dumper
+        self.url_workers = max(1, url_workers)
+        self.queue_size = queue_size
+
+    def run(self, playlist_paths):
+        """Raises ``DumpCancelled`` when the dumper is cancelled; in-flight
+        copies running in worker threads complete before it returns."""
+        asyncio.run(self._run(playlist_paths))
+
+    async def _run(self, playlist_paths):
+        dumper = self.dumper
+        args = dumper.args
+        report = dumper.report
+        destinations = dumper.destinations
+        dry_run = args['dry_run']
+        resolve_final = args.get('resolve_url_final', True)
+        copy_order = args.get('copy_order', 'locality')
+        options = dumper.copy_options(dry_run)
+
+        url_queue = asyncio.Queue(self.queue_size)
+        fix_queue = asyncio.Queue(self.queue_size)
+        copy_queue = asyncio.Queue(self.queue_size)
+        jobs = []
+
+        index_task = None
+        if args.get('fix_search_path'):
+            index_task = asyncio.ensure_future(asyncio.to_thread(dumper.get_search_index))
+
+        async def parse_stage():
+            for path in playlist_paths:
+                lines = await asyncio.to_thread(dumper.read_playlist, path)
+                job = {'path': path, 'lines': lines, 'origins': [], 'replacements': {}, 'pending': 0}
+                jobs.append(job)
+                await fix_queue.put(job)
+                for line in lines:
+                    if dumper.is_comment(line) or not dumper.is_url(line):
+                        continue
+                    report['url_entries_detected'] += 1
+                    job['origins'].append(None)
+                    await url_queue.put((job, len(job['origins']) - 1, line))
+            await fix_queue.put(_DONE)
+            for _ in range(self.url_workers):
+                await url_queue.put(_DONE)
+
+        async def url_stage():
+            while True:
+                item = await url_queue.get()
+                if item is _DONE:
+                    return
+                job, slot, line = item
+                dumper.check_cancelled()
+                final_url = await asyncio.to_thread(dumper.resolve_url, line) if resolve_final else line
+                job['origins'][slot] = dumper.origin_item(line, final_url)
+
+        async def finish(job):
+            lines = job['lines']
+            if job['replacements']:
+                lines = [job['replacements'].get(line, line) for line in lines]
+            if args.get('with_playlist', True):
+                await asyncio.to_thread(dumper.save_playlists, os.path.basename(job['path']), lines, dry_run)
+            report['playlists_processed'] += 1
+            job['lines'] = lines
+            job['done'] = True
+
+        async def fix_stage():
+            while True:
+                job = await fix_queue.get()
+                if job is _DONE:
+                    break
+                missing = dumper.missing_entries()  # only this stage counts missing entries
+                if args.get('probe_streams'):
+                    job['lines'] = await asyncio.to_thread(dumper.probe_streams, job['lines'])
+                if index_task is not None:
+                    search_path_files = await index_task
+                    job['lines'] = await asyncio.to_thread(dumper.fix_playlist, search_path_files, job['lines'])
+                dumper.layout_playlist(job['lines'])
+                operations = await asyncio.to_thread(
+                    dumper.plan_copies, job['lines'], destinations[0]['path'], report, copy_order, dumper.stat,
+                    dumper.entry_target)
+                job['complete'] = dumper.missing_entries() == missing
+                if not dry_run:
+                    await asyncio.to_thread(dumper.make_directories, [
+                        os.path.join(spec['path'], op['name']) for spec in destinations for op in operations])
+                job['pending'] = len(operations)
+                if not operations:
+                    await finish(job)
+                for op in operations:
+                    await copy_queue.put((job, op))
+            await copy_queue.put(_DONE)
+
+        async def copy_stage():
+            while True:
+                item = await copy_queue.get()
+                if item is _DONE:
+                    return
+                job, op = item
+                dumper.check_cancelled()
+                await asyncio.to_thread(dumper.copy_op, op, destinations, options, job['replacements'])
+                job['pending'] -= 1
+                if job['pending'] == 0:
+                    await finish(job)
+
+        try:
+            await asyncio.gather(
+                parse_stage(),
+                fix_stage(),
+                copy_stage(),
+                *[url_stage() for _ in range(self.url_workers)],
+            )
+        finally:
+            manifest = dumper.get_playlist_manifest()
+            for job in jobs:
+                origins = [item for item in job['origins'] if item is not None]
+                for item in origins:
+                    dumper.record_origin(item)
+                if manifest is not None and job.get('done'):
+                    dumper.remember_playlist(job['path'], job['lines'], origins, job['complete'])
+            dumper.update_hash_report()
@@ -0,0 +1,433 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+import re
+
+from m3u_dump.m3u_dump import M3uDump
+from m3u_dump.scheduler import copy_fanout
+
+log = logging.getLogger(__name__)
+
+PLAN_VERSION = 1
+# plan action -> action name used in reports
+REPORT_ACTIONS = {
+    'copy': 'copied',
+    'hardlink': 'hardlink',
+    'symlink': 'symlink',
+    'skip_existing': 'skip_existing',
+    'skip_budget': 'skip_budget',
+    'dedup_hardlink': 'dedup_hardlink',
+    'dedup_reference': 'dedup_reference',
+}
+# rating="4" (or rating=4) attribute of an #EXTINF line
+RATING_RE = re.compile(r'\brating="?(\d+(?:\.\d+)?)', re.IGNORECASE)
+
+
+class PlanMismatch(ValueError):
+    """Raised when a saved plan is applied to other playlists or destinations, or in a dry run."""
+
+
+def free_space(path):
+    """Return ``(st_dev, free_bytes)`` of the filesystem that holds (or will hold) ``path``."""
+    import shutil
+
+    probe = os.path.abspath(path)
+    while not os.path.exists(probe):
+        parent = os.path.dirname(probe)
+        if parent == probe:
+            break
+        probe = parent
+    return os.stat(probe).st_dev, shutil.disk_usage(probe).free
+
+
+def entry_priorities(playlist_lines, position=0):
+    """Return ``{entry: (position, rating)}`` for the local entries of a playlist."""
+    priorities = {}
+    rating = 0
+    for line in playlist_lines:
+        if line.lstrip().startswith('#EXTINF'):
+            match = RATING_RE.search(line)
+            rating = float(match.group(1)) if match else 0
+            continue
+        if M3uDump.is_comment(line) or M3uDump.is_url(line):
+            continue
+        if line not in priorities:
+            priorities[line] = (position, rating)
+            position += 1
+        rating = 0
+    return priorities
+
+
+class DumpPlan:
+    """Every operation of a dump job, decided up front and without writing anything.
+
+    A plan holds the final lines of each playlist, the per-destination action
+    for each source (``copy``, ``hardlink``, ``symlink``, ``skip_existing``,
+    ``skip_budget``, ``dedup_hardlink``, ``dedup_reference``), the collision
+    decisions of the search path fix and the space needed on each
+    destination. It round-trips through JSON, so it can be reviewed and
+    applied later.
+    """
+
+    def __init__(self, load_m3u_path, destinations, playlists, collisions=(), with_playlist=True, layout='flat'):
+        self.load_m3u_path = load_m3u_path
+        self.destinations = destinations
+        self.playlists = playlists
+        self.collisions = list(collisions)
+        self.with_playlist = with_playlist
+        self.layout = layout
+
+    @classmethod
+    def build(cls, dumper, playlist_paths, preview=True):
+        """Parse, fix and plan every playlist; reads only (URL origins are still resolved).
+
+        With ``preview`` the dumper's report and log look like a dry run;
+        otherwise planning is silent and the report is left to ``apply``.
+        """
+        args = dumper.args
+        report = dumper.report
+        options = dumper.copy_options(True)
+        destinations = dumper.destinations
+        copy_order = args.get('copy_order', 'locality')
+        with_playlist = args.get('with_playlist', True)
+        first_detail = len(report['details'])
+
+        playlists = []
+        position = 0
+        for path in playlist_paths:
+            dumper.check_cancelled()
+            lines = dumper.read_playlist(path)
+            dumper.capture_url_origins(lines)
+            if args.get('probe_streams'):
+                lines = dumper.probe_streams(lines)
+            if args.get('fix_search_path'):
+                lines = dumper.fix_playlist(dumper.get_search_index(), lines)
+
+            priorities = entry_priorities(lines, position)
+            position += len(priorities)
+            replacements = {}
+            operations = []
+            dumper.layout_playlist(lines)
+            for op in dumper.plan_copies(lines, destinations[0]['path'], report, copy_order, dumper.stat,
+                                         dumper.entry_target):
+                operation = cls._plan_operation(dumper, op, destinations, options, replacements, preview)
+                operation['position'], operation['rating'] = priorities[op['src']]
+                operations.append(operation)
+            if replacements:
+                lines = [replacements.get(line, line) for line in lines]
+            name = os.path.basename(path)
+            if preview:
+                if with_playlist:
+                    dumper.save_playlists(name, lines, True)
+                report['playlists_processed'] += 1
+            # a plan may be applied from another working directory
+            lines = [line if dumper.is_comment(line) or dumper.is_url(line) else os.path.abspath(line)
+                     for line in lines]
+            playlists.append({'path': os.path.abspath(path), 'name': name, 'lines': lines, 'operations': operations})
+        dumper.update_hash_report()
+
+        plan = cls(
+            os.path.abspath(args['load_m3u_path']),
+            [{'path': os.path.abspath(spec['path']), 'link_mode': spec['link_mode'],
+              'skip_existing': spec['skip_existing']}
+             for spec in destinations],
+            playlists,
+            [detail for detail in report['details'][first_detail:] if detail['type'] == 'collision'],
+            with_playlist,
+            args.get('layout') or 'flat',
+        )
+        plan.check_space()
+        return plan
+
+    @staticmethod
+    def _plan_operation(dumper, op, destinations, options, replacements, preview=True):
+        content_index = options.get('content_index')
+        canonical = content_index.match(op) if content_index is not None else op
+        name = op['name']
+        canonical_name = canonical['name']
+
+        targets = []
+        for spec in destinations:
+            spec_options = dict(options, link_mode=spec['link_mode'], skip_existing=spec['skip_existing'])
+            spec_op = dict(op, dst=os.path.join(spec['path'], name))
+            spec_canonical = dict(canonical, dst=os.path.join(spec['path'], canonical_name))
+            if preview:
+                action = M3uDump._apply_copy(spec_op, spec_canonical, spec_options, dumper.report, replacements)
+                dumper.count_destination(spec['path'], action, op['stat'].st_size)
+            else:
+                action = M3uDump.decide_copy(spec_op, spec_canonical, spec_options)
+                if action == 'dedup_reference':
+                    replacements[op['src']] = canonical['src']
+            target = {
+                'destination': os.path.abspath(spec['path']),
+                'dst': os.path.abspath(spec_op['dst']),
+                'action': spec['link_mode'] if action in ('dryrun', 'materialize') else action,
+            }
+            if action == 'dedup_hardlink':
+                target['link_from'] = os.path.abspath(spec_canonical['dst'])
+            targets.append(target)
+        return {
+            'src': os.path.abspath(op['src']),
+            'size': op['stat'].st_size,
+            'mtime_ns': op['stat'].st_mtime_ns,
+            'targets': targets,
+        }
+
+    def _targets(self):
+        for playlist in self.playlists:
+            for op in playlist['operations']:
+                for target in op['targets']:
+                    yield op, target
+
+    def required_bytes(self, destination_path):
+        """Bytes copied into ``destination_path`` (a file listed twice counts once)."""
+        seen = set()
+        total = 0
+        for op, target in self._targets():
+            if target['destination'] == destination_path and target['action'] == 'copy' \
+                    and target['dst'] not in seen:
+                seen.add(target['dst'])
+                total += op['size']
+        return total
+
+    @property
+    def total_bytes(self):
+        return sum(self.required_bytes(dest['path']) for dest in self.destinations)
+
+    @property
+    def fits(self):
+        return all(dest.get('fits') is not False for dest in self.destinations)
+
+    def check_space(self, refresh=True):
+        """Fill ``required_bytes``, ``free_bytes`` and ``fits`` of every destination.
+
+        Destinations on the same filesystem share its free space. Without
+        ``refresh`` the free space measured last time is reused.
+        """
+        devices = {}
+        for dest in self.destinations:
+            dest['required_bytes'] = self.required_bytes(dest['path'])
+            if refresh or 'device' not in dest:
+                try:
+                    dest['device'], dest['free_bytes'] = free_space(dest['path'])
+                except OSError:
+                    dest['device'], dest['free_bytes'] = None, None
+            devices.setdefault(dest['device'], []).append(dest)
+
+        for device, dests in devices.items():
+            needed = sum(dest['required_bytes'] for dest in dests)
+            for dest in dests:
+                dest['fits'] = None if device is None else needed <= dest['free_bytes']
+                if dest['fits'] is False:
+                    log.warning('destination({0}) needs {1} bytes but only {2} are free'.format(
+                        dest['path'], needed, dest['free_bytes']))
+        return self.fits
+
+    def fit(self, max_bytes=None, priority='playlist', use_free_space=False):
+        """Skip (``skip_budget``) the copies that do not fit in their destination's budget.
+
+        The budget is ``max_bytes`` per destination and/or, with
+        ``use_free_space``, the free space of its filesystem. Files are taken
+        by playlist position, or with ``priority='rating'`` by rating (highest
+        first) and then position; a file that does not fit is skipped and
+        smaller ones after it may still fit. Returns the number of skipped copies.
+        """
+        device_free = {}
+        if use_free_space:
+            for dest in self.destinations:
+                if dest.get('device') is not None:
+                    device_free[dest['device']] = dest['free_bytes']
+        devices = {dest['path']: dest.get('device') for dest in self.destinations}
+        used = {dest['path']: 0 for dest in self.destinations}
+
+        operations = [op for playlist in self.playlists for op in playlist['operations']]
+        if priority == 'rating':
+            operations.sort(key=lambda op: (-op['rating'], op['position']))
+        else:
+            operations.sort(key=lambda op: op['position'])
+
+        placed = {}
+        skipped = 0
+        for op in operations:
+            for target in op['targets']:
+                if target['action'] != 'copy':
+                    continue
+                dst, path = target['dst'], target['destination']
+                if dst not in placed:
+                    device = devices[path]
+                    placed[dst] = (max_bytes is None or used[path] + op['size'] <= max_bytes) \
+                        and (device not in device_free or op['size'] <= device_free[device])
+                    if placed[dst]:
+                        used[path] += op['size']
+                        if device in device_free:
+                            device_free[device] -= op['size']
+                if not placed[dst]:
+                    target['action'] = 'skip_budget'
+                    skipped += 1
+
+        for _op, target in self._targets():
+            if target['action'] == 'dedup_hardlink' and placed.get(target['link_from']) is False:
+                target['action'] = 'skip_budget'
+                skipped += 1
+        self.check_space(refresh=False)
+        return skipped
+
+    def excluded(self, playlist, destination_path):
+        """Entries of ``playlist`` left out of ``destination_path`` by the budget."""
+        return {
+            op['src']
+            for op in playlist['operations']
+            for target in op['targets']
+            if target['destination'] == destination_path and target['action'] == 'skip_budget'
+        }
+
+    def summary(self):
+        return {
+            'playlists': len(self.playlists),
+            'operations': sum(len(playlist['operations']) for playlist in self.playlists),
+            'total_bytes': self.total_bytes,
+            'skipped_budget': sum(1 for _op, target in self._targets() if target['action'] == 'skip_budget'),
+            'collisions': len(self.collisions),
+            'destinations': [
+                {key: dest.get(key) for key in ('path', 'required_bytes', 'free_bytes', 'fits')}
+                for dest in self.destinations
+            ],
+        }
+
+    def to_dict(self):
+        return {
+            'version': PLAN_VERSION,
+            'load_m3u_path': self.load_m3u_path,
+            'with_playlist': self.with_playlist,
+            'layout': self.layout,
+            'total_bytes': self.total_bytes,
+            'destinations': self.destinations,
+            'collisions': self.collisions,
+            'playlists': self.playlists,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('version') != PLAN_VERSION:
+            raise PlanMismatch('unsupported plan version: {}'.format(data.get('version')))
+        return cls(
+            data['load_m3u_path'],
+            data['destinations'],
+            data['playlists'],
+            data.get('collisions', ()),
+            data.get('with_playlist', True),
+            data.get('layout', 'flat'),
+        )
+
+    def save(self, path):
+        import json
+
+        M3uDump.write_atomic(path, json.dumps(self.to_dict(), ensure_ascii=False, indent=2).encode('utf-8'))
+        log.info('plan written: {}'.format(path))
+
+    @classmethod
+    def load(cls, path):
+        import json
+
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+    def check_job(self, dumper):
+        """Raise ``PlanMismatch`` unless the plan was made for this job's playlists and destinations."""
+        load_m3u_path = dumper.args.get('load_m3u_path')
+        if load_m3u_path and os.path.abspath(load_m3u_path) != self.load_m3u_path:
+            raise PlanMismatch('plan was made for playlists in {0}, not {1}'.format(
+                self.load_m3u_path, load_m3u_path))
+        planned = [os.path.abspath(dest['path']) for dest in self.destinations]
+        requested = [os.path.abspath(spec['path']) for spec in dumper.destinations]
+        if requested and requested != planned:
+            raise PlanMismatch('plan was made for destinations {0}, not {1}'.format(planned, requested))
+        layout = dumper.args.get('layout') or 'flat'
+        if layout != self.layout:
+            raise PlanMismatch('plan was made for the {0} layout, not {1}'.format(self.layout, layout))
+
+    def use_destinations(self, dumper):
+        """Point the dumper, and its report, at the plan's (absolute) destination paths."""
+        specs = dumper.destinations or [dict(dest) for dest in self.destinations]
+        counters = dumper.report['destinations']
+        dumper.destinations = [dict(spec, path=dest['path']) for spec, dest in zip(specs, self.destinations)]
+        dumper.report['destinations'] = {
+            dest['path']: counters.get(spec['path']) or dumper.new_destination_report()
+            for spec, dest in zip(specs, self.destinations)
+        }
+
+    def apply(self, dumper, verify=True):
+        """Run the planned operations, then save each playlist, one playlist at a time.
+
+        ``verify`` (for plans loaded from a file) checks the job, the free
+        space and that every source is unchanged; a plan built in the same
+        run skips those checks and reuses the sizes it already has.
+        """
+        if verify:
+            self.check_job(dumper)
+            if not self.check_space():
+                log.warning('applying a plan that does not fit in its destinations')
+        self.use_destinations(dumper)
+        options = dumper.copy_options(False)
+        executor = dumper.get_fanout_executor(len(self.destinations)) if len(self.destinations) > 1 else None
+        skip_existing = {dest['path']: dest['skip_existing'] for dest in self.destinations}
+        report = dumper.report
+
+        for playlist in self.playlists:
+            dumper.make_directories(target['dst'] for op in playlist['operations'] for target in op['targets'])
+            for op in playlist['operations']:
+                dumper.check_cancelled()
+                self._apply_operation(dumper, op, skip_existing, options.get('limiter'), executor, verify)
+            if self.with_playlist:
+                dumper.layout_playlist(playlist['lines'])
+                exclude = {dest['path']: self.excluded(playlist, dest['path']) for dest in self.destinations}
+                dumper.save_playlists(playlist['name'], playlist['lines'], False, exclude)
+            report['playlists_processed'] += 1
+
+    @staticmethod
+    def _apply_operation(dumper, op, skip_existing, limiter, executor, verify=True):
+        report = dumper.report
+        src = op['src']
+        if verify:
+            try:
+                st = dumper.stat(src)
+            except OSError:
+                log.warning('skip copy, because music file({}) was not found.'.format(src))
+                report['copy_skipped_missing'] += 1
+                return
+            if (st.st_size, st.st_mtime_ns) != (op['size'], op['mtime_ns']):
+                log.warning('music file({}) changed since the plan was made.'.format(src))
+
+        copies = []
+        for target in op['targets']:
+            action, dst = target['action'], target['dst']
+            if action in ('copy', 'hardlink', 'symlink', 'dedup_hardlink') \
+                    and skip_existing[target['destination']] and os.path.exists(dst):
+                action = 'skip_existing'
+            if action == 'copy':
+                copies.append(target)
+                continue
+            if action == 'skip_existing':
+                report['copy_skipped_existing'] += 1
+            elif action == 'skip_budget':
+                report['copy_skipped_budget'] += 1
+            elif action in ('hardlink', 'symlink'):
+                M3uDump._materialize(src, dst, action, report)
+            elif action == 'dedup_hardlink':
+                M3uDump.link_replace(target['link_from'], dst)
+                report['content_deduplicated'] += 1
+            elif action == 'dedup_reference':
+                report['content_deduplicated'] += 1
+            log.info('{0} {1} -> {2}'.format(REPORT_ACTIONS[action], src, dst))
+            report['details'].append({'type': REPORT_ACTIONS[action], 'src': src, 'dst': dst})
+            dumper.count_destination(target['destination'], REPORT_ACTIONS[action])
+
+        if len(copies) == 1:
+            M3uDump._copyfile(src, copies[0]['dst'], limiter)
+        elif copies:
+            copy_fanout(src, [target['dst'] for target in copies], limiter, executor)
+        for target in copies:
+            log.info('copied {0} -> {1}'.format(src, target['dst']))
+            report['copied'] += 1
+            report['details'].append({'type': 'copied', 'src': src, 'dst': target['dst']})
+            dumper.count_destination(target['destination'], 'copied', op['size'])
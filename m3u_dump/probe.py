@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+
+from m3u_dump.hosts import HostRateLimiter, url_host
+
+log = logging.getLogger(__name__)
+
+USER_AGENT = 'm3u-dump/1.2'
+
+
+def probe_url(url, timeout=5.0, clock=time.monotonic):
+    """Open ``url`` with a GET and stop after the first body byte.
+
+    Returns ``status``, ``ttfb_ms`` (request start to first body byte),
+    ``content_type``, ``final_url``, ``alive`` (2xx/3xx) and ``error``.
+    """
+    from urllib.error import HTTPError
+    from urllib.request import Request, urlopen
+
+    result = {
+        'url': url,
+        'status': None,
+        'ttfb_ms': None,
+        'content_type': '',
+        'final_url': url,
+        'alive': False,
+        'error': '',
+    }
+    start = clock()
+    try:
+        with urlopen(Request(url, headers={'User-Agent': USER_AGENT}), timeout=timeout) as resp:
+            resp.read(1)
+            result.update(
+                status=resp.status,
+                content_type=resp.headers.get('Content-Type', ''),
+                final_url=resp.geturl(),
+                alive=200 <= resp.status < 400,
+            )
+    except HTTPError as exc:
+        result.update(status=exc.code, error=str(exc.reason))
+    except Exception as exc:
+        result['error'] = str(exc) or exc.__class__.__name__
+    if result['status'] is not None:
+        result['ttfb_ms'] = round((clock() - start) * 1000, 1)
+    return result
+
+
+class StreamProber:
+    """Probe many URLs concurrently, at most ``rate`` requests per second per host."""
+
+    def __init__(self, workers=8, rate=None, timeout=5.0, probe=probe_url):
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.rate_limiter = HostRateLimiter(rate) if rate else None
+        self._probe_url = probe
+
+    def _probe(self, url, cancel_event=None):
+        if cancel_event is not None and cancel_event.is_set():
+            return None
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(url_host(url))
+        return self._probe_url(url, self.timeout)
+
+    def probe(self, urls, cancel_event=None):
+        """Return ``{url: result}`` (``None`` for URLs skipped after cancellation)."""
+        from concurrent.futures import ThreadPoolExecutor
+
+        unique = list(dict.fromkeys(urls))
+        if not unique:
+            return {}
+        with ThreadPoolExecutor(min(self.workers, len(unique)), thread_name_prefix='m3u-dump-probe') as executor:
+            return dict(zip(unique, executor.map(lambda url: self._probe(url, cancel_event), unique)))
+
+
+def stream_rank(result, slow_ms=None):
+    """0 for a fast live stream, 1 for a slow one, 2 for a dead (or unprobed) one."""
+    if result is None or not result['alive']:
+        return 2
+    if slow_ms is not None and result['ttfb_ms'] is not None and result['ttfb_ms'] > slow_ms:
+        return 1
+    return 0
+
+
+def reorder_streams(playlist_lines, results, dead='keep', slow_ms=None):
+    """Drop or move dead/slow URL entries of a playlist.
+
+    Every URL entry (with the ``#EXTINF`` lines right before it) keeps to the
+    slots URL entries already occupy, so local files do not move. With
+    ``slow_ms`` slow streams go after the fast ones; ``dead='last'`` moves dead
+    streams to the end of those slots and ``dead='drop'`` removes them
+    (entries left unprobed after a cancellation are never dropped).
+    """
+    from m3u_dump.m3u_dump import M3uDump
+
+    entries = []
+    pending = []
+    for line in playlist_lines:
+        if line.lstrip().startswith('#EXTM3U'):
+            entries.append(([line], None))
+        elif M3uDump.is_comment(line):
+            pending.append(line)
+        else:
+            entries.append((pending + [line], line if M3uDump.is_url(line) else None))
+            pending = []
+
+    if dead == 'drop':
+        entries = [(block, url) for block, url in entries
+                   if url is None or results.get(url) is None or results[url]['alive']]
+    ranked = [(stream_rank(results.get(url), slow_ms), block) for block, url in entries if url is not None]
+    if slow_ms is not None or dead == 'last':
+        keep_dead = dead != 'last'
+        ranked.sort(key=lambda item: 0 if keep_dead and item[0] == 2 else item[0])
+    blocks = iter(block for _rank, block in ranked)
+
+    lines = []
+    for block, url in entries:
+        lines.extend(block if url is None else next(blocks))
+    lines.extend(pending)
+    return lines
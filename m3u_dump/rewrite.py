@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+import re
+
+DRIVE_RE = re.compile(r'^[A-Za-z]:')
+
+
+def is_windows_path(path):
+    return bool(DRIVE_RE.match(path)) or '\\' in path
+
+
+def path_components(path):
+    """Split ``path`` on both ``/`` and ``\\``; a leading root is kept as ``/`` (``//`` for UNC)."""
+    normalized = path.replace('\\', '/')
+    if normalized.startswith('//'):
+        root = ['//']
+    elif normalized.startswith('/'):
+        root = ['/']
+    else:
+        root = []
+    return root + [part for part in normalized.split('/') if part and part != '.']
+
+
+def join_components(prefix, parts):
+    """Append ``parts`` to ``prefix`` with the separator style of ``prefix``."""
+    if not parts:
+        return prefix
+    sep = '\\' if is_windows_path(prefix) else '/'
+    return prefix.rstrip('/\\') + sep + sep.join(parts)
+
+
+def parse_rule(spec):
+    """``'FROM=TO'`` -> ``(FROM, TO)``."""
+    source, sep, target = spec.partition('=')
+    if not sep or not source or not target:
+        raise ValueError('rewrite rule must look like FROM=TO: {!r}'.format(spec))
+    return source, target
+
+
+class RewriteRules:
+    """Longest-prefix path rewriting over many ``FROM=TO`` rules.
+
+    Prefixes are matched whole path component at a time through a trie, so
+    ``/music`` never matches ``/musicians``. ``/`` and ``\\`` are the same
+    separator and a Windows ``FROM`` (drive letter or backslashes) matches
+    case-insensitively. The rest of the path is appended to ``TO`` with
+    ``TO``'s separator style.
+    """
+
+    def __init__(self, rules=()):
+        self.rules = []
+        self._exact = {}
+        self._folded = {}
+        for source, target in rules:
+            self.add(source, target)
+
+    @classmethod
+    def from_specs(cls, specs):
+        return cls(parse_rule(spec) for spec in specs)
+
+    def add(self, source, target):
+        folded = is_windows_path(source)
+        node = self._folded if folded else self._exact
+        for part in path_components(source):
+            node = node.setdefault(part.casefold() if folded else part, {})
+        node[None] = target
+        self.rules.append((source, target))
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    @staticmethod
+    def _match(node, parts, folded):
+        best = None
+        for depth, part in enumerate(parts):
+            node = node.get(part.casefold() if folded else part)
+            if node is None:
+                break
+            if None in node:
+                best = (depth + 1, node[None])
+        return best
+
+    def rewrite(self, path):
+        """Rewritten ``path``, or ``None`` when no rule matches."""
+        parts = path_components(path)
+        matches = [m for m in (self._match(self._exact, parts, False), self._match(self._folded, parts, True)) if m]
+        if not matches:
+            return None
+        depth, target = max(matches, key=lambda match: match[0])
+        return join_components(target, parts[depth:])
+
+
+def suggest_rules(entries, search_index, limit=5):
+    """Guess ``FROM=TO`` rules from missing entries and where the index finds their basenames.
+
+    For each entry and candidate directory the common trailing directories
+    (compared case-sensitively) are stripped; what is left on each side is
+    a candidate rule. Returns
+    ``[{'rule': 'FROM=TO', 'matches': n}]``, most supported first.
+    """
+    votes = {}
+    for entry in entries:
+        parts = path_components(entry)
+        if len(parts) < 2:
+            continue
+        dirs = parts[:-1]
+        for root in search_index.get(parts[-1]) or ():
+            root_parts = path_components(root)
+            common = 0
+            while (common < len(dirs) - 1 and common < len(root_parts) - 1
+                   and dirs[-1 - common] == root_parts[-1 - common]):
+                common += 1
+            if not common:
+                continue
+            source = _render(dirs[:len(dirs) - common], '\\' if is_windows_path(entry) else '/')
+            target = _render(root_parts[:len(root_parts) - common], '\\' if is_windows_path(root) else '/')
+            key = '{0}={1}'.format(source, target)
+            votes[key] = votes.get(key, 0) + 1
+    ranked = sorted(votes.items(), key=lambda item: (-item[1], item[0]))
+    return [{'rule': rule, 'matches': count} for rule, count in ranked[:limit]]
+
+
+def _render(parts, sep):
+    if parts and parts[0] in ('/', '//'):
+        return parts[0].replace('/', sep) + sep.join(parts[1:])
+    return sep.join(parts)
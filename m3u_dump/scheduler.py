@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+
+SMALL_FILE_THRESHOLD = 1024 * 1024
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class BandwidthLimiter:
+    """Token bucket shared by every copy of a run (rate in bytes per second)."""
+
+    def __init__(self, rate, burst=None, clock=time.monotonic, sleep=time.sleep):
+        if rate <= 0:
+            raise ValueError('rate must be positive: {}'.format(rate))
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else rate)
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.burst
+        self._last = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def consume(self, nbytes):
+        self._refill()
+        self._tokens -= nbytes
+        if self._tokens < 0:
+            self._sleep(-self._tokens / self.rate)
+            self._refill()
+
+
+def copy_throttled(src, dst, limiter, chunk_size=COPY_CHUNK_SIZE):
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        while True:
+            chunk = fsrc.read(chunk_size)
+            if not chunk:
+                break
+            limiter.consume(len(chunk))
+            fdst.write(chunk)
+
+
+def copy_fanout(src, dsts, limiter=None, executor=None, chunk_size=COPY_CHUNK_SIZE):
+    """Copy ``src`` to every path in ``dsts`` reading the source only once.
+
+    With an ``executor`` each chunk is written to all destinations in parallel
+    while the next chunk is read. ``limiter`` is charged for every byte
+    written, so N destinations share the rate of a single copy. When
+    anything fails the partial destinations are removed and the error is raised.
+    """
+    files = []
+    pending = []
+    try:
+        with open(src, 'rb') as fsrc:
+            for dst in dsts:
+                files.append(open(dst, 'wb'))
+            while True:
+                chunk = fsrc.read(chunk_size)
+                for future in pending:
+                    future.result()
+                pending = []
+                if not chunk:
+                    break
+                if limiter is not None:
+                    limiter.consume(len(chunk) * len(files))
+                if executor is None:
+                    for f in files:
+                        f.write(chunk)
+                else:
+                    pending = [executor.submit(f.write, chunk) for f in files]
+            for f in files:
+                f.close()
+    except BaseException:
+        for future in pending:
+            if not future.cancel():
+                try:
+                    future.result()
+                except BaseException:
+                    pass
+        for f in files:
+            f.close()
+        for dst in dsts[:len(files)]:
+            try:
+                os.unlink(dst)
+            except OSError:
+                pass
+        raise
+
+
+def schedule_operations(operations, small_file_threshold=SMALL_FILE_THRESHOLD):
+    """Order copy operations for locality.
+
+    Each operation is a dict with at least ``src`` and ``stat`` (``os.stat_result``).
+    Operations are grouped by source device, small files are batched ahead of
+    large ones, and within a batch files are read directory by directory in
+    inode order, which roughly follows the on-disk layout.
+    """
+    def key(op):
+        st = op['stat']
+        return (
+            st.st_dev,
+            st.st_size >= small_file_threshold,
+            os.path.dirname(op['src']),
+            st.st_ino,
+            op['src'],
+        )
+
+    return sorted(operations, key=key)
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+import struct
+import sys
+from array import array
+from collections.abc import Mapping
+
+log = logging.getLogger(__name__)
+
+MAGIC = b'M3UIDX01'
+# magic, byte order ('<' or '>'), directory count, name count, posting count
+HEADER = struct.Struct('=8sc3xIII8x')
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def walk_search_path(search_path):
+    """``(root, filenames, mtime_ns)`` per directory, in ``os.walk`` order."""
+    for root, _dirs, files in os.walk(search_path):
+        try:
+            mtime = os.stat(root).st_mtime_ns
+        except OSError:
+            mtime = -1
+        yield root, files, mtime
+
+
+class CompactIndex(Mapping):
+    """Read-only ``basename -> [roots]`` index packed into one buffer.
+
+    Directories are stored once in a directory table and referenced by id;
+    basenames are sorted in a single blob and looked up by binary search;
+    each basename's directories are a slice of one ``array('I')`` posting
+    list. The buffer has the same layout in memory and on disk, so a saved
+    index is memory-mapped and shared by every process that opens it.
+    Lookups return the roots in scan order, like
+    ``M3uDump.get_search_path_files``.
+    """
+
+    def __init__(self, buffer, mapped=None):
+        self._buffer = buffer
+        self._mapped = mapped
+        magic, byteorder, n_dirs, n_names, n_postings = HEADER.unpack_from(buffer, 0)
+        native = b'<' if sys.byteorder == 'little' else b'>'
+        if magic != MAGIC or byteorder != native:
+            raise ValueError('not a search index for this machine')
+        view = memoryview(buffer)
+        offset = HEADER.size
+
+        def section(count, typecode, itemsize):
+            nonlocal offset
+            start = offset
+            offset = _align(offset + count * itemsize)
+            return view[start:start + count * itemsize].cast(typecode)
+
+        self._dir_offsets = section(n_dirs + 1, 'Q', 8)
+        self._dir_mtimes = section(n_dirs, 'q', 8)
+        self._name_offsets = section(n_names + 1, 'Q', 8)
+        self._post_offsets = section(n_names + 1, 'I', 4)
+        self._postings = section(n_postings, 'I', 4)
+        self._dir_base = offset
+        self._name_base = _align(offset + self._dir_offsets[n_dirs])
+        self._n_names = n_names
+
+    @staticmethod
+    def pack(walk):
+        """Build the index buffer from ``(root, filenames, mtime_ns)`` tuples."""
+        dirs = []
+        mtimes = array('q')
+        postings = {}
+        for root, files, mtime in walk:
+            dir_id = len(dirs)
+            dirs.append(os.fsencode(root))
+            mtimes.append(mtime)
+            for filename in files:
+                key = os.fsencode(filename)
+                ids = postings.get(key)
+                if ids is None:
+                    ids = postings[key] = array('I')
+                ids.append(dir_id)
+
+        names = sorted(postings)
+        dir_offsets, name_offsets = array('Q', [0]), array('Q', [0])
+        post_offsets, flat = array('I', [0]), array('I')
+        for path in dirs:
+            dir_offsets.append(dir_offsets[-1] + len(path))
+        for name in names:
+            name_offsets.append(name_offsets[-1] + len(name))
+            flat.extend(postings[name])
+            post_offsets.append(len(flat))
+        del postings
+
+        native = b'<' if sys.byteorder == 'little' else b'>'
+        out = bytearray(HEADER.pack(MAGIC, native, len(dirs), len(names), len(flat)))
+        for part in (dir_offsets, mtimes, name_offsets, post_offsets, flat):
+            out += part.tobytes()
+            out += bytes(_align(len(out)) - len(out))
+        out += b''.join(dirs)
+        out += bytes(_align(len(out)) - len(out))
+        out += b''.join(names)
+        return bytes(out)
+
+    @classmethod
+    def scan(cls, search_path):
+        return cls(cls.pack(walk_search_path(search_path)))
+
+    @classmethod
+    def open(cls, path):
+        """Memory-map a saved index (read-only, shared with other processes)."""
+        import mmap
+
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return cls(mapped, mapped)
+        except (ValueError, struct.error):
+            mapped.close()
+            raise
+
+    def save(self, path):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = '{0}.{1}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            f.write(self._buffer)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load_or_build(cls, search_path, path):
+        """Saved index at ``path`` if it still matches ``search_path``, else a fresh scan saved there."""
+        try:
+            index = cls.open(path)
+        except (OSError, ValueError, struct.error):
+            index = None
+        if index is not None:
+            if index.is_current(search_path):
+                log.info('search index loaded: {}'.format(path))
+                return index
+            index.close()
+        log.info('scanning search_path({0})...'.format(search_path))
+        index = cls.scan(search_path)
+        index.save(path)
+        return index
+
+    def is_current(self, search_path):
+        """Whether the indexed directories are unchanged (one ``stat`` per directory)."""
+        if not len(self._dir_mtimes) or self.directory(0) != search_path:
+            return False
+        for dir_id, mtime in enumerate(self._dir_mtimes):
+            try:
+                if os.stat(self.directory(dir_id)).st_mtime_ns != mtime:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def close(self):
+        for view in (self._dir_offsets, self._dir_mtimes, self._name_offsets, self._post_offsets, self._postings):
+            view.release()
+        if self._mapped is not None:
+            self._mapped.close()
+
+    def directory(self, dir_id):
+        base = self._dir_base
+        return os.fsdecode(self._buffer[base + self._dir_offsets[dir_id]:base + self._dir_offsets[dir_id + 1]])
+
+    def _name(self, i):
+        base = self._name_base
+        return self._buffer[base + self._name_offsets[i]:base + self._name_offsets[i + 1]]
+
+    def _find(self, key):
+        lo, hi = 0, self._n_names
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._name(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._n_names and self._name(lo) == key:
+            return lo
+        return None
+
+    def __getitem__(self, basename):
+        i = self._find(os.fsencode(basename))
+        if i is None:
+            raise KeyError(basename)
+        return [self.directory(dir_id) for dir_id in self._postings[self._post_offsets[i]:self._post_offsets[i + 1]]]
+
+    def __contains__(self, basename):
+        return self._find(os.fsencode(basename)) is not None
+
+    def __iter__(self):
+        return (os.fsdecode(self._name(i)) for i in range(self._n_names))
+
+    def __len__(self):
+        return self._n_names
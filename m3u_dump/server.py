@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""Local HTTP job server running dump jobs on a warm ``DumpEngine``.
+
+Endpoints (JSON in, JSON or NDJSON out):
+
+- ``POST /jobs``: queue a job (body: the same keys as the CLI options);
+  ``?stream=1`` keeps the connection open and streams progress events
+  followed by the final job as NDJSON.
+- ``GET /jobs``: list known jobs (without reports).
+- ``GET /jobs/<id>``: job status and, once finished, its report.
+- ``GET /jobs/<id>/events``: stream progress events (NDJSON) until the job ends.
+- ``DELETE /jobs/<id>``: cancel a queued or running job (a running job stops
+  at its next checkpoint and keeps a partial report).
+"""
+import contextvars
+import itertools
+import json
+import logging
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from m3u_dump.engine import DumpEngine
+
+log = logging.getLogger(__name__)
+
+JOB_DEFAULTS = {
+    'dry_run': False,
+    'playlist_pattern_list': ('*.m3u', '*.m3u8'),
+}
+MAX_EVENTS_PER_JOB = 10000
+
+_current_job = contextvars.ContextVar('m3u_dump_job', default=None)
+
+
+class _JobLogHandler(logging.Handler):
+    """Routes ``m3u_dump`` log records to the job running in the current context."""
+
+    def emit(self, record):
+        job = _current_job.get()
+        if job is not None:
+            job.add_event({'type': 'log', 'level': record.levelname, 'message': record.getMessage()})
+
+
+class Job:
+    def __init__(self, job_id, args):
+        self.id = job_id
+        self.args = args
+        self.status = 'queued'
+        self.report = None
+        self.error = None
+        self.events = []
+        self.events_dropped = 0
+        self.cancel_event = threading.Event()
+        self._cond = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed', 'cancelled')
+
+    def add_event(self, event):
+        with self._cond:
+            if len(self.events) < MAX_EVENTS_PER_JOB:
+                self.events.append(event)
+            else:
+                self.events_dropped += 1
+            self._cond.notify_all()
+
+    def set_status(self, status):
+        self.add_event({'type': 'status', 'status': status})
+        with self._cond:
+            self.status = status
+            self._cond.notify_all()
+
+    def iter_events(self, timeout=1.0):
+        """Yield events as they arrive until the job is finished."""
+        position = 0
+        while True:
+            with self._cond:
+                while position >= len(self.events) and not self.finished:
+                    self._cond.wait(timeout)
+                pending = self.events[position:]
+                position = len(self.events)
+                finished = self.finished
+            for event in pending:
+                yield event
+            if finished and position >= len(self.events):
+                return
+
+    def to_dict(self, with_report=True):
+        data = {
+            'id': self.id,
+            'status': self.status,
+            'args': self.args,
+            'error': self.error,
+            'events_dropped': self.events_dropped,
+        }
+        if with_report:
+            data['report'] = self.report
+        return data
+
+
+class JobServer:
+    """Bounded job queue consumed by ``workers`` threads sharing one engine."""
+
+    def __init__(self, engine=None, workers=1, queue_size=16, max_jobs=100):
+        self.engine = engine or DumpEngine(JOB_DEFAULTS)
+        self.jobs = {}
+        self.max_jobs = max_jobs
+        self._queue = queue.Queue(queue_size)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._handler = _JobLogHandler()
+        self._threads = [
+            threading.Thread(target=self._worker, name='m3u-dump-worker-{}'.format(i), daemon=True)
+            for i in range(max(1, workers))
+        ]
+
+    def start(self):
+        logging.getLogger('m3u_dump').addHandler(self._handler)
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        logging.getLogger('m3u_dump').removeHandler(self._handler)
+
+    def submit(self, args):
+        """Queue a job; raises ``ValueError`` on bad args and ``queue.Full`` when busy."""
+        if not isinstance(args, dict):
+            raise ValueError('job must be a JSON object')
+        for key in ('load_m3u_path', 'dump_music_path'):
+            if not args.get(key):
+                raise ValueError('missing required key: {}'.format(key))
+
+        with self._lock:
+            job = Job(str(next(self._ids)), args)
+            self._queue.put_nowait(job)
+            self.jobs[job.id] = job
+            finished = [j for j in self.jobs.values() if j.finished]
+            for old in finished[:max(0, len(self.jobs) - self.max_jobs)]:
+                del self.jobs[old.id]
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            if job.cancel_event.is_set():
+                job.set_status('cancelled')
+                continue
+            token = _current_job.set(job)
+            job.set_status('running')
+            try:
+                job.report = self.engine.run(job.args, job.cancel_event)
+                job.set_status('cancelled' if job.report.get('cancelled') else 'done')
+            except Exception as exc:
+                log.exception('job {} failed'.format(job.id))
+                job.error = str(exc)
+                job.set_status('failed')
+            finally:
+                _current_job.reset(token)
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    server_version = 'm3u-dump'
+
+    @property
+    def jobs(self):
+        return self.server.job_server
+
+    def log_message(self, format, *args):
+        log.debug('%s - %s', self.address_string(), format % args)
+
+    def _send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, job):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson; charset=utf-8')
+        self.end_headers()
+        for event in job.iter_events():
+            self.wfile.write(json.dumps(event, ensure_ascii=False).encode('utf-8') + b'\n')
+            self.wfile.flush()
+        self.wfile.write(json.dumps({'type': 'job', 'job': job.to_dict()}, ensure_ascii=False).encode('utf-8') + b'\n')
+
+    def do_GET(self):
+        parts = [p for p in urlparse(self.path).path.split('/') if p]
+        if parts == ['jobs']:
+            return self._send_json(200, [job.to_dict(with_report=False) for job in list(self.jobs.jobs.values())])
+        if len(parts) in (2, 3) and parts[0] == 'jobs':
+            job = self.jobs.get(parts[1])
+            if job is None:
+                return self._send_json(404, {'error': 'unknown job'})
+            if len(parts) == 2:
+                return self._send_json(200, job.to_dict())
+            if parts[2] == 'events':
+                return self._stream(job)
+        return self._send_json(404, {'error': 'not found'})
+
+    def do_DELETE(self):
+        parts = [p for p in urlparse(self.path).path.split('/') if p]
+        job = self.jobs.get(parts[1]) if len(parts) == 2 and parts[0] == 'jobs' else None
+        if job is None:
+            return self._send_json(404, {'error': 'unknown job'})
+        job.cancel_event.set()
+        return self._send_json(202, job.to_dict(with_report=False))
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path.rstrip('/') != '/jobs':
+            return self._send_json(404, {'error': 'not found'})
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            args = json.loads(self.rfile.read(length).decode('utf-8') or '{}')
+            job = self.jobs.submit(args)
+        except ValueError as exc:
+            return self._send_json(400, {'error': str(exc)})
+        except queue.Full:
+            return self._send_json(503, {'error': 'job queue is full'})
+
+        if parse_qs(url.query).get('stream', ['0'])[0] in ('1', 'true'):
+            return self._stream(job)
+        return self._send_json(202, job.to_dict(with_report=False))
+
+
+def make_server(host='127.0.0.1', port=8765, job_server=None):
+    httpd = ThreadingHTTPServer((host, port), JobRequestHandler)
+    httpd.daemon_threads = True
+    httpd.job_server = job_server or JobServer()
+    return httpd
@@ -1,8 +1,17 @@
 # -*- coding: utf-8 -*-
 import json
-from urllib.request import urlopen
+import os
+import threading
+import time
 
 UPDATE_MANIFEST_URL = "https://raw.githubusercontent.com/wesleiandersonti/m3u-dump/master/update.json"
+# Overrides the manifest location, e.g. a local path or file:// URL for offline testing.
+UPDATE_MANIFEST_ENV = 'M3U_DUMP_UPDATE_URL'
+CACHE_TTL = 6 * 60 * 60
+
+
+def default_cache_path():
+    return os.path.join(os.path.expanduser('~'), '.cache', 'm3u-dump', 'update-manifest.json')
 
 
 def _normalize(v: str):
@@ -16,10 +25,91 @@ def _normalize(v: str):
     return tuple(parts)
 
 
-def check_for_update(current_version: str, timeout: int = 6):
+def _load_cache(cache_path):
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_cache(cache_path, entry):
     try:
-        with urlopen(UPDATE_MANIFEST_URL, timeout=timeout) as resp:
+        os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+        tmp_path = cache_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass
+
+
+def _read_local(url):
+    from urllib.parse import urlparse
+    from urllib.request import url2pathname
+
+    path = url2pathname(urlparse(url).path) if url.startswith('file://') else url
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        return json.load(f)
+
+
+def fetch_manifest(url, cache_path=None, ttl=CACHE_TTL, timeout=6, now=time.time):
+    """Return ``(manifest, source)`` where source is ``local``, ``cache``,
+    ``not-modified``, ``network`` or ``stale-cache``.
+
+    Remote manifests are cached in ``cache_path`` for ``ttl`` seconds and then
+    revalidated with ``If-None-Match`` / ``If-Modified-Since``. A stale cache
+    is returned when the network is unreachable.
+    """
+    if not url.startswith(('http://', 'https://')):
+        return _read_local(url), 'local'
+
+    cache = _load_cache(cache_path) if cache_path else None
+    if cache and cache.get('url') != url:
+        cache = None
+    if cache and now() - cache.get('fetched_at', 0) < ttl:
+        return cache['data'], 'cache'
+
+    from urllib.error import HTTPError
+    from urllib.request import Request, urlopen
+
+    headers = {'User-Agent': 'm3u-dump-updater'}
+    if cache:
+        if cache.get('etag'):
+            headers['If-None-Match'] = cache['etag']
+        if cache.get('last_modified'):
+            headers['If-Modified-Since'] = cache['last_modified']
+
+    try:
+        with urlopen(Request(url, headers=headers), timeout=timeout) as resp:
             data = json.loads(resp.read().decode('utf-8', errors='ignore'))
+            entry = {
+                'url': url,
+                'fetched_at': now(),
+                'etag': resp.headers.get('ETag'),
+                'last_modified': resp.headers.get('Last-Modified'),
+                'data': data,
+            }
+        source = 'network'
+    except HTTPError as exc:
+        if exc.code != 304 or not cache:
+            raise
+        entry = dict(cache, fetched_at=now())
+        source = 'not-modified'
+    except Exception:
+        if not cache:
+            raise
+        return cache['data'], 'stale-cache'
+
+    if cache_path:
+        _save_cache(cache_path, entry)
+    return entry['data'], source
+
+
+def check_for_update(current_version: str, timeout: int = 6, manifest_url=None, cache_path=None, ttl=CACHE_TTL):
+    url = manifest_url or os.environ.get(UPDATE_MANIFEST_ENV) or UPDATE_MANIFEST_URL
+    try:
+        data, source = fetch_manifest(url, cache_path or default_cache_path(), ttl=ttl, timeout=timeout)
 
         remote_version = str(data.get('version', '')).strip()
         has_update = _normalize(remote_version) > _normalize(current_version)
@@ -32,6 +122,7 @@ def check_for_update(current_version: str, timeout: int = 6):
             'release_url': data.get('release_url', ''),
             'installer_url': data.get('installer_url', ''),
             'notes': data.get('notes', ''),
+            'source': source,
         }
     except Exception as exc:
         return {
@@ -40,3 +131,18 @@ def check_for_update(current_version: str, timeout: int = 6):
             'has_update': False,
             'current_version': current_version,
         }
+
+
+def check_for_update_async(current_version: str, callback, **kwargs):
+    """Run ``check_for_update`` in a daemon thread and pass the result to ``callback``.
+
+    The callback runs in the worker thread; GUI code should hand the result
+    back to its main loop (e.g. ``widget.after``).
+    """
+    thread = threading.Thread(
+        target=lambda: callback(check_for_update(current_version, **kwargs)),
+        name='m3u-dump-update-check',
+        daemon=True,
+    )
+    thread.start()
+    return thread
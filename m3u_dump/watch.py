@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+
+from m3u_dump.m3u_dump import DumpCancelled
+
+log = logging.getLogger(__name__)
+
+
+class DirectoryState:
+    """mtime snapshot of a directory tree plus its ``basename -> [roots]`` index.
+
+    ``poll`` only re-reads directories whose mtime changed, so an unchanged
+    library costs one ``stat`` per directory instead of a full rescan. The
+    index is updated in place and has the same shape as
+    ``M3uDump.get_search_path_files``.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.index = {}
+        self.dirs = {}
+
+    def scan(self):
+        self.index.clear()
+        self.dirs.clear()
+        self._add_tree(self.root)
+        return self.index
+
+    @staticmethod
+    def _read_dir(path):
+        files, subdirs = set(), set()
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if not is_dir:
+                    files.add(entry.name)
+                elif not entry.is_symlink():
+                    subdirs.add(entry.name)
+        return os.stat(path).st_mtime_ns, files, subdirs
+
+    def _add_tree(self, top):
+        names = set()
+        stack = [top]
+        while stack:
+            path = stack.pop()
+            try:
+                mtime, files, subdirs = self._read_dir(path)
+            except OSError:
+                continue
+            self.dirs[path] = (mtime, files, subdirs)
+            for filename in sorted(files):
+                self.index.setdefault(filename, []).append(path)
+            names |= files
+            stack.extend(os.path.join(path, sub) for sub in sorted(subdirs, reverse=True))
+        return names
+
+    def _remove_files(self, path, files):
+        for filename in files:
+            roots = self.index.get(filename)
+            if roots and path in roots:
+                roots.remove(path)
+                if not roots:
+                    del self.index[filename]
+
+    def _drop_tree(self, top):
+        names = set()
+        prefix = top + os.sep
+        for path in [p for p in self.dirs if p == top or p.startswith(prefix)]:
+            _mtime, files, _subdirs = self.dirs.pop(path)
+            self._remove_files(path, files)
+            names |= files
+        return names
+
+    def poll(self):
+        """Return the basenames added or removed since the last scan/poll."""
+        names = set()
+        for path in list(self.dirs):
+            if path not in self.dirs:
+                continue
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                names |= self._drop_tree(path)
+                continue
+            old_mtime, old_files, old_subdirs = self.dirs[path]
+            if mtime == old_mtime:
+                continue
+            try:
+                mtime, files, subdirs = self._read_dir(path)
+            except OSError:
+                names |= self._drop_tree(path)
+                continue
+            self.dirs[path] = (mtime, files, subdirs)
+            self._remove_files(path, old_files - files)
+            for filename in sorted(files - old_files):
+                self.index.setdefault(filename, []).append(path)
+            names |= files ^ old_files
+            for sub in sorted(old_subdirs - subdirs):
+                names |= self._drop_tree(os.path.join(path, sub))
+            for sub in sorted(subdirs - old_subdirs):
+                names |= self._add_tree(os.path.join(path, sub))
+        return names
+
+
+class PlaylistWatcher:
+    """Keeps the search index warm and re-dumps only affected playlists.
+
+    A playlist is dumped again when its own ``(mtime, size)`` changes or when
+    a file it references by basename appears in / disappears from the search
+    path. Changes are detected by polling mtimes.
+    """
+
+    def __init__(self, dumper, interval=5.0, sleep=None):
+        self.dumper = dumper
+        self.interval = interval
+        self._sleep = sleep or dumper.cancel_event.wait
+        self.library = None
+        self.playlist_tree = None
+        self.playlists = {}
+        self.references = {}
+
+    @staticmethod
+    def _signatures(paths):
+        signatures = {}
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            signatures[path] = (st.st_mtime_ns, st.st_size)
+        return signatures
+
+    def _references(self, playlist_path):
+        dumper = self.dumper
+        return {
+            os.path.basename(line)
+            for line in dumper.parse_playlist(playlist_path)
+            if not dumper.is_comment(line) and not dumper.is_url(line)
+        }
+
+    def prime(self):
+        """Scan everything once; returns every playlist (all need a first dump)."""
+        args = self.dumper.args
+        if args.get('fix_search_path'):
+            self.library = DirectoryState(args['fix_search_path'])
+            self.dumper.search_index = self.library.scan()
+        if os.path.isdir(args['load_m3u_path']):
+            self.playlist_tree = DirectoryState(args['load_m3u_path'])
+            self.playlist_tree.scan()
+        self.playlists = self._signatures(self.dumper.collect_playlists())
+        return sorted(self.playlists)
+
+    def poll(self):
+        """Return the playlists that need a new dump."""
+        changed_names = self.library.poll() if self.library is not None else set()
+        if self.playlist_tree is not None and self.playlist_tree.poll():
+            paths = self.dumper.collect_playlists()
+        else:
+            paths = list(self.playlists)
+
+        current = self._signatures(paths)
+        affected = [path for path, signature in current.items() if self.playlists.get(path) != signature]
+        if changed_names:
+            affected.extend(
+                path for path in current
+                if path not in affected and self.references.get(path, set()) & changed_names
+            )
+        for path in set(self.references) - set(current):
+            del self.references[path]
+        self.playlists = current
+        return sorted(affected)
+
+    def dump(self, paths):
+        self.dumper.reset_run()
+        try:
+            for path in paths:
+                self.references[path] = self._references(path)
+                self.dumper.dump_playlist(path)
+        except DumpCancelled:
+            self.dumper.report['cancelled'] = True
+            raise
+        finally:
+            self.dumper.finish_run()
+
+    def run(self, max_cycles=None):
+        """Poll until ``max_cycles`` polls are done or the dumper is cancelled."""
+        cycles = 0
+        try:
+            self.dump(self.prime())
+            while (max_cycles is None or cycles < max_cycles) and not self.dumper.cancelled:
+                self._sleep(self.interval)
+                if self.dumper.cancelled:
+                    break
+                affected = self.poll()
+                if affected:
+                    log.info('changed playlists: {}'.format(affected))
+                    self.dump(affected)
+                cycles += 1
+        except (KeyboardInterrupt, DumpCancelled):
+            pass
+        log.info('watch stopped.')
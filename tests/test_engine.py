@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_engine
+----------------------------------
+
+Tests for `m3u_dump.engine` module.
+"""
+import os
+
+import pytest
+
+from m3u_dump.engine import DumpEngine, StatCache
+from m3u_dump.m3u_dump import M3uDump
+
+
+def test_stat_cache_caches_hits_and_misses(tmpdir):
+    now = [0.0]
+    cache = StatCache(ttl=5, clock=lambda: now[0])
+    path = str(tmpdir.join('a.mp3'))
+    with pytest.raises(OSError):
+        cache.stat(path)
+    tmpdir.join('a.mp3').write('a')
+    with pytest.raises(OSError):
+        cache.stat(path)
+    now[0] = 6
+    assert cache.stat(path).st_size == 1
+
+
+def test_engine_reuses_caches_with_isolated_reports(tmpdir, monkeypatch):
+    resolved = []
+
+    def fake_resolve(url, timeout=8):
+        resolved.append(url)
+        return url + '/final'
+
+    monkeypatch.setattr(M3uDump, '_resolve_final_url_strict', staticmethod(fake_resolve))
+    scans = []
+    monkeypatch.setattr(M3uDump, 'get_search_path_files', staticmethod(lambda path: scans.append(path)))
+
+    library = tmpdir.mkdir('library')
+    library.join('one.mp3').write('1')
+    playlist = tmpdir.join('p.m3u')
+    playlist.write('#EXTM3U\n/old/one.mp3\nhttp://example.invalid/live\n/old/two.mp3\n')
+
+    engine = DumpEngine({'dry_run': False, 'fix_search_path': str(library)})
+    reports = []
+    for name in ('dst1', 'dst2'):
+        reports.append(engine.run({
+            'load_m3u_path': str(playlist),
+            'dump_music_path': str(tmpdir.mkdir(name)),
+        }))
+        assert os.path.exists(str(tmpdir.join(name, 'one.mp3')))
+
+    assert reports[0] is not reports[1]
+    assert reports[0]['copied'] == reports[1]['copied'] == 1
+    assert reports[1]['origin_links'][0]['final_url'] == 'http://example.invalid/live/final'
+    assert resolved == ['http://example.invalid/live']
+    assert scans == []
+
+    library.join('two.mp3').write('2')
+    st = os.stat(str(library))
+    os.utime(str(library), ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 10))
+    report = engine.run({'load_m3u_path': str(playlist), 'dump_music_path': str(tmpdir.mkdir('dst3'))})
+    assert report['copied'] == 2
+    assert report['unresolved_paths'] == 0
+
+
+def test_legacy_static_calls_still_work(tmpdir):
+    library = tmpdir.mkdir('library')
+    library.join('one.mp3').write('1')
+    files = M3uDump.get_search_path_files(str(library))
+    lines = M3uDump.fix_playlist(files, ['#EXTINF:1,a', '/old/one.mp3'])
+    assert lines == ['#EXTINF:1,a', str(library.join('one.mp3'))]
+    dst = tmpdir.mkdir('dst')
+    assert M3uDump.copy_music(lines, str(dst), False) == {}
+    assert os.path.exists(str(dst.join('one.mp3')))
+
+
+def test_library_call_with_minimal_args(tmpdir):
+    music = tmpdir.mkdir('music')
+    music.join('a.mp3').write('a')
+    playlists = tmpdir.mkdir('playlists')
+    playlists.join('p.m3u').write('#EXTM3U\n{}\n'.format(music.join('a.mp3')))
+    playlists.join('notes.txt').write('not a playlist')
+    dst = tmpdir.mkdir('out')
+    dumper = M3uDump({'load_m3u_path': str(playlists), 'dump_music_path': str(dst), 'dry_run': False})
+    dumper.start()
+    assert dumper.report['playlists_processed'] == 1
+    assert sorted(os.listdir(str(dst))) == ['a.mp3', 'p.m3u']
+
+
+def test_engine_host_guards_follow_job_options():
+    engine = DumpEngine()
+    guard = engine.host_guard({'url_timeout': 8})
+    assert engine.host_guard({}) is guard
+    strict = engine.host_guard({'url_timeout': 2, 'url_breaker_threshold': 1})
+    assert strict is not guard
+    assert (strict.timeout, strict.failure_threshold) == (2, 1)
+    assert engine.host_guard({'url_breaker_threshold': 1, 'url_timeout': 2}) is strict
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_formats
+------------
+
+Tests for `m3u_dump.formats` module.
+"""
+import os
+
+import pytest
+from click.testing import CliRunner
+
+from m3u_dump import cli
+from m3u_dump.formats import PlaylistFormat, parse_entries, render_formats
+from m3u_dump.m3u_dump import M3uDump
+
+LINES = ['#EXTM3U', '#EXTINF:215,Artista - Canção', '/music/a/song.mp3', '#EXTINF:-1,Rádio', 'http://r.example/s',
+         '#EXTINF:1,orphan']
+
+
+def _entries():
+    return parse_entries(LINES, M3uDump.is_comment, M3uDump.is_url)
+
+
+def test_parse_entries():
+    entries = _entries()
+    assert entries[0] == (['#EXTM3U', '#EXTINF:215,Artista - Canção'], '/music/a/song.mp3', False)
+    assert entries[1] == (['#EXTINF:-1,Rádio'], 'http://r.example/s', True)
+    assert entries[2] == (['#EXTINF:1,orphan'], None, False)
+
+
+def test_render_formats_single_pass():
+    formats = [PlaylistFormat.parse(spec, newline='lf') for spec in ('m3u:latin-1', 'pls', 'xspf')]
+    (m3u, m3u_text), (pls, pls_text), (xspf, xspf_text) = render_formats(
+        _entries(), formats, os.path.basename, '/dst')
+
+    assert m3u.encoding == 'latin-1' and xspf.encoding == 'utf-8'
+    assert m3u_text.splitlines() == ['#EXTM3U', '#EXTINF:215,Artista - Canção', 'song.mp3', '#EXTINF:-1,Rádio',
+                                     'http://r.example/s', '#EXTINF:1,orphan']
+    assert pls_text.splitlines() == ['[playlist]', 'File1=song.mp3', 'Title1=Artista - Canção', 'Length1=215',
+                                     'File2=http://r.example/s', 'Title2=Rádio', 'Length2=-1',
+                                     'NumberOfEntries=2', 'Version=2']
+    assert '<track><location>song.mp3</location><title>Artista - Canção</title><duration>215000</duration>' \
+           '</track>' in xspf_text
+    assert '<location>http://r.example/s</location><title>Rádio</title></track>' in xspf_text
+    assert xspf_text.endswith('</playlist>\n')
+
+
+def test_path_styles_and_encoding():
+    absolute = PlaylistFormat('m3u', paths='absolute', newline='crlf')
+    ((_fmt, text),) = render_formats(_entries(), [absolute], lambda line: os.path.join('a', 'song.mp3'), '/dst')
+    assert text.split('\r\n')[2] == os.path.abspath('/dst/a/song.mp3')
+
+    relative = PlaylistFormat('m3u', paths='relative')
+    assert relative.location('/music/a/song.mp3', False, os.path.join('a', 'song.mp3'), '/dst') == 'a/song.mp3'
+
+    ascii_format = PlaylistFormat('m3u', 'ascii')
+    assert ascii_format.encode('Canção', 'x.m3u') == b'Can??o'
+    assert PlaylistFormat('m3u8', 'latin-1').encoding == 'utf-8'
+    with pytest.raises(LookupError):
+        PlaylistFormat('m3u', 'no-such-codec')
+    with pytest.raises(ValueError):
+        PlaylistFormat.parse('wpl')
+    assert PlaylistFormat.from_args({}) is None
+    assert PlaylistFormat.from_args({'playlist_newline': 'crlf'})[0].filename('car.m3u') == 'car.m3u'
+
+
+def test_dump_writes_every_format(tmpdir):
+    music = tmpdir.mkdir('music')
+    music.join('song.mp3').write('x')
+    playlist = tmpdir.join('car.m3u')
+    playlist.write_text('\n'.join(['#EXTM3U', '#EXTINF:215,Canção', str(music.join('song.mp3'))]), 'utf-8')
+    dst = tmpdir.mkdir('dst')
+    args = {
+        'load_m3u_path': str(playlist),
+        'dump_music_path': str(dst),
+        'dry_run': False,
+        'playlist_format': ('m3u:latin-1', 'm3u8', 'pls', 'xspf'),
+        'playlist_newline': 'crlf',
+    }
+    dumper = M3uDump(args)
+    dumper.start()
+
+    assert sorted(os.listdir(str(dst))) == ['car.m3u', 'car.m3u8', 'car.pls', 'car.xspf', 'song.mp3']
+    assert dst.join('car.m3u').read_binary() == '#EXTM3U\r\n#EXTINF:215,Canção\r\nsong.mp3\r\n'.encode('latin-1')
+    assert dst.join('car.m3u8').read_binary().decode('utf-8').startswith('#EXTM3U\r\n')
+    assert 'File1=song.mp3' in dst.join('car.pls').read_binary().decode('latin-1')
+    assert dumper.report['destinations'][str(dst)]['playlists_written'] == 1
+
+    again = M3uDump(args)
+    again.start()
+    assert again.report['playlists_unchanged'] == 1
+
+
+def test_cli_rejects_unknown_format(tmpdir):
+    playlist = tmpdir.join('car.m3u')
+    playlist.write('#EXTM3U\n')
+    result = CliRunner().invoke(cli.main, [str(playlist), str(tmpdir.join('dst')), '--playlist-format', 'm3u:nope'])
+    assert result.exit_code == 2
+    assert 'playlist-format' in result.output
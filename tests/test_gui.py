@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_gui
+----------------------------------
+
+Tests for `m3u_dump.gui` module (no display needed).
+"""
+import logging
+import threading
+
+import pytest
+
+pytest.importorskip('tkinter')
+
+from m3u_dump.gui import LogBridge  # noqa: E402
+
+
+def test_log_bridge_collects_worker_records_in_batches():
+    bridge = LogBridge('m3u_dump.test_gui')
+    bridge.attach()
+    bridge.attach()
+    logger = logging.getLogger('m3u_dump.test_gui')
+    logger.setLevel(logging.DEBUG)
+    try:
+        worker = threading.Thread(target=lambda: [logger.info('copied %d', i) for i in range(25)])
+        worker.start()
+        worker.join()
+        logger.debug('hidden')
+
+        first = bridge.drain(max_records=10)
+        assert len(first) == 10
+        assert first[0].endswith('[INFO] copied 0')
+        rest = bridge.drain()
+        assert len(rest) == 15
+        assert rest[-1].endswith('copied 24')
+        assert bridge.drain() == []
+    finally:
+        bridge.detach()
+    logger.info('after detach')
+    assert bridge.drain() == []
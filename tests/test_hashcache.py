@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_hashcache
+----------------------------------
+
+Tests for `m3u_dump.hashcache` module.
+"""
+import os
+import threading
+
+from m3u_dump.hashcache import ContentIndex, HashCache
+
+
+def _op(path):
+    return {'src': str(path), 'dst': str(path) + '.dst', 'stat': os.stat(str(path))}
+
+
+def test_hash_cache_persists_and_hits(tmpdir):
+    f = tmpdir.join('a.mp3')
+    f.write('same content')
+    cache_path = str(tmpdir.join('cache.json'))
+
+    cache = HashCache(cache_path)
+    digest = cache.get(str(f))
+    assert cache.misses == 1
+    cache.save()
+
+    cache = HashCache(cache_path)
+    assert cache.get(str(f)) == digest
+    assert cache.hits == 1
+    assert cache.misses == 0
+
+
+def test_hash_cache_invalidated_by_size_change(tmpdir):
+    f = tmpdir.join('a.mp3')
+    f.write('one')
+    cache = HashCache(str(tmpdir.join('cache.json')))
+    first = cache.get(str(f))
+    f.write('one plus more')
+    assert cache.get(str(f)) != first
+    assert cache.misses == 2
+
+
+def test_content_index_hashes_only_size_collisions(tmpdir):
+    a = tmpdir.join('a.mp3')
+    a.write('abc')
+    b = tmpdir.mkdir('sub').join('b.mp3')
+    b.write('abc')
+    c = tmpdir.join('c.mp3')
+    c.write('xyz')
+    d = tmpdir.join('d.mp3')
+    d.write('longer file')
+
+    index = ContentIndex(HashCache())
+    op_a, op_b, op_c, op_d = _op(a), _op(b), _op(c), _op(d)
+    assert index.match(op_a) is op_a
+    assert index.match(op_d) is op_d
+    assert index.cache.misses == 0
+    assert index.match(op_b) is op_a
+    assert index.match(op_c) is op_c
+    assert index.cache.misses == 3
+    assert (index.hashed, index.cache_hits) == (3, 0)
+
+
+def test_hash_cache_shared_between_threads(tmpdir):
+    files = []
+    for i in range(200):
+        f = tmpdir.join('{}.mp3'.format(i))
+        f.write(str(i))
+        files.append(str(f))
+    cache_path = str(tmpdir.join('cache.json'))
+    cache = HashCache(cache_path)
+    errors = []
+
+    def job(offset):
+        try:
+            for i, path in enumerate(files[offset:] + files[:offset]):
+                cache.get(path)
+                if i % 10 == 0:
+                    cache.save()
+            cache.save()
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=job, args=(offset,)) for offset in (0, 70, 140)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert cache.hits + cache.misses == 600
+    assert len(HashCache(cache_path).entries) == 200
+    assert [name for name in os.listdir(str(tmpdir)) if name.endswith('.tmp')] == []
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_layout
+-----------
+
+Tests for `m3u_dump.layout` module.
+"""
+import os
+
+import pytest
+from click.testing import CliRunner
+
+from m3u_dump import cli
+from m3u_dump.layout import DirectoryLayout, leaf_directories, safe_component
+from m3u_dump.m3u_dump import M3uDump
+
+
+def test_layout_targets(tmpdir):
+    root = str(tmpdir)
+    mirror = DirectoryLayout('mirror', [root])
+    assert mirror.target(os.path.join(root, 'A', 'B', 'c.mp3')) == os.path.join('A', 'B', 'c.mp3')
+    assert mirror.target(os.path.join(root, 'c.mp3')) == 'c.mp3'
+    outside = mirror.target('/other/x:y/c.mp3')
+    assert outside == os.path.join('other', 'x_y', 'c.mp3')
+
+    artist_album = DirectoryLayout('artist-album')
+    assert artist_album.target('/m/Art/Alb/c.mp3') == os.path.join('Art', 'Alb', 'c.mp3')
+    assert artist_album.target('/m/Art/Alb/c.mp3', ['#EXTINF:1,AC/DC - T']) == os.path.join('AC_DC', 'Alb', 'c.mp3')
+
+    shard, name = os.path.split(DirectoryLayout('hashed').target('/m/c.mp3'))
+    assert len(shard) == 2 and name == 'c.mp3'
+    assert DirectoryLayout('hashed').target('/m/c.mp3') == DirectoryLayout('hashed').target('/m/c.mp3')
+
+    assert safe_component(' Mr. ') == 'Mr' and safe_component('...') == '_'
+    assert DirectoryLayout.from_args({'layout': 'flat'}) is None
+    with pytest.raises(ValueError):
+        DirectoryLayout('by-year')
+
+
+def test_leaf_directories():
+    paths = ['/d/a/x.mp3', '/d/a b/y.mp3', '/d/a/c/z.mp3', '/d/a/c/w.mp3', '/d/q.mp3']
+    assert leaf_directories(paths) == ['/d/a b', '/d/a/c']
+
+
+def _library(tmpdir):
+    music = tmpdir.mkdir('music')
+    for artist, album in (('Art', 'One'), ('Other', 'Two')):
+        music.mkdir(artist).mkdir(album).join('01.mp3').write(artist)
+    playlist = tmpdir.join('car.m3u')
+    playlist.write('\n'.join(['#EXTM3U', '#EXTINF:1,Band - Song', str(music.join('Art', 'One', '01.mp3')),
+                              str(music.join('Other', 'Two', '01.mp3')), 'http://example.com/s']))
+    return str(playlist), str(music)
+
+
+def test_dump_mirror_layout(tmpdir, monkeypatch):
+    playlist, music = _library(tmpdir)
+    dst = tmpdir.mkdir('dst')
+    made = []
+    makedirs = os.makedirs
+
+    def record(path, *args, **kwargs):
+        if not kwargs:  # os.makedirs creates the parents through recursive keyword calls
+            made.append(path)
+        return makedirs(path, *args, **kwargs)
+
+    monkeypatch.setattr(os, 'makedirs', record)
+    dumper = M3uDump({'load_m3u_path': playlist, 'dump_music_path': str(dst), 'dry_run': False,
+                      'fix_search_path': music, 'layout': 'mirror'})
+    dumper.start()
+
+    assert dst.join('Art', 'One', '01.mp3').read() == 'Art'
+    assert dst.join('Other', 'Two', '01.mp3').read() == 'Other'
+    assert sorted(made) == [str(dst.join('Art', 'One')), str(dst.join('Other', 'Two'))]
+    assert dumper.report['directories_created'] == 2
+    assert dst.join('car.m3u').read().splitlines() == [
+        '#EXTM3U', '#EXTINF:1,Band - Song', 'Art/One/01.mp3', 'Other/Two/01.mp3', 'http://example.com/s']
+
+
+def test_cli_artist_album_layout_and_plan(tmpdir):
+    playlist, music = _library(tmpdir)
+    dst = tmpdir.mkdir('dst')
+    plan_path = str(tmpdir.join('plan.json'))
+    runner = CliRunner()
+    result = runner.invoke(cli.main, [playlist, str(dst), '--layout', 'artist-album', '--no-resolve-url-final',
+                                      '--plan', plan_path])
+    assert result.exit_code == 0
+    assert os.listdir(str(dst)) == []
+
+    result = runner.invoke(cli.main, [playlist, str(dst), '--apply-plan', plan_path])
+    assert result.exit_code == 2
+    assert 'artist-album layout' in result.output
+
+    result = runner.invoke(cli.main, [playlist, str(dst), '--layout', 'artist-album', '--apply-plan', plan_path,
+                                      '--playlist-paths', 'absolute'])
+    assert result.exit_code == 0
+    assert dst.join('Band', 'One', '01.mp3').read() == 'Art'
+    assert dst.join('Other', 'Two', '01.mp3').read() == 'Other'
+    assert dst.join('car.m3u').read().splitlines()[2] == str(dst.join('Band', 'One', '01.mp3'))
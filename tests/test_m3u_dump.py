@@ -132,7 +132,8 @@ def test_command_line_dryrun(playlist_current, tmpdir_factory, music_files):
                                       dst_dir, '--fix-search-path',
                                       str(music_files)])
     assert 'Welcome m3u-dump' in result.output
-    assert 'copy was completed(successful' in result.output
+    assert 'dry run finished, nothing copied.' in result.output
+    assert 'copy was completed(successful' not in result.output
     assert result.exit_code == 0  # must arguments
 
     # copy できていないこと
@@ -398,3 +399,318 @@ def test_load_from_playlist_path(playlist_dir, playlist_current2, playlist_curre
     assert 'playlist.m3u' in path_list[0]
     assert 'playlist2.m3u8' in path_list[1]
     assert len(path_list) == 2
+
+
+# noinspection PyShadowingNames
+def test_command_line_bwlimit(playlist_current, tmpdir_factory, music_files):
+    dst_dir = str(tmpdir_factory.mktemp('dump-music-bwlimit'))
+    runner = CliRunner()
+    result = runner.invoke(cli.main, [str(playlist_current), dst_dir,
+                                      '--fix-search-path', str(music_files),
+                                      '--copy-order', 'playlist',
+                                      '--bwlimit', '10M'])
+    assert result.exit_code == 0
+    assert os.path.exists(os.path.join(dst_dir, 'dummy001.mp3')) is True
+    assert os.path.exists(os.path.join(dst_dir, 'あいう えお.mp3')) is True
+
+    result = runner.invoke(cli.main, [str(playlist_current), dst_dir, '--bwlimit', 'fast'])
+    assert result.exit_code == 2
+    assert 'invalid size' in result.output
+
+
+def test_command_line_dedup_content(tmpdir):
+    music = tmpdir.mkdir('music')
+    music.join('one.mp3').write('same')
+    music.mkdir('other').join('two.mp3').write('same')
+    music.join('three.mp3').write('diff')
+    playlist = tmpdir.join('dedup.m3u')
+    playlist.write('\n'.join([
+        '#EXTM3U',
+        str(music.join('one.mp3')),
+        str(music.join('other', 'two.mp3')),
+        str(music.join('three.mp3')),
+    ]))
+    cache_path = str(tmpdir.join('hash-cache.json'))
+    runner = CliRunner()
+
+    dst_dir = str(tmpdir.mkdir('dst-link'))
+    result = runner.invoke(cli.main, [str(playlist), dst_dir, '--copy-order', 'playlist',
+                                      '--dedup-content', 'hardlink', '--hash-cache', cache_path])
+    assert result.exit_code == 0
+    assert os.path.samefile(os.path.join(dst_dir, 'one.mp3'), os.path.join(dst_dir, 'two.mp3'))
+    assert not os.path.samefile(os.path.join(dst_dir, 'one.mp3'), os.path.join(dst_dir, 'three.mp3'))
+    assert os.path.exists(cache_path)
+
+    dst_dir = str(tmpdir.mkdir('dst-ref'))
+    result = runner.invoke(cli.main, [str(playlist), dst_dir, '--copy-order', 'playlist',
+                                      '--dedup-content', 'reference', '--hash-cache', cache_path])
+    assert result.exit_code == 0
+    assert os.path.exists(os.path.join(dst_dir, 'two.mp3')) is False
+    with open(os.path.join(dst_dir, 'dedup.m3u'), 'r', encoding='utf-8') as f:
+        assert f.read().split('\n') == ['#EXTM3U', 'one.mp3', 'one.mp3', 'three.mp3', '']
+
+
+@pytest.mark.parametrize('mode', [[], ['--pipeline'], ['--max-bytes', '1M']])
+def test_dedup_hardlink_runs_twice_without_skip_existing(tmpdir, mode):
+    music = tmpdir.mkdir('music')
+    music.join('one.mp3').write('same')
+    music.mkdir('other').join('two.mp3').write('same')
+    playlist = tmpdir.join('dedup.m3u')
+    playlist.write('\n'.join(['#EXTM3U', str(music.join('one.mp3')), str(music.join('other', 'two.mp3'))]))
+    dst_dir = str(tmpdir.mkdir('dst'))
+    args = [str(playlist), dst_dir, '--copy-order', 'playlist', '--dedup-content', 'hardlink',
+            '--hash-cache', str(tmpdir.join('hash-cache.json')), '--no-skip-existing'] + mode
+    runner = CliRunner()
+    for _ in range(2):
+        result = runner.invoke(cli.main, args)
+        assert result.exit_code == 0, result.output
+        assert os.path.samefile(os.path.join(dst_dir, 'one.mp3'), os.path.join(dst_dir, 'two.mp3'))
+    assert sorted(os.listdir(dst_dir)) == ['dedup.m3u', 'one.mp3', 'two.mp3']
+
+
+def test_save_playlist_atomic_and_skips_unchanged(tmpdir):
+    lines = ['#EXTM3U', '#EXTINF:1,a', '/x/y/a.mp3', 'http://example.com/a']
+    dst = str(tmpdir)
+    assert M3uDump.save_playlist('p.m3u', lines, dst, True) == 'dryrun'
+    assert os.listdir(dst) == []
+
+    assert M3uDump.save_playlist('p.m3u', lines, dst, False) == 'written'
+    playlist_path = os.path.join(dst, 'p.m3u')
+    with open(playlist_path, 'r', encoding='utf-8') as f:
+        assert f.read().splitlines() == ['#EXTM3U', '#EXTINF:1,a', 'a.mp3', 'http://example.com/a']
+    mtime = os.stat(playlist_path).st_mtime_ns
+
+    assert M3uDump.save_playlist('p.m3u', lines, dst, False) == 'unchanged'
+    assert os.stat(playlist_path).st_mtime_ns == mtime
+    assert M3uDump.save_playlist('p.m3u', lines[:3], dst, False) == 'written'
+    assert os.listdir(dst) == ['p.m3u']
+
+
+def test_compile_patterns_matches_fnmatch():
+    import fnmatch
+    patterns = ['*.m3u', '*.m3u8', 'list-??.txt', '*.tar.gz', '[ab]*.pls']
+    names = ['a.m3u', 'a.m3u8', 'a.m3u9', '.m3u', 'm3u', 'list-01.txt', 'list-001.txt',
+             'x.tar.gz', 'x.gz', 'a.pls', 'c.pls', 'a.b.m3u', 'あいう.m3u8']
+    match = M3uDump.compile_patterns(patterns)
+    for name in names:
+        assert match(name) == any(fnmatch.fnmatch(name, p) for p in patterns), name
+
+
+def test_load_from_playlist_path_exclude_dirs(tmpdir):
+    root = tmpdir.mkdir('tree')
+    root.join('a.m3u').write('')
+    root.join('song.mp3').write('')
+    root.mkdir('sub').join('b.m3u8').write('')
+    root.mkdir('@eaDir').join('c.m3u').write('')
+    root.mkdir('.git').mkdir('deep').join('d.m3u').write('')
+
+    path_list = M3uDump.load_from_playlist_path(str(root), ['*.m3u', '*.m3u8'])
+    assert len(path_list) == 4
+    path_list = M3uDump.load_from_playlist_path(str(root), ['*.m3u', '*.m3u8'], ['@eaDir', '.*'])
+    assert path_list == [str(root.join('a.m3u')), str(root.join('sub', 'b.m3u8'))]
+
+
+def test_import_does_not_load_heavy_modules():
+    import subprocess
+    import sys
+    heavy = ['csv', 'json', 'pprint', 'shutil', 'tempfile', 'urllib.request', 'asyncio', 'logging.config', 'hashlib']
+    code = 'import sys, m3u_dump.m3u_dump; print(",".join(m for m in {!r} if m in sys.modules))'.format(heavy)
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True, env=env)
+    assert out.stdout.strip() == ''
+
+
+def test_setup_logging_runs_once(monkeypatch):
+    import logging.config
+    from m3u_dump import m3u_dump as module
+    calls = []
+    monkeypatch.setattr(module, '_logging_configured', False)
+    monkeypatch.setattr(logging.config, 'fileConfig', lambda *args, **kwargs: calls.append(args))
+    M3uDump.setup_logging()
+    M3uDump.setup_logging()
+    M3uDump({'collision_strategy': 'first'})
+    assert len(calls) == 1
+
+
+def _cancel_fixture(tmpdir):
+    music = tmpdir.mkdir('music')
+    lines = ['#EXTM3U']
+    for i in range(5):
+        music.join('{}.mp3'.format(i)).write(str(i))
+        lines.append(str(music.join('{}.mp3'.format(i))))
+    playlist = tmpdir.join('cancel.m3u')
+    playlist.write('\n'.join(lines))
+    return {
+        'load_m3u_path': str(playlist),
+        'dump_music_path': str(tmpdir.mkdir('dst')),
+        'dry_run': False,
+        'copy_order': 'playlist',
+        'report_json': str(tmpdir.join('report.json')),
+    }
+
+
+@pytest.mark.parametrize('pipeline', [False, True])
+def test_cancel_keeps_partial_report(tmpdir, monkeypatch, pipeline):
+    import json
+    args = _cancel_fixture(tmpdir)
+    args['pipeline'] = pipeline
+    dumper = M3uDump(args)
+    execute_copy = M3uDump.execute_copy
+
+    def cancel_after_two(op, options, report=None, replacements=None):
+        result = execute_copy(op, options, report, replacements)
+        if report['copied'] == 2:
+            dumper.cancel()
+        return result
+
+    monkeypatch.setattr(M3uDump, 'execute_copy', staticmethod(cancel_after_two))
+    dumper.start()
+
+    assert dumper.report['cancelled'] is True
+    assert dumper.report['copied'] == 2
+    assert dumper.report['playlists_processed'] == 0
+    assert sorted(os.listdir(args['dump_music_path'])) == ['0.mp3', '1.mp3']
+    with open(args['report_json'], 'r', encoding='utf-8') as f:
+        assert json.load(f)['cancelled'] is True
+
+
+def test_interrupted_copy_removes_partial_file(tmpdir):
+    src = tmpdir.join('big.mp3')
+    src.write_binary(b'x' * 100)
+    dst = str(tmpdir.join('out.mp3'))
+
+    class Interrupting:
+        def consume(self, nbytes):
+            raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        M3uDump._materialize(str(src), dst, limiter=Interrupting())
+    assert os.path.exists(dst) is False
+
+
+@pytest.mark.skipif(os.name != 'posix', reason='POSIX permissions')
+def test_save_playlist_respects_umask_and_existing_mode(tmpdir):
+    dst = str(tmpdir)
+    old_umask = os.umask(0o022)
+    try:
+        M3uDump.save_playlist('p.m3u', ['/a/a.mp3'], dst, False)
+    finally:
+        os.umask(old_umask)
+    playlist_path = os.path.join(dst, 'p.m3u')
+    assert os.stat(playlist_path).st_mode & 0o777 == 0o644
+    os.chmod(playlist_path, 0o640)
+    M3uDump.save_playlist('p.m3u', ['/a/b.mp3'], dst, False)
+    assert os.stat(playlist_path).st_mode & 0o777 == 0o640
+
+
+def _fanout_fixture(tmpdir):
+    music = tmpdir.mkdir('music')
+    lines = ['#EXTM3U']
+    for name in ('a.mp3', 'b.mp3'):
+        music.join(name).write(name)
+        lines.append(str(music.join(name)))
+    playlist = tmpdir.join('fanout.m3u')
+    playlist.write('\n'.join(lines))
+    return str(playlist), [str(tmpdir.mkdir(name)) for name in ('phone', 'car', 'nas')]
+
+
+def test_command_line_multiple_destinations(tmpdir, monkeypatch):
+    import json
+    from m3u_dump import m3u_dump
+    playlist, dsts = _fanout_fixture(tmpdir)
+    tmpdir.join('car', 'a.mp3').write('old')
+    calls = []
+    copy_fanout = m3u_dump.copy_fanout
+
+    def counting_fanout(src, dst_list, *args, **kwargs):
+        calls.append((os.path.basename(src), len(dst_list)))
+        return copy_fanout(src, dst_list, *args, **kwargs)
+
+    monkeypatch.setattr(m3u_dump, 'copy_fanout', counting_fanout)
+    report_path = str(tmpdir.join('report.json'))
+    result = CliRunner().invoke(
+        cli.main, [playlist] + dsts + ['--copy-order', 'playlist', '--report-json', report_path])
+    assert result.exit_code == 0
+
+    # a.mp3 already exists in "car": read once for the two other destinations
+    assert calls == [('a.mp3', 2), ('b.mp3', 3)]
+    for dst in dsts:
+        assert sorted(os.listdir(dst)) == ['a.mp3', 'b.mp3', 'fanout.m3u']
+    assert tmpdir.join('car', 'a.mp3').read() == 'old'
+
+    with open(report_path, 'r', encoding='utf-8') as f:
+        report = json.load(f)
+    assert report['copied'] == 5
+    assert report['copy_skipped_existing'] == 1
+    assert report['destinations'][dsts[0]]['copied'] == 2
+    assert report['destinations'][dsts[0]]['bytes_copied'] == 10
+    assert report['destinations'][dsts[1]]['copied'] == 1
+    assert report['destinations'][dsts[1]]['copy_skipped_existing'] == 1
+    assert report['destinations'][dsts[2]]['playlists_written'] == 1
+
+
+@pytest.mark.parametrize('pipeline', [False, True])
+def test_multiple_destinations_per_destination_options(tmpdir, pipeline):
+    playlist, dsts = _fanout_fixture(tmpdir)
+    tmpdir.join('nas', 'a.mp3').write('old')
+    dumper = M3uDump({
+        'load_m3u_path': playlist,
+        'dump_music_path': [dsts[0], {'path': dsts[1], 'link_mode': 'hardlink'},
+                            {'path': dsts[2], 'skip_existing': False}],
+        'dry_run': False,
+        'pipeline': pipeline,
+    })
+    dumper.start()
+
+    assert os.path.samefile(os.path.join(dsts[1], 'a.mp3'), str(tmpdir.join('music', 'a.mp3')))
+    assert not os.path.samefile(os.path.join(dsts[0], 'a.mp3'), str(tmpdir.join('music', 'a.mp3')))
+    assert tmpdir.join('nas', 'a.mp3').read() == 'a.mp3'
+    destinations = dumper.report['destinations']
+    assert destinations[dsts[1]]['linked'] == 2
+    assert destinations[dsts[2]]['copied'] == 2
+    assert dumper.report['playlists_processed'] == 1
+
+    dumper = M3uDump({'load_m3u_path': playlist, 'dump_music_path': dsts, 'dry_run': False, 'pipeline': pipeline})
+    dumper.start()
+    assert dumper.report['playlists_unchanged'] == 1
+    assert dumper.report['copy_skipped_existing'] == 6
+
+
+@pytest.mark.parametrize('pipeline', [False, True])
+def test_relative_entries_resolve_against_playlist(tmpdir, monkeypatch, pipeline):
+    playlists = tmpdir.mkdir('playlists')
+    playlists.mkdir('music').join('あいう えお.mp3').write('x')
+    playlist = playlists.join('p.m3u')
+    playlist.write('\n'.join(['#EXTM3U', '#EXTINF:1,a', 'music/あいう えお.mp3', '#EXTINF:1,b', 'music/gone.mp3']))
+    dst = tmpdir.mkdir('dst')
+    monkeypatch.chdir(tmpdir.mkdir('elsewhere'))
+
+    dumper = M3uDump({
+        'load_m3u_path': str(playlist),
+        'dump_music_path': str(dst),
+        'dry_run': False,
+        'pipeline': pipeline,
+    })
+    dumper.start()
+    assert dumper.report['copied'] == 1
+    assert dumper.report['copy_skipped_missing'] == 1
+    assert dst.join('p.m3u').read().splitlines()[:3] == ['#EXTM3U', '#EXTINF:1,a', 'あいう えお.mp3']
+
+
+def test_directory_prefix_cache(tmpdir):
+    from m3u_dump.m3u_dump import DirectoryPrefixCache
+
+    calls = []
+
+    def isdir(path):
+        calls.append(path)
+        return os.path.isdir(path)
+
+    cache = DirectoryPrefixCache(isdir)
+    missing = os.path.join(str(tmpdir), 'old')
+    assert not cache.isdir(os.path.join(missing, 'artist', 'album'))
+    assert not cache.isdir(os.path.join(missing, 'artist', 'other'))
+    assert not cache.isdir(os.path.join(missing, 'x'))
+    assert calls.count(missing) == 1
+    assert not any(path.startswith(missing + os.sep) for path in calls)
+    assert cache.isdir(str(tmpdir))
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_manifest
+-------------
+
+Tests for `m3u_dump.manifest` module.
+"""
+import os
+
+import pytest
+
+from m3u_dump.m3u_dump import M3uDump
+
+
+def _run(args, **extra):
+    dumper = M3uDump(dict(args, **extra))
+    dumper.start()
+    return dumper.report
+
+
+@pytest.mark.parametrize('pipeline', [False, True])
+def test_unchanged_playlists_are_skipped(tmpdir, monkeypatch, pipeline):
+    resolved = []
+
+    def fake_resolve(url, timeout=8):
+        resolved.append(url)
+        return url + '/final'
+
+    monkeypatch.setattr(M3uDump, '_resolve_final_url_strict', staticmethod(fake_resolve))
+    music = tmpdir.mkdir('music')
+    music.join('a.mp3').write('aaaa')
+    music.join('b.mp3').write('bb')
+    playlists = tmpdir.mkdir('playlists')
+    playlists.join('one.m3u').write('\n'.join(['#EXTM3U', str(music.join('a.mp3')), 'http://example.com/s']))
+    playlists.join('two.m3u').write('\n'.join(['#EXTM3U', str(music.join('b.mp3'))]))
+    dst = tmpdir.mkdir('dst')
+    args = {
+        'load_m3u_path': str(playlists),
+        'dump_music_path': str(dst),
+        'playlist_pattern_list': ['*.m3u'],
+        'dry_run': False,
+        'pipeline': pipeline,
+        'playlist_manifest': str(tmpdir.join('manifest.json')),
+    }
+
+    report = _run(args)
+    assert (report['copied'], report['playlists_cached']) == (2, 0)
+
+    report = _run(args)
+    assert (report['playlists_cached'], report['playlists_processed'], report['copied']) == (2, 2, 0)
+    assert report['origin_links'][0]['final_url'] == 'http://example.com/s/final'
+    assert report['url_entries_detected'] == 1
+    assert resolved == ['http://example.com/s']
+
+    # touched without a change: still skipped
+    os.utime(str(playlists.join('two.m3u')), ns=(0, 10 ** 9))
+    assert _run(args)['playlists_cached'] == 2
+
+    music.join('b.mp3').write('bbb')
+    report = _run(args, skip_existing=False)
+    assert (report['playlists_cached'], report['copied']) == (0, 2)  # other options: nothing cached
+    assert dst.join('b.mp3').read() == 'bbb'
+    music.join('b.mp3').write('bbbb')
+    report = _run(args, skip_existing=False)
+    assert (report['playlists_cached'], report['copied']) == (1, 1)
+    assert dst.join('b.mp3').read() == 'bbbb'
+
+    dst.join('a.mp3').remove()
+    report = _run(args, skip_existing=False)
+    assert (report['playlists_cached'], report['copied']) == (1, 1)
+
+    assert _run(args, link_mode='hardlink')['playlists_cached'] == 0
+
+
+def test_missing_files_are_not_cached(tmpdir):
+    playlist = tmpdir.join('p.m3u')
+    playlist.write('\n'.join(['#EXTM3U', str(tmpdir.join('later.mp3'))]))
+    args = {
+        'load_m3u_path': str(playlist),
+        'dump_music_path': str(tmpdir.mkdir('dst')),
+        'dry_run': False,
+        'playlist_manifest': str(tmpdir.join('manifest.json')),
+    }
+    _run(args)
+    tmpdir.join('later.mp3').write('x')
+    report = _run(args)
+    assert (report['playlists_cached'], report['copied']) == (0, 1)
+    assert _run(args)['playlists_cached'] == 1
+
+
+@pytest.mark.parametrize('pipeline', [False, True])
+def test_unresolved_entries_are_not_cached(tmpdir, pipeline):
+    lib = tmpdir.mkdir('lib')
+    lib.join('a.mp3').write('a')
+    playlist = tmpdir.join('p.m3u')
+    playlist.write('\n'.join(['#EXTM3U', '/old/a.mp3', '/old/b.mp3']))
+    dst = tmpdir.mkdir('dst')
+    args = {
+        'load_m3u_path': str(playlist),
+        'dump_music_path': str(dst),
+        'dry_run': False,
+        'pipeline': pipeline,
+        'fix_search_path': str(lib),
+        'playlist_manifest': str(tmpdir.join('manifest.json')),
+    }
+    report = _run(args)
+    assert (report['unresolved_paths'], report['copied']) == (1, 1)
+
+    lib.join('b.mp3').write('b')  # shows up in the search path later
+    report = _run(args)
+    assert (report['playlists_cached'], report['copied']) == (0, 1)
+    assert dst.join('b.mp3').read() == 'b'
+    assert _run(args)['playlists_cached'] == 1
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_origins
+------------
+
+Tests for `m3u_dump.origins` module.
+"""
+import csv
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from m3u_dump.m3u_dump import M3uDump
+from m3u_dump.origins import OriginStats, ResolvedUrl
+
+
+class RedirectHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        hops = int(self.path.strip('/') or 0)
+        if hops:
+            self.send_response(302)
+            self.send_header('Location', '/{}'.format(hops - 1))
+        else:
+            self.send_response(200)
+        self.end_headers()
+
+
+@pytest.fixture
+def redirect_server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), RedirectHandler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield 'http://127.0.0.1:{}'.format(httpd.server_address[1])
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_resolve_final_url_counts_redirects(redirect_server):
+    final_url = M3uDump.resolve_final_url(redirect_server + '/3', timeout=2)
+    assert final_url == redirect_server + '/0'
+    assert final_url.redirects == 3
+    assert M3uDump.resolve_final_url(redirect_server + '/0', timeout=2).redirects == 0
+
+
+def test_origin_stats():
+    stats = OriginStats()
+    for original, final in (
+        ('http://a/1', ResolvedUrl('http://cdn/1', 2, 30.0)),
+        ('http://a/2', ResolvedUrl('http://cdn/2', 0, 10.0)),
+        ('http://b/1', ResolvedUrl('http://b/1', error='timed out')),
+        ('http://c/1', 'http://c/1'),
+    ):
+        stats.add(M3uDump.origin_item(original, final))
+
+    rows = stats.summary()
+    assert [row['origin_server'] for row in rows] == ['http://cdn', 'http://b', 'http://c']
+    assert rows[0] == {
+        'origin_server': 'http://cdn', 'entries': 2, 'share': 0.5, 'failures': 0, 'failure_rate': 0.0,
+        'redirected': 1, 'avg_redirects': 1.0, 'max_redirects': 2, 'avg_latency_ms': 20.0, 'max_latency_ms': 30.0,
+    }
+    assert (rows[1]['failures'], rows[1]['failure_rate']) == (1, 1.0)
+    assert rows[2]['avg_redirects'] is None and rows[2]['avg_latency_ms'] is None
+
+
+def test_origin_summary_file(tmpdir, monkeypatch):
+    monkeypatch.setattr(M3uDump, '_resolve_final_url_strict', staticmethod(
+        lambda url, timeout=8: ResolvedUrl(url.replace('http://a', 'http://cdn'), 1)))
+    playlist = tmpdir.join('tv.m3u')
+    playlist.write('\n'.join(['#EXTM3U', 'http://a/1', 'http://a/2', 'http://b/1']))
+    summary_json = tmpdir.join('origins.json')
+    args = {
+        'load_m3u_path': str(playlist),
+        'dump_music_path': str(tmpdir.mkdir('dst')),
+        'dry_run': False,
+        'origin_summary_file': str(summary_json),
+    }
+    dumper = M3uDump(args)
+    dumper.start()
+    rows = json.loads(summary_json.read())
+    assert [(row['origin_server'], row['entries'], row['redirected']) for row in rows] == [
+        ('http://cdn', 2, 2), ('http://b', 1, 1)]
+    assert rows[0]['avg_latency_ms'] is not None
+    assert dumper.report['origin_servers'] == rows
+
+    summary_csv = tmpdir.join('origins.csv')
+    M3uDump(dict(args, origin_summary_file=str(summary_csv), pipeline=True)).start()
+    with open(str(summary_csv), 'r', encoding='utf-8', newline='') as f:
+        assert [row['origin_server'] for row in csv.DictReader(f)] == ['http://cdn', 'http://b']
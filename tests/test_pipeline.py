@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_pipeline
+----------------------------------
+
+Tests for `m3u_dump.pipeline` module.
+"""
+import os
+import threading
+import time
+
+from m3u_dump.m3u_dump import M3uDump
+
+
+def _write_playlists(tmpdir):
+    music = tmpdir.mkdir('music')
+    music.mkdir('a').join('one.mp3').write('1')
+    music.mkdir('b').join('two.mp3').write('2')
+    playlists = tmpdir.mkdir('playlists')
+    playlists.join('p1.m3u').write('\n'.join([
+        '#EXTM3U',
+        '#EXTINF:1,one',
+        '/moved/one.mp3',
+        'http://example.invalid/stream1',
+        'http://example.invalid/stream2',
+    ]))
+    playlists.join('p2.m3u8').write('\n'.join([
+        '#EXTM3U',
+        '#EXTINF:2,two',
+        '/moved/two.mp3',
+        'http://example.invalid/stream3',
+    ]))
+    return music, playlists
+
+
+def _args(music, playlists, dst, pipeline):
+    return {
+        'load_m3u_path': str(playlists),
+        'dump_music_path': dst,
+        'dry_run': False,
+        'with_playlist': True,
+        'fix_search_path': str(music),
+        'playlist_pattern_list': ('*.m3u', '*.m3u8'),
+        'pipeline': pipeline,
+        'url_workers': 3,
+    }
+
+
+def test_pipeline_matches_sequential_run(tmpdir, monkeypatch):
+    monkeypatch.setattr(M3uDump, '_resolve_final_url_strict', staticmethod(lambda url, timeout=8: url + '/final'))
+    music, playlists = _write_playlists(tmpdir)
+
+    reports = {}
+    for pipeline in (False, True):
+        dst = str(tmpdir.mkdir('dst-{}'.format(pipeline)))
+        dumper = M3uDump(_args(music, playlists, dst, pipeline))
+        dumper.start()
+        reports[pipeline] = dumper.report
+        assert sorted(os.listdir(dst)) == ['one.mp3', 'p1.m3u', 'p2.m3u8', 'two.mp3']
+        with open(os.path.join(dst, 'p1.m3u'), 'r', encoding='utf-8') as f:
+            assert f.read().split('\n')[:3] == ['#EXTM3U', '#EXTINF:1,one', 'one.mp3']
+
+    for key in ('playlists_processed', 'copied', 'fixed_paths', 'url_entries_detected', 'url_origin_saved'):
+        assert reports[True][key] == reports[False][key]
+    assert reports[True]['origin_links'] == reports[False]['origin_links']
+    assert reports[True]['origin_links'][0]['final_url'] == 'http://example.invalid/stream1/final'
+
+
+def test_pipeline_resolves_urls_concurrently(tmpdir, monkeypatch):
+    active = {'now': 0, 'max': 0}
+    lock = threading.Lock()
+
+    def slow_resolve(url, timeout=8):
+        with lock:
+            active['now'] += 1
+            active['max'] = max(active['max'], active['now'])
+        time.sleep(0.05)
+        with lock:
+            active['now'] -= 1
+        return url
+
+    monkeypatch.setattr(M3uDump, '_resolve_final_url_strict', staticmethod(slow_resolve))
+    music, playlists = _write_playlists(tmpdir)
+    dumper = M3uDump(_args(music, playlists, str(tmpdir.mkdir('dst')), True))
+    dumper.start()
+    assert active['max'] > 1
+    assert dumper.report['url_origin_saved'] == 3
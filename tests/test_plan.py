@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_plan
+---------
+
+Tests for `m3u_dump.plan` module.
+"""
+import json
+import os
+
+from click.testing import CliRunner
+
+from m3u_dump import cli, plan as plan_module
+from m3u_dump.m3u_dump import M3uDump
+from m3u_dump.plan import DumpPlan
+
+
+def _library(tmpdir):
+    music = tmpdir.mkdir('music')
+    music.join('a.mp3').write('aaaa')
+    music.mkdir('x').join('b.mp3').write('bb')
+    music.mkdir('y').join('b.mp3').write('bb')
+    playlist = tmpdir.mkdir('playlists').join('car.m3u')
+    playlist.write('\n'.join(['#EXTM3U', str(music.join('a.mp3')), '/old/x/b.mp3', 'http://example.com/s']))
+    return str(playlist), str(music)
+
+
+def test_plan_then_apply(tmpdir):
+    playlist, music = _library(tmpdir)
+    dst = str(tmpdir.join('dst'))
+    plan_path = str(tmpdir.join('plan.json'))
+    report_path = str(tmpdir.join('report.json'))
+    runner = CliRunner()
+
+    result = runner.invoke(cli.main, [playlist, dst, '--fix-search-path', music, '--no-resolve-url-final',
+                                      '--plan', plan_path, '--report-json', report_path])
+    assert result.exit_code == 0
+    assert 'plan written to {}, nothing copied.'.format(plan_path) in result.output
+    assert not os.path.exists(dst)
+
+    with open(plan_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    assert data['total_bytes'] == 6
+    assert [op['targets'][0]['action'] for op in data['playlists'][0]['operations']] == ['copy', 'copy']
+    assert data['collisions'][0]['selected'] == os.path.join(music, 'x', 'b.mp3')
+    assert data['destinations'][0]['required_bytes'] == 6
+    assert data['destinations'][0]['fits'] is True
+    with open(report_path, 'r', encoding='utf-8') as f:
+        assert json.load(f)['plan']['total_bytes'] == 6
+
+    os.makedirs(dst)
+    result = runner.invoke(cli.main, [playlist, dst, '--apply-plan', plan_path, '--report-json', report_path])
+    assert result.exit_code == 0
+    assert sorted(os.listdir(dst)) == ['a.mp3', 'b.mp3', 'car.m3u']
+    with open(os.path.join(dst, 'car.m3u'), 'r', encoding='utf-8') as f:
+        assert f.read().splitlines() == ['#EXTM3U', 'a.mp3', 'b.mp3', 'http://example.com/s']
+    with open(report_path, 'r', encoding='utf-8') as f:
+        report = json.load(f)
+    assert report['copied'] == 2
+    assert report['destinations'][dst]['bytes_copied'] == 6
+
+    # applying again skips what is already there
+    dumper = M3uDump({'load_m3u_path': playlist, 'dump_music_path': dst, 'apply_plan': plan_path})
+    dumper.start()
+    assert dumper.report['copy_skipped_existing'] == 2
+    assert dumper.report['playlists_unchanged'] == 1
+
+
+def test_apply_plan_rejects_other_destination(tmpdir):
+    playlist, music = _library(tmpdir)
+    plan_path = str(tmpdir.join('plan.json'))
+    runner = CliRunner()
+    runner.invoke(cli.main, [playlist, str(tmpdir.join('dst')), '--no-resolve-url-final', '--plan', plan_path])
+
+    result = runner.invoke(cli.main, [playlist, str(tmpdir.join('other')), '--apply-plan', plan_path])
+    assert result.exit_code == 2
+    assert 'plan was made for destinations' in result.output
+
+
+def test_apply_plan_rejects_dry_run(tmpdir):
+    playlist, music = _library(tmpdir)
+    dst = tmpdir.mkdir('dst')
+    plan_path = str(tmpdir.join('plan.json'))
+    runner = CliRunner()
+    runner.invoke(cli.main, [playlist, str(dst), '--no-resolve-url-final', '--plan', plan_path])
+
+    result = runner.invoke(cli.main, [playlist, str(dst), '--apply-plan', plan_path, '--dry-run'])
+    assert result.exit_code == 2
+    assert 'a plan cannot be applied in a dry run' in result.output
+    assert os.listdir(str(dst)) == []
+
+
+def test_plan_round_trip_and_shared_free_space(tmpdir, monkeypatch):
+    playlist, music = _library(tmpdir)
+    dsts = [str(tmpdir.join('phone')), str(tmpdir.join('car'))]
+    dumper = M3uDump({'load_m3u_path': playlist, 'dump_music_path': dsts, 'dry_run': True,
+                      'resolve_url_final': False})
+    plan = dumper.build_plan(dumper.collect_playlists())
+    assert plan.total_bytes == 8  # a.mp3 twice; b.mp3 is unresolved without a search path
+
+    monkeypatch.setattr(plan_module, 'free_space', lambda path: (1, 6))
+    assert plan.check_space() is False
+    assert [dest['fits'] for dest in plan.destinations] == [False, False]
+
+    copy = DumpPlan.from_dict(json.loads(json.dumps(plan.to_dict())))
+    assert copy.to_dict() == plan.to_dict()
+    assert copy.summary()['operations'] == 1
+
+
+def _rated_library(tmpdir):
+    music = tmpdir.mkdir('rated')
+    lines = ['#EXTM3U']
+    for name, size, rating in (('a.mp3', 4, 1), ('b.mp3', 2, 0), ('c.mp3', 3, 5)):
+        music.join(name).write('x' * size)
+        lines += ['#EXTINF:100 rating="{0}",artist - {1}'.format(rating, name), str(music.join(name))]
+    playlist = tmpdir.join('rated.m3u')
+    playlist.write('\n'.join(lines))
+    return str(playlist)
+
+
+def test_max_bytes_keeps_playlist_order(tmpdir):
+    playlist = _rated_library(tmpdir)
+    dst = str(tmpdir.mkdir('sd'))
+    result = CliRunner().invoke(cli.main, [playlist, dst, '--max-bytes', '6', '--copy-order', 'locality'])
+    assert result.exit_code == 0
+    assert sorted(os.listdir(dst)) == ['a.mp3', 'b.mp3', 'rated.m3u']
+    with open(os.path.join(dst, 'rated.m3u'), 'r', encoding='utf-8') as f:
+        assert [line for line in f.read().splitlines() if not line.startswith('#')] == ['a.mp3', 'b.mp3']
+
+
+def test_max_bytes_by_rating(tmpdir):
+    playlist = _rated_library(tmpdir)
+    dst = str(tmpdir.mkdir('sd'))
+    dumper = M3uDump({'load_m3u_path': playlist, 'dump_music_path': dst, 'dry_run': False,
+                      'max_bytes': 6, 'priority': 'rating'})
+    dumper.start()
+    assert sorted(os.listdir(dst)) == ['b.mp3', 'c.mp3', 'rated.m3u']
+    assert dumper.report['copied'] == 2
+    assert dumper.report['copy_skipped_budget'] == 1
+    assert dumper.report['destinations'][dst]['bytes_copied'] == 5
+    assert dumper.report['plan']['skipped_budget'] == 1
+    assert dumper.report['playlists_processed'] == 1
+
+
+def test_space_check(tmpdir, monkeypatch):
+    playlist = _rated_library(tmpdir)
+    dst = str(tmpdir.join('sd'))
+    report_path = str(tmpdir.join('report.json'))
+    monkeypatch.setattr(plan_module, 'free_space', lambda path: (1, 5))
+
+    result = CliRunner().invoke(cli.main, [playlist, dst, '--space-check', 'fail', '--report-json', report_path])
+    assert result.exit_code == 1
+    assert 'needs 9 bytes, 5 free' in result.output
+    assert not os.path.exists(dst)
+    with open(report_path, 'r', encoding='utf-8') as f:
+        assert json.load(f)['copied'] == 0
+
+    os.makedirs(dst)
+    result = CliRunner().invoke(cli.main, [playlist, dst, '--space-check', 'trim'])
+    assert result.exit_code == 0
+    assert sorted(os.listdir(dst)) == ['a.mp3', 'rated.m3u']
+
+
+def test_plan_with_relative_paths_applies_from_another_directory(tmpdir, monkeypatch):
+    playlist, music = _library(tmpdir)
+    monkeypatch.chdir(str(tmpdir))
+    runner = CliRunner()
+    result = runner.invoke(cli.main, [os.path.relpath(playlist), 'd6', '--fix-search-path', 'music',
+                                      '--no-resolve-url-final', '--plan', 'plan.json'])
+    assert result.exit_code == 0
+    with open('plan.json', 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    assert data['destinations'][0]['path'] == str(tmpdir.join('d6'))
+    assert all(os.path.isabs(op['src']) and os.path.isabs(op['targets'][0]['dst'])
+               for op in data['playlists'][0]['operations'])
+
+    tmpdir.mkdir('d6')
+    monkeypatch.chdir(str(tmpdir.mkdir('sub')))
+    result = runner.invoke(cli.main, [os.path.relpath(playlist), '../d6', '--apply-plan', '../plan.json'])
+    assert result.exit_code == 0
+    assert sorted(os.listdir(str(tmpdir.join('d6')))) == ['a.mp3', 'b.mp3', 'car.m3u']
@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_probe
+----------
+
+Tests for `m3u_dump.probe` and `m3u_dump.hosts` modules.
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from m3u_dump.hosts import HostGuard, HostRateLimiter, HostUnavailable, url_host
+from m3u_dump.m3u_dump import M3uDump
+from m3u_dump.probe import StreamProber, probe_url, reorder_streams
+
+
+class StreamHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    ranges = []
+
+    def do_GET(self):
+        StreamHandler.ranges.append(self.headers.get('Range'))
+        if self.path == '/dead':
+            self.send_error(404)
+            return
+        if self.path == '/moved':
+            self.send_response(302)
+            self.send_header('Location', '/live')
+            self.end_headers()
+            return
+        if self.path == '/slow':
+            time.sleep(0.3)
+        self.send_response(200)
+        self.send_header('Content-Type', 'audio/mpeg')
+        self.end_headers()
+        try:
+            # endless stream: the probe must stop after the first byte
+            while True:
+                self.wfile.write(b'x' * 4096)
+                time.sleep(0.01)
+        except OSError:
+            pass
+
+
+@pytest.fixture
+def stream_server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), StreamHandler)
+    httpd.daemon_threads = True
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{}'.format(httpd.server_address[1])
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_probe_url(stream_server):
+    started = time.monotonic()
+    live = probe_url(stream_server + '/live', timeout=2)
+    assert time.monotonic() - started < 1
+    assert live['alive'] and live['status'] == 200
+    assert live['content_type'] == 'audio/mpeg'
+    assert live['ttfb_ms'] >= 0
+
+    moved = probe_url(stream_server + '/moved', timeout=2)
+    assert moved['final_url'] == stream_server + '/live'
+
+    dead = probe_url(stream_server + '/dead', timeout=2)
+    assert (dead['alive'], dead['status']) == (False, 404)
+
+    refused = probe_url('http://127.0.0.1:9/nothing', timeout=2)
+    assert refused['alive'] is False and refused['status'] is None and refused['error']
+
+
+def test_reorder_streams():
+    lines = ['#EXTM3U', '#EXTINF:1,dead', 'http://h/dead', '/music/a.mp3', '#EXTINF:1,slow', 'http://h/slow',
+             '#EXTINF:1,fast', 'http://h/fast']
+    results = {
+        'http://h/dead': {'alive': False, 'ttfb_ms': None},
+        'http://h/slow': {'alive': True, 'ttfb_ms': 900},
+        'http://h/fast': {'alive': True, 'ttfb_ms': 10},
+    }
+    assert reorder_streams(lines, results) == lines
+    assert reorder_streams(lines, results, dead='drop') == [
+        '#EXTM3U', '/music/a.mp3', '#EXTINF:1,slow', 'http://h/slow', '#EXTINF:1,fast', 'http://h/fast']
+    assert reorder_streams(lines, results, dead='last', slow_ms=500) == [
+        '#EXTM3U', '#EXTINF:1,fast', 'http://h/fast', '/music/a.mp3', '#EXTINF:1,slow', 'http://h/slow',
+        '#EXTINF:1,dead', 'http://h/dead']
+
+
+def test_host_rate_limiter():
+    now = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    limiter = HostRateLimiter(2, clock=lambda: now[0], sleep=sleep)
+    limiter.acquire('http://a')
+    limiter.acquire('http://b')
+    assert sleeps == []
+    limiter.acquire('http://a')
+    assert sleeps == [pytest.approx(0.5)]
+    assert url_host('HTTP://Example.com:8080/x?y') == 'http://example.com:8080'
+
+
+def test_stream_prober_runs_concurrently():
+    calls = []
+
+    def fake_probe(url, timeout):
+        time.sleep(0.2)
+        calls.append(url)
+        return {'url': url, 'alive': True, 'ttfb_ms': 1}
+
+    prober = StreamProber(workers=4, probe=fake_probe)
+    started = time.monotonic()
+    results = prober.probe(['http://h/{}'.format(i) for i in range(4)] + ['http://h/0'])
+    assert time.monotonic() - started < 0.6
+    assert len(results) == 4 and len(calls) == 4
+
+
+def test_dump_with_probe_streams(tmpdir, stream_server):
+    playlist = tmpdir.join('tv.m3u')
+    playlist.write('\n'.join([
+        '#EXTM3U',
+        '#EXTINF:-1,slow', stream_server + '/slow',
+        '#EXTINF:-1,dead', stream_server + '/dead',
+        '#EXTINF:-1,live', stream_server + '/live',
+    ]))
+    dst = tmpdir.mkdir('dst')
+    dumper = M3uDump({
+        'load_m3u_path': str(playlist),
+        'dump_music_path': str(dst),
+        'dry_run': False,
+        'resolve_url_final': False,
+        'probe_streams': True,
+        'probe_timeout': 2,
+        'dead_streams': 'drop',
+        'slow_streams_ms': 200,
+    })
+    dumper.start()
+
+    assert dst.join('tv.m3u').read().splitlines() == [
+        '#EXTM3U', '#EXTINF:-1,live', stream_server + '/live', '#EXTINF:-1,slow', stream_server + '/slow']
+    report = dumper.report
+    assert (report['streams_probed'], report['streams_alive'], report['streams_dead']) == (3, 2, 1)
+    assert (report['streams_slow'], report['streams_dropped']) == (1, 1)
+    assert {probe['url'] for probe in report['stream_probes']} == {
+        stream_server + path for path in ('/slow', '/dead', '/live')}
+
+
+def test_host_guard_circuit_breaker():
+    now = [0.0]
+    guard = HostGuard(failure_threshold=2, reset_after=10, timeout=8, clock=lambda: now[0])
+    events = []
+
+    def fail(url, timeout):
+        raise OSError('down')
+
+    for _ in range(2):
+        with pytest.raises(OSError):
+            guard.call('http://down/a', fail, events)
+    with pytest.raises(HostUnavailable):
+        guard.call('http://down/b', fail, events)
+    assert guard.call('http://up/a', lambda url, timeout: url + '/final') == 'http://up/a/final'
+
+    now[0] = 11
+    with pytest.raises(OSError):
+        guard.call('http://down/c', fail, events)  # half-open trial fails: open again
+    now[0] = 22
+    assert guard.call('http://down/d', lambda url, timeout: timeout, events) == 8
+    assert [event['event'] for event in events] == ['open', 'half_open', 'open', 'half_open', 'close']
+
+    snapshot = guard.snapshot({'http://down'})
+    assert list(snapshot) == ['http://down']
+    assert snapshot['http://down']['state'] == 'closed'
+    assert (snapshot['http://down']['failures'], snapshot['http://down']['short_circuited']) == (3, 1)
+
+
+def test_host_guard_adaptive_timeout():
+    now = [0.0]
+    guard = HostGuard(timeout=8, min_timeout=1, clock=lambda: now[0])
+
+    def answer(url, timeout):
+        now[0] += 0.1
+        return timeout
+
+    assert guard.call('http://fast/x', answer) == 8
+    assert guard.call('http://fast/y', answer) == 1
+    assert guard.timeout_for('http://other') == 8
+
+
+def test_resolve_final_url_range_fallback(stream_server):
+    StreamHandler.ranges.clear()
+    started = time.monotonic()
+    assert M3uDump.resolve_final_url(stream_server + '/moved', timeout=2) == stream_server + '/live'
+    assert time.monotonic() - started < 1
+    assert StreamHandler.ranges == ['bytes=0-0', 'bytes=0-0']
+
+
+def test_resolve_final_url_errors(stream_server):
+    assert M3uDump.resolve_final_url(stream_server + '/dead', timeout=2) == stream_server + '/dead'
+    with pytest.raises(OSError):
+        M3uDump._resolve_final_url_strict('http://127.0.0.1:9/nothing', timeout=2)
+    refused = M3uDump.resolve_final_url('http://127.0.0.1:9/nothing', timeout=2)
+    assert refused == 'http://127.0.0.1:9/nothing' and refused.error
+
+
+def test_dump_short_circuits_dead_host(tmpdir, monkeypatch):
+    calls = []
+
+    def refused(url, timeout=8):
+        calls.append(url)
+        raise ConnectionRefusedError(url)
+
+    monkeypatch.setattr(M3uDump, '_resolve_final_url_strict', staticmethod(refused))
+    playlist = tmpdir.join('tv.m3u')
+    playlist.write('\n'.join(['#EXTM3U'] + ['http://down.invalid/{}'.format(i) for i in range(10)]))
+    dumper = M3uDump({
+        'load_m3u_path': str(playlist),
+        'dump_music_path': str(tmpdir.mkdir('dst')),
+        'dry_run': False,
+        'url_breaker_threshold': 3,
+    })
+    dumper.start()
+
+    report = dumper.report
+    assert len(calls) == 3
+    assert (report['url_resolve_failures'], report['url_short_circuited']) == (3, 7)
+    assert report['url_origin_saved'] == 10
+    assert report['breaker_events'] == [{'host': 'http://down.invalid', 'event': 'open', 'failures': 3}]
+    assert report['url_hosts']['http://down.invalid']['state'] == 'open'
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_rewrite
+------------
+
+Tests for `m3u_dump.rewrite` module.
+"""
+import os
+
+import pytest
+from click.testing import CliRunner
+
+from m3u_dump import cli
+from m3u_dump.m3u_dump import M3uDump
+from m3u_dump.rewrite import RewriteRules, parse_rule, suggest_rules
+
+
+def test_longest_prefix_and_windows_paths():
+    rules = RewriteRules.from_specs(['D:\\Music\\=/mnt/music/', '/old=/new', '/old/deep=/x', '\\\\nas\\share=/srv'])
+    assert rules.rewrite('d:\\music\\A\\1.mp3') == '/mnt/music/A/1.mp3'
+    assert rules.rewrite('D:/Music/B/2.mp3') == '/mnt/music/B/2.mp3'
+    assert rules.rewrite('/old/a.mp3') == '/new/a.mp3'
+    assert rules.rewrite('/old/deep/b.mp3') == '/x/b.mp3'
+    assert rules.rewrite('/OLD/a.mp3') is None
+    assert rules.rewrite('/oldies/a.mp3') is None
+    assert rules.rewrite('\\\\NAS\\share\\z.mp3') == '/srv/z.mp3'
+    assert RewriteRules.from_specs(['/mnt/music=D:\\Music']).rewrite('/mnt/music/a/b.mp3') == 'D:\\Music\\a\\b.mp3'
+    with pytest.raises(ValueError):
+        parse_rule('/no/target')
+
+
+def test_suggest_rules():
+    index = {'1.mp3': ['/mnt/music/A/Al'], '2.mp3': ['/mnt/music/B', '/other/C'], '3.mp3': ['/y/q']}
+    entries = ['D:\\Music\\A\\Al\\1.mp3', 'D:\\Music\\B\\2.mp3', '/x/q/3.mp3', 'missing.mp3']
+    assert suggest_rules(entries, index) == [
+        {'rule': 'D:\\Music=/mnt/music', 'matches': 2}, {'rule': '/x=/y', 'matches': 1}]
+
+
+def test_dump_with_rewrite(tmpdir):
+    music = tmpdir.mkdir('music')
+    music.mkdir('A').join('1.mp3').write('1')
+    music.mkdir('B').join('2.mp3').write('2')
+    playlist = tmpdir.join('p.m3u')
+    playlist.write('\n'.join(['#EXTM3U', 'D:\\Music\\A\\1.mp3', 'D:\\Music\\B\\2.mp3']))
+    dst = tmpdir.mkdir('dst')
+    args = {'load_m3u_path': str(playlist), 'dump_music_path': str(dst), 'dry_run': False}
+
+    dumper = M3uDump(dict(args, fix_search_path=str(tmpdir), collision_strategy='first'))
+    dumper.start()
+    assert dumper.report['rewrite_suggestions'] == [{'rule': 'D:\\Music={}'.format(music), 'matches': 2}]
+
+    result = CliRunner().invoke(cli.main, [str(playlist), str(dst), '--rewrite', 'd:/music=' + str(music)])
+    assert result.exit_code == 0
+    dumper = M3uDump(dict(args, rewrite=['d:/music=' + str(music)]))
+    dumper.start()
+    assert dumper.report['rewritten_paths'] == 2
+    assert dumper.report['copy_skipped_existing'] == 2
+    assert sorted(os.listdir(str(dst))) == ['1.mp3', '2.mp3', 'p.m3u']
+    assert CliRunner().invoke(cli.main, [str(playlist), str(dst), '--rewrite', 'nothing']).exit_code == 2
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_scheduler
+----------------------------------
+
+Tests for `m3u_dump.scheduler` module.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from m3u_dump.scheduler import BandwidthLimiter, copy_fanout, copy_throttled, schedule_operations
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.slept = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept += seconds
+        self.now += seconds
+
+
+def _op(src, dev, ino, size):
+    return {'src': src, 'stat': os.stat_result((0o100644, ino, dev, 1, 0, 0, size, 0, 0, 0))}
+
+
+def test_schedule_operations_groups_device_size_and_directory():
+    ops = [
+        _op('/b/big.flac', 1, 10, 50 * 1024 * 1024),
+        _op('/a/z.mp3', 2, 5, 100),
+        _op('/b/small2.mp3', 1, 30, 100),
+        _op('/a/small.mp3', 1, 40, 100),
+        _op('/b/small1.mp3', 1, 20, 100),
+    ]
+    ordered = [op['src'] for op in schedule_operations(ops)]
+    assert ordered == [
+        '/a/small.mp3',
+        '/b/small1.mp3',
+        '/b/small2.mp3',
+        '/b/big.flac',
+        '/a/z.mp3',
+    ]
+
+
+def test_bandwidth_limiter_sleeps_when_over_rate():
+    clock = FakeClock()
+    limiter = BandwidthLimiter(1000, clock=clock, sleep=clock.sleep)
+    limiter.consume(1000)
+    assert clock.slept == 0
+    limiter.consume(500)
+    assert clock.slept == pytest.approx(0.5)
+    limiter.consume(1000)
+    assert clock.slept == pytest.approx(1.5)
+
+
+def test_bandwidth_limiter_rejects_invalid_rate():
+    with pytest.raises(ValueError):
+        BandwidthLimiter(0)
+
+
+def test_copy_throttled(tmpdir):
+    src = tmpdir.join('src.mp3')
+    src.write_binary(b'x' * 2500)
+    dst = str(tmpdir.join('dst.mp3'))
+    clock = FakeClock()
+    copy_throttled(str(src), dst, BandwidthLimiter(1000, clock=clock, sleep=clock.sleep), chunk_size=1000)
+    with open(dst, 'rb') as f:
+        assert f.read() == b'x' * 2500
+    assert clock.slept == pytest.approx(1.5)
+
+
+@pytest.mark.parametrize('parallel', [False, True])
+def test_copy_fanout_writes_every_destination(tmpdir, parallel):
+    src = tmpdir.join('src.mp3')
+    src.write_binary(b'abc' * 1000)
+    dsts = [str(tmpdir.mkdir(name).join('src.mp3')) for name in ('a', 'b', 'c')]
+    with ThreadPoolExecutor(3) as executor:
+        copy_fanout(str(src), dsts, executor=executor if parallel else None, chunk_size=512)
+    for dst in dsts:
+        with open(dst, 'rb') as f:
+            assert f.read() == b'abc' * 1000
+
+
+def test_copy_fanout_limits_bytes_written(tmpdir):
+    src = tmpdir.join('src.mp3')
+    src.write_binary(b'x' * 2000)
+    dsts = [str(tmpdir.join(name)) for name in ('a.mp3', 'b.mp3', 'c.mp3')]
+    clock = FakeClock()
+    copy_fanout(str(src), dsts, BandwidthLimiter(1000, clock=clock, sleep=clock.sleep), chunk_size=1000)
+    assert clock.slept == pytest.approx(5)  # 6000 bytes written at 1000/s, the first 1000 from the burst
+
+
+def test_copy_fanout_removes_partial_destinations(tmpdir):
+    src = tmpdir.join('src.mp3')
+    src.write_binary(b'x' * 100)
+    dsts = [str(tmpdir.join('a.mp3')), str(tmpdir.join('missing', 'b.mp3'))]
+    with pytest.raises(OSError):
+        copy_fanout(str(src), dsts)
+    assert os.listdir(str(tmpdir)) == ['src.mp3']
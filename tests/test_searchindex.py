@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_searchindex
+----------------
+
+Tests for `m3u_dump.searchindex` module.
+"""
+import os
+
+from m3u_dump.m3u_dump import M3uDump
+from m3u_dump.searchindex import CompactIndex
+
+
+def _library(tmpdir):
+    music = tmpdir.mkdir('music')
+    music.mkdir('x').join('b.mp3').write('b')
+    music.mkdir('y').join('b.mp3').write('b')
+    music.join('y', 'あいう えお.mp3').write('c')
+    music.join('a.mp3').write('a')
+    return str(music)
+
+
+def test_compact_index_matches_dict(tmpdir):
+    music = _library(tmpdir)
+    expected = M3uDump.get_search_path_files(music)
+    index = CompactIndex.scan(music)
+    assert len(index) == len(expected) == 3
+    assert dict(index.items()) == expected
+    assert index.get('missing.mp3') is None and 'b.mp3' in index
+    assert index.directory(0) == music
+
+
+def test_saved_index_is_mapped_and_refreshed(tmpdir):
+    music = _library(tmpdir)
+    path = str(tmpdir.join('cache', 'index.bin'))
+    CompactIndex.load_or_build(music, path)
+    index = CompactIndex.open(path)
+    assert index.is_current(music)
+    assert index['あいう えお.mp3'] == [os.path.join(music, 'y')]
+    index.close()
+
+    tmpdir.join('music', 'x', 'new.mp3').write('n')
+    st = os.stat(os.path.join(music, 'x'))
+    os.utime(os.path.join(music, 'x'), ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    index = CompactIndex.load_or_build(music, path)
+    assert index['new.mp3'] == [os.path.join(music, 'x')]
+    assert not CompactIndex.open(path).is_current(str(tmpdir))
+
+
+def test_dump_with_search_index_file(tmpdir):
+    music = _library(tmpdir)
+    playlist = tmpdir.join('p.m3u')
+    playlist.write('\n'.join(['#EXTM3U', '/old/a.mp3', '/old/y/b.mp3']))
+    dst = tmpdir.mkdir('dst')
+    dumper = M3uDump({
+        'load_m3u_path': str(playlist),
+        'dump_music_path': str(dst),
+        'dry_run': False,
+        'fix_search_path': music,
+        'search_index_file': str(tmpdir.join('index.bin')),
+    })
+    dumper.start()
+    assert isinstance(dumper.search_index, CompactIndex)
+    assert dumper.report['fixed_paths'] == 2
+    assert dumper.report['details'][0]['selected'] == os.path.join(music, 'y', 'b.mp3')
+    assert sorted(os.listdir(str(dst))) == ['a.mp3', 'b.mp3', 'p.m3u']
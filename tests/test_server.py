@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_server
+----------------------------------
+
+Tests for `m3u_dump.server` module.
+"""
+import json
+import os
+import threading
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import pytest
+
+from m3u_dump.server import JobServer, make_server
+
+
+@pytest.fixture
+def server():
+    job_server = JobServer(workers=1, queue_size=4)
+    httpd = make_server('127.0.0.1', 0, job_server)
+    job_server.start()
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{}'.format(httpd.server_address[1])
+    httpd.shutdown()
+    httpd.server_close()
+    job_server.stop()
+
+
+def _post(url, data):
+    req = Request(url, data=json.dumps(data).encode('utf-8'), method='POST',
+                  headers={'Content-Type': 'application/json'})
+    return urlopen(req, timeout=10)
+
+
+def test_stream_job_progress_and_report(server, tmpdir):
+    music = tmpdir.mkdir('music')
+    music.join('one.mp3').write('1')
+    playlist = tmpdir.join('p.m3u')
+    playlist.write('#EXTM3U\n{}\n'.format(music.join('one.mp3')))
+    dst = tmpdir.mkdir('dst')
+
+    with _post(server + '/jobs?stream=1', {'load_m3u_path': str(playlist), 'dump_music_path': str(dst)}) as resp:
+        events = [json.loads(line) for line in resp.read().decode('utf-8').splitlines()]
+
+    assert events[0] == {'type': 'status', 'status': 'running'}
+    assert any(e['type'] == 'log' and 'copied' in e['message'] for e in events)
+    job = events[-1]['job']
+    assert job['status'] == 'done'
+    assert job['report']['copied'] == 1
+    assert os.path.exists(str(dst.join('one.mp3')))
+
+    with urlopen(server + '/jobs/' + job['id'], timeout=10) as resp:
+        assert json.loads(resp.read().decode('utf-8'))['report']['copied'] == 1
+
+
+def test_rejects_invalid_jobs(server):
+    with pytest.raises(HTTPError) as excinfo:
+        _post(server + '/jobs', {'load_m3u_path': 'x'})
+    assert excinfo.value.code == 400
+    with pytest.raises(HTTPError) as excinfo:
+        urlopen(server + '/jobs/999', timeout=10)
+    assert excinfo.value.code == 404
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_updater
+------------
+
+Tests for `m3u_dump.updater` module.
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from m3u_dump import updater
+
+
+MANIFEST = {'version': '9.9.9', 'release_url': 'https://example.com/release', 'notes': 'news'}
+
+
+@pytest.fixture
+def manifest_server():
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            requests.append(dict(self.headers))
+            if self.headers.get('If-None-Match') == '"v1"':
+                self.send_response(304)
+                self.end_headers()
+                return
+            body = json.dumps(MANIFEST).encode('utf-8')
+            self.send_response(200)
+            self.send_header('ETag', '"v1"')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{}/update.json'.format(httpd.server_address[1]), requests
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_check_for_update_file_url(tmpdir):
+    manifest = tmpdir.join('update.json')
+    manifest.write(json.dumps(MANIFEST))
+
+    result = updater.check_for_update('1.0.0', manifest_url=manifest.strpath,
+                                      cache_path=tmpdir.join('cache.json').strpath)
+    assert result['ok'] and result['has_update']
+    assert result['remote_version'] == '9.9.9'
+    assert result['source'] == 'local'
+
+    result = updater.check_for_update('9.9.9', manifest_url='file://' + manifest.strpath,
+                                      cache_path=tmpdir.join('cache.json').strpath)
+    assert result['ok'] and not result['has_update']
+
+
+def test_check_for_update_env_override(tmpdir, monkeypatch):
+    manifest = tmpdir.join('update.json')
+    manifest.write(json.dumps(MANIFEST))
+    monkeypatch.setenv(updater.UPDATE_MANIFEST_ENV, manifest.strpath)
+
+    result = updater.check_for_update('1.0.0', cache_path=tmpdir.join('cache.json').strpath)
+    assert result['remote_version'] == '9.9.9'
+
+
+def test_check_for_update_missing_manifest(tmpdir):
+    result = updater.check_for_update('1.0.0', manifest_url=tmpdir.join('nope.json').strpath)
+    assert result['ok'] is False
+    assert result['has_update'] is False
+
+
+def test_fetch_manifest_ttl_and_etag(tmpdir, manifest_server):
+    url, requests = manifest_server
+    cache_path = tmpdir.join('cache.json').strpath
+    clock = [1000.0]
+
+    def now():
+        return clock[0]
+
+    data, source = updater.fetch_manifest(url, cache_path, ttl=60, now=now)
+    assert (data, source) == (MANIFEST, 'network')
+    assert len(requests) == 1
+
+    # fresh cache: no request at all
+    data, source = updater.fetch_manifest(url, cache_path, ttl=60, now=now)
+    assert (data, source) == (MANIFEST, 'cache')
+    assert len(requests) == 1
+
+    # expired cache: conditional request answered with 304
+    clock[0] += 120
+    data, source = updater.fetch_manifest(url, cache_path, ttl=60, now=now)
+    assert (data, source) == (MANIFEST, 'not-modified')
+    assert requests[-1]['If-None-Match'] == '"v1"'
+
+    # revalidation refreshed the TTL
+    data, source = updater.fetch_manifest(url, cache_path, ttl=60, now=now)
+    assert source == 'cache'
+    assert len(requests) == 2
+
+
+def test_fetch_manifest_stale_cache_when_offline(tmpdir, manifest_server):
+    url, _requests = manifest_server
+    cache_path = tmpdir.join('cache.json').strpath
+    updater.fetch_manifest(url, cache_path, ttl=0)
+
+    with open(cache_path, encoding='utf-8') as f:
+        entry = json.load(f)
+    entry['url'] = 'http://127.0.0.1:9/update.json'
+    with open(cache_path, 'w', encoding='utf-8') as f:
+        json.dump(entry, f)
+
+    data, source = updater.fetch_manifest(entry['url'], cache_path, ttl=0, timeout=2)
+    assert (data, source) == (MANIFEST, 'stale-cache')
+
+
+def test_check_for_update_async(tmpdir):
+    manifest = tmpdir.join('update.json')
+    manifest.write(json.dumps(MANIFEST))
+    results = []
+
+    thread = updater.check_for_update_async('1.0.0', results.append, manifest_url=manifest.strpath)
+    thread.join(5)
+    assert results[0]['has_update']
+    assert thread.name != threading.current_thread().name
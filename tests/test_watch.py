@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_watch
+----------------------------------
+
+Tests for `m3u_dump.watch` module.
+"""
+import os
+
+import pytest
+from click.testing import CliRunner
+
+from m3u_dump import cli
+from m3u_dump.m3u_dump import M3uDump
+from m3u_dump.watch import DirectoryState, PlaylistWatcher
+
+
+def _touch_later(path, seconds=10):
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + seconds * 10 ** 9))
+
+
+def test_directory_state_matches_full_scan_and_tracks_changes(tmpdir):
+    library = tmpdir.mkdir('library')
+    library.join('a.mp3').write('a')
+    library.mkdir('sub').join('b.mp3').write('b')
+    library.mkdir('sub2').join('a.mp3').write('a2')
+
+    state = DirectoryState(str(library))
+    index = state.scan()
+    expected = M3uDump.get_search_path_files(str(library))
+    assert {k: sorted(v) for k, v in index.items()} == {k: sorted(v) for k, v in expected.items()}
+    assert state.poll() == set()
+
+    library.join('sub').join('c.mp3').write('c')
+    _touch_later(str(library.join('sub')))
+    library.mkdir('new').join('d.mp3').write('d')
+    _touch_later(str(library))
+    assert state.poll() == {'c.mp3', 'd.mp3'}
+    assert index['c.mp3'] == [str(library.join('sub'))]
+    assert index['d.mp3'] == [str(library.join('new'))]
+
+    library.join('sub2').join('a.mp3').remove()
+    library.join('sub2').remove()
+    _touch_later(str(library), 20)
+    assert state.poll() == {'a.mp3'}
+    assert index['a.mp3'] == [str(library)]
+
+
+def test_watcher_redumps_only_affected_playlists(tmpdir):
+    library = tmpdir.mkdir('library')
+    library.join('one.mp3').write('1')
+    playlists = tmpdir.mkdir('playlists')
+    playlists.join('p1.m3u').write('#EXTM3U\n/old/one.mp3\n')
+    playlists.join('p2.m3u').write('#EXTM3U\n/old/two.mp3\n')
+    dst = tmpdir.mkdir('dst')
+
+    dumper = M3uDump({
+        'load_m3u_path': str(playlists),
+        'dump_music_path': str(dst),
+        'dry_run': False,
+        'fix_search_path': str(library),
+        'playlist_pattern_list': ('*.m3u',),
+    })
+    watcher = PlaylistWatcher(dumper, interval=0, sleep=lambda seconds: None)
+    watcher.run(max_cycles=1)
+    assert dumper.report['playlists_processed'] == 2
+    assert os.path.exists(str(dst.join('one.mp3')))
+    assert watcher.poll() == []
+
+    library.join('two.mp3').write('2')
+    _touch_later(str(library))
+    affected = watcher.poll()
+    assert affected == [str(playlists.join('p2.m3u'))]
+    watcher.dump(affected)
+    assert dumper.report['playlists_processed'] == 1
+    assert os.path.exists(str(dst.join('two.mp3')))
+
+    playlists.join('p1.m3u').write('#EXTM3U\n/old/one.mp3\n/old/two.mp3\n')
+    _touch_later(str(playlists.join('p1.m3u')))
+    assert watcher.poll() == [str(playlists.join('p1.m3u'))]
+
+    playlists.join('p3.m3u').write('#EXTM3U\n')
+    _touch_later(str(playlists))
+    assert watcher.poll() == [str(playlists.join('p3.m3u'))]
+
+
+@pytest.mark.parametrize('option', [['--plan', 'plan.json'], ['--apply-plan', 'plan.json'], ['--max-bytes', '1500'],
+                                    ['--space-check', 'fail'], ['--space-check', 'trim']])
+def test_watch_rejects_whole_job_options(tmpdir, option):
+    playlist = tmpdir.join('p.m3u')
+    playlist.write('#EXTM3U\n')
+    tmpdir.join('plan.json').write('{}')
+    dst = tmpdir.mkdir('dst')
+    if option[1] == 'plan.json':
+        option = [option[0], str(tmpdir.join(option[1]))]
+    result = CliRunner().invoke(cli.main, [str(playlist), str(dst), '--watch'] + option)
+    assert result.exit_code == 2
+    assert '{} cannot be combined with --watch'.format(option[0]) in result.output
+    assert os.listdir(str(dst)) == []
+
+
+def test_watcher_starts_every_dump_with_a_fresh_run(tmpdir, monkeypatch):
+    monkeypatch.setattr(M3uDump, '_resolve_final_url_strict', staticmethod(lambda url, timeout=8: url))
+    playlist = tmpdir.join('p.m3u')
+    playlist.write('#EXTM3U\nhttp://radio.example.com/live\n')
+    dumper = M3uDump({
+        'load_m3u_path': str(playlist),
+        'dump_music_path': str(tmpdir.mkdir('dst')),
+        'dry_run': False,
+    })
+    watcher = PlaylistWatcher(dumper, interval=0, sleep=lambda seconds: None)
+    for _ in range(3):
+        watcher.dump([str(playlist)])
+    report = dumper.report
+    assert len(report['origin_links']) == 1
+    assert [row['entries'] for row in report['origin_servers']] == [1]
+    assert list(report['url_hosts']) == ['http://radio.example.com']